@@ -0,0 +1,167 @@
+import hashlib
+import math
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from caching import TTLCache
+from db_connection.pool import acquire
+from db_connection.queries import registry
+
+CACHE_LOOKUP = registry.register("analysis_cache_lookup", """
+    SELECT analysis, recommendation FROM llm_analysis_cache
+    WHERE fingerprint = %s AND expires_at > NOW()
+""")
+CACHE_TOUCH = registry.register("analysis_cache_touch", """
+    UPDATE llm_analysis_cache SET last_used_at = NOW(), hits = hits + 1
+    WHERE fingerprint = %s
+""")
+
+
+@dataclass
+class AnalysisCacheConfig:
+    """Root-cause analysis cache configuration"""
+    ttl: float = 7 * 24 * 3600  # Seconds an analysis stays valid
+    memory_size: int = 2048  # Entries kept in-process
+    db_max_rows: int = 100000  # Rows kept in llm_analysis_cache before LRU pruning
+    prune_every: int = 500  # Stores between two prunes of the MySQL tier
+
+    @classmethod
+    def from_env(cls) -> "AnalysisCacheConfig":
+        return cls(
+            ttl=float(os.getenv("LLM_CACHE_TTL_SECONDS", cls.ttl)),
+            memory_size=int(os.getenv("LLM_CACHE_MEMORY_SIZE", cls.memory_size)),
+            db_max_rows=int(os.getenv("LLM_CACHE_DB_MAX_ROWS", cls.db_max_rows)),
+            prune_every=int(os.getenv("LLM_CACHE_PRUNE_EVERY", cls.prune_every)),
+        )
+
+
+async def create_analysis_cache_table(cursor):
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS llm_analysis_cache (
+            fingerprint CHAR(64) PRIMARY KEY,
+            analysis LONGTEXT,
+            recommendation TEXT,
+            created_at DATETIME,
+            last_used_at DATETIME,
+            expires_at DATETIME,
+            hits INT DEFAULT 0,
+            INDEX idx_llm_analysis_cache_last_used (last_used_at)
+        )
+    """)
+
+
+def amount_bucket(amount) -> str:
+    """Bucket an amount by its leading digit and magnitude, e.g. 4836.35 -> 4000."""
+    value = abs(float(amount or 0))
+    if value < 1:
+        return "0"
+    magnitude = 10 ** int(math.floor(math.log10(value)))
+    return str(int(value // magnitude) * magnitude)
+
+
+def analysis_fingerprint(transaction: tuple, payment_log: Optional[tuple]) -> str:
+    """Fingerprint the inputs the analysis prompt depends on."""
+    gateway_status = payment_log[4] if payment_log else "Not available"
+    parts = (
+        str(transaction[7] or "").strip().lower(),
+        amount_bucket(transaction[5]),
+        str(transaction[6] or "").strip().upper(),
+        str(gateway_status or "").strip().lower(),
+    )
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Two-tier cache of root-cause analyses keyed by analysis_fingerprint().
+
+    Lookups hit an in-process LRU first and fall back to the
+    llm_analysis_cache table, which survives restarts and is shared between
+    instances. Both tiers expire entries after `ttl`; the table is pruned to
+    `db_max_rows` by least recent use.
+    """
+
+    def __init__(self, config: Optional[AnalysisCacheConfig] = None):
+        self.config = config or AnalysisCacheConfig.from_env()
+        self.memory = TTLCache(maxsize=self.config.memory_size, ttl=self.config.ttl)
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "db_errors": 0}
+        self._stores_since_prune = 0
+
+    async def get(self, fingerprint: str) -> Optional[dict]:
+        result = self.memory.get(fingerprint)
+        if result is not None:
+            self.stats["memory_hits"] += 1
+            return result
+
+        try:
+            async with acquire() as connection:
+                async with connection.cursor() as cursor:
+                    await registry.execute(cursor, CACHE_LOOKUP, (fingerprint,))
+                    row = await cursor.fetchone()
+                    if row:
+                        await registry.execute(cursor, CACHE_TOUCH, (fingerprint,))
+        except Exception as e:
+            print(f"Analysis cache lookup failed: {e}")
+            self.stats["db_errors"] += 1
+            row = None
+
+        if not row:
+            self.stats["misses"] += 1
+            return None
+
+        result = {"analysis": row[0], "recommendation": row[1]}
+        self.memory.set(fingerprint, result)
+        self.stats["db_hits"] += 1
+        return result
+
+    async def set(self, fingerprint: str, result: dict):
+        self.memory.set(fingerprint, result)
+        now = datetime.now()
+        try:
+            async with acquire() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.execute("""
+                        INSERT INTO llm_analysis_cache (
+                            fingerprint, analysis, recommendation, created_at, last_used_at, expires_at
+                        ) VALUES (%s, %s, %s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE
+                            analysis = VALUES(analysis), recommendation = VALUES(recommendation),
+                            created_at = VALUES(created_at), last_used_at = VALUES(last_used_at),
+                            expires_at = VALUES(expires_at)
+                    """, (
+                        fingerprint, result["analysis"], result.get("recommendation"),
+                        now, now, now + timedelta(seconds=self.config.ttl)
+                    ))
+        except Exception as e:
+            print(f"Analysis cache store failed: {e}")
+            self.stats["db_errors"] += 1
+            return
+
+        self.stats["stores"] += 1
+        self._stores_since_prune += 1
+        if self._stores_since_prune >= self.config.prune_every:
+            self._stores_since_prune = 0
+            await self.prune()
+
+    async def prune(self):
+        """Drop expired rows, then the least recently used rows above db_max_rows."""
+        async with acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("DELETE FROM llm_analysis_cache WHERE expires_at <= NOW()")
+                await cursor.execute("SELECT COUNT(*) FROM llm_analysis_cache")
+                excess = (await cursor.fetchone())[0] - self.config.db_max_rows
+                if excess > 0:
+                    await cursor.execute(
+                        "DELETE FROM llm_analysis_cache ORDER BY last_used_at LIMIT %s", (excess,)
+                    )
+
+    def metrics(self) -> dict:
+        lookups = self.stats["memory_hits"] + self.stats["db_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["db_hits"]
+        return {
+            **self.stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory": self.memory.metrics(),
+        }
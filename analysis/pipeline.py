@@ -0,0 +1,287 @@
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import httpx
+from together import AsyncTogether
+
+from analysis.cache import AnalysisCache, analysis_fingerprint
+from analysis.tokens import count_constant_tokens, count_tokens, record_usage
+from db_connection.pool import acquire
+from reconciliation.engine import PENDING_ROOT_CAUSE, TX_ID, fetch_payment_logs
+
+ANALYSIS_SYSTEM_PROMPT = "You are a payment forensic analyst. Use systematic multi-step reasoning. Consider multiple angles before concluding."
+ANALYSIS_MODEL = "deepseek-ai/DeepSeek-V3"
+
+ANALYSIS_ERROR_ROOT_CAUSE = "Analysis error: unable to determine root cause"
+
+
+@dataclass
+class AnalysisConfig:
+    """Root-cause analysis pipeline configuration"""
+    concurrency: int = 4  # LLM calls in flight at once
+    queue_size: int = 1000  # Discrepancies waiting for analysis
+    timeout: float = 60.0  # Seconds per Serper/LLM call
+    max_retries: int = 3
+    backoff_base: float = 1.0  # Seconds; doubled on every retry
+    requeue_interval: float = 600.0  # Seconds between sweeps for records left pending
+    requeue_batch_size: int = 1000  # Pending records read per page
+    together_base_url: Optional[str] = None  # Point at a local fake server in tests
+    serper_url: str = "https://google.serper.dev/search"
+
+    @classmethod
+    def from_env(cls) -> "AnalysisConfig":
+        return cls(
+            concurrency=int(os.getenv("LLM_CONCURRENCY", cls.concurrency)),
+            queue_size=int(os.getenv("LLM_QUEUE_SIZE", cls.queue_size)),
+            timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", cls.timeout)),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", cls.max_retries)),
+            backoff_base=float(os.getenv("LLM_BACKOFF_SECONDS", cls.backoff_base)),
+            requeue_interval=float(os.getenv("LLM_REQUEUE_SECONDS", cls.requeue_interval)),
+            requeue_batch_size=int(os.getenv("LLM_REQUEUE_BATCH_SIZE", cls.requeue_batch_size)),
+            together_base_url=os.getenv("TOGETHER_BASE_URL") or None,
+            serper_url=os.getenv("SERPER_URL", cls.serper_url),
+        )
+
+
+def build_analysis_prompt(transaction: tuple, gateway_status: str, search_results: str) -> str:
+    return f"""
+    Analyze the given transaction data to identify the root cause of a potential financial discrepancy. Consider the transaction status, amount, currency, and gateway code, as well as any available payment log information.
+    Key Data Points:
+    - Transaction amount and currency: {transaction[5]} {transaction[6]}
+    - Transaction status: {transaction[7]}
+    - Payment log status: {gateway_status}
+    Search Results:
+    {search_results}
+    Provide a concise analysis in the following format:
+    The root cause of the discrepancy is likely [root cause], based on [key evidence]. Confidence level: [High/Medium/Low].
+    Then, provide 1-2 critical next steps as recommendations in a short paragraph.
+    """
+
+
+def parse_analysis(analysis: str) -> dict:
+    parts = analysis.split("\n\n")
+    analysis_text = parts[0]
+    recommendation_text = parts[1].strip() if len(parts) > 1 else ""
+
+    if recommendation_text.startswith("Recommendation:") or recommendation_text.startswith("Next steps:"):
+        recommendation_text = recommendation_text.split(":")[1].strip()
+
+    return {
+        "analysis": analysis_text,
+        "recommendation": recommendation_text
+    }
+
+
+class AnalysisPipeline:
+    """
+    Fills in reconciliation_records.root_cause after detection has committed.
+
+    The scanner submits discrepancies to a bounded queue and moves on; a fixed
+    number of workers drain it, each call bounded by a timeout and retried with
+    exponential backoff. A full queue makes submit() wait, which throttles
+    detection instead of growing memory. Records still holding the
+    PENDING_ROOT_CAUSE placeholder (after a restart, or a failed store) are
+    queued again by requeue_pending(), which the scheduler runs periodically.
+
+    Analyses are looked up in `cache` by prompt fingerprint first, and
+    concurrent misses on the same fingerprint share a single LLM call.
+    """
+
+    def __init__(self, config: Optional[AnalysisConfig] = None, cache: Optional[AnalysisCache] = None):
+        self.config = config or AnalysisConfig.from_env()
+        self.cache = cache
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Reconciliation ids queued or being analysed by this process
+        self.queued_ids = set()
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers = []
+        self.client = None
+        self.http = None
+        self.stats = {"queued": 0, "completed": 0, "failed": 0, "retries": 0}
+
+    async def start(self):
+        if self.workers:
+            return
+        self.queue = asyncio.Queue(maxsize=self.config.queue_size)
+        self.client = AsyncTogether(
+            api_key=os.getenv("TOGETHER_API_KEY"),
+            base_url=self.config.together_base_url,
+            timeout=self.config.timeout,
+            max_retries=0,  # Retries are handled here so backoff stays under our control
+        )
+        self.http = httpx.AsyncClient(timeout=self.config.timeout)
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.config.concurrency)]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        if self.http:
+            await self.http.aclose()
+            self.http = None
+
+    async def submit(self, reconciliation_id: str, transaction: tuple, payment_log: Optional[tuple]):
+        """Queue a discrepancy for analysis; waits only while the queue is full."""
+        self.queued_ids.add(reconciliation_id)
+        await self.queue.put((reconciliation_id, transaction, payment_log))
+        self.stats["queued"] += 1
+
+    async def join(self):
+        """Wait until everything queued so far has been analysed."""
+        await self.queue.join()
+
+    async def requeue_pending(self) -> int:
+        """
+        Queue every record left with the pending placeholder that this process
+        hasn't queued already, a page at a time in reconciliation_id order;
+        returns the number queued. The connection is released before a page
+        is submitted, since a full queue makes submit() wait.
+        """
+        after, requeued = "", 0
+        while True:
+            async with acquire() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.execute("""
+                        SELECT r.reconciliation_id, t.*
+                        FROM reconciliation_records r
+                        JOIN transactions t ON t.transaction_id = r.transaction_id
+                        WHERE r.root_cause = %s AND r.reconciliation_id > %s
+                        ORDER BY r.reconciliation_id
+                        LIMIT %s
+                    """, (PENDING_ROOT_CAUSE, after, self.config.requeue_batch_size))
+                    rows = await cursor.fetchall()
+                    logs_by_transaction = await fetch_payment_logs(cursor, [row[1 + TX_ID] for row in rows])
+
+            for row in rows:
+                if row[0] in self.queued_ids:
+                    continue
+                transaction = row[1:]
+                payment_logs = logs_by_transaction[transaction[TX_ID]]
+                await self.submit(row[0], transaction, payment_logs[0] if payment_logs else None)
+                requeued += 1
+            if len(rows) < self.config.requeue_batch_size:
+                return requeued
+            after = rows[-1][0]
+
+    async def search_internet(self, query: str) -> str:
+        headers = {"X-API-KEY": os.getenv("SERPER_API_KEY") or ""}
+        params = {"q": query, "location": "United States"}
+
+        response = await self.http.get(self.config.serper_url, headers=headers, params=params)
+        if response.status_code == 200:
+            data = response.json()
+            if 'organic' in data:
+                return "\n".join([result['snippet'] for result in data['organic']])
+        return "No results found."
+
+    async def analyze(self, transaction: tuple, payment_log: Optional[tuple]) -> dict:
+        if not self.cache:
+            return await self._analyze(transaction, payment_log)
+
+        fingerprint = analysis_fingerprint(transaction, payment_log)
+        cached = await self.cache.get(fingerprint)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(fingerprint)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[fingerprint] = future
+        try:
+            result = await self._analyze(transaction, payment_log)
+            await self.cache.set(fingerprint, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._inflight[fingerprint]
+
+    async def _analyze(self, transaction: tuple, payment_log: Optional[tuple]) -> dict:
+        gateway_status = payment_log[4] if payment_log else "Not available"
+
+        search_results = await self._with_retries(
+            self.search_internet, f"{transaction[7]} {transaction[5]} {transaction[6]} discrepancy"
+        )
+        prompt = build_analysis_prompt(transaction, gateway_status, search_results)
+        token_counts = {
+            "system_prompt": count_constant_tokens(ANALYSIS_SYSTEM_PROMPT),
+            "payload": count_tokens(prompt),
+        }
+
+        try:
+            analysis = await self.complete(ANALYSIS_SYSTEM_PROMPT, prompt)
+        except Exception:
+            record_usage("analysis", **token_counts, error=True)
+            raise
+
+        record_usage("analysis", **token_counts, response=count_tokens(analysis))
+        return parse_analysis(analysis)
+
+    async def complete(self, system_prompt: str, prompt: str, model: str = ANALYSIS_MODEL) -> str:
+        """One chat completion with the pipeline's timeout and retry policy."""
+        response = await self._with_retries(
+            self.client.chat.completions.create,
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ]
+        )
+        return response.choices[0].message.content
+
+    async def _with_retries(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.wait_for(func(*args, **kwargs), timeout=self.config.timeout)
+            except Exception:
+                if attempt >= self.config.max_retries:
+                    raise
+                delay = self.config.backoff_base * (2 ** attempt)
+                attempt += 1
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+    async def _worker(self):
+        while True:
+            reconciliation_id, transaction, payment_log = await self.queue.get()
+            started = time.perf_counter()
+            try:
+                try:
+                    root_cause = (await self.analyze(transaction, payment_log))["analysis"]
+                    self.stats["completed"] += 1
+                except Exception as e:
+                    print(f"Root-cause analysis failed for {transaction[0]}: {e}")
+                    root_cause = ANALYSIS_ERROR_ROOT_CAUSE
+                    self.stats["failed"] += 1
+
+                async with acquire() as connection:
+                    async with connection.cursor() as cursor:
+                        await cursor.execute(
+                            "UPDATE reconciliation_records SET root_cause = %s WHERE reconciliation_id = %s",
+                            (root_cause, reconciliation_id)
+                        )
+                print(f"Root cause stored for {transaction[0]} in {time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                print(f"Error storing root cause for {transaction[0]}: {e}")
+            finally:
+                self.queued_ids.discard(reconciliation_id)
+                self.queue.task_done()
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "pending": self.queue.qsize() if self.queue else 0,
+            "workers": len(self.workers),
+            "cache": self.cache.metrics() if self.cache else None,
+        }
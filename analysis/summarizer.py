@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import os
+import re
+from typing import Dict, List
+
+import aiomysql
+
+from analysis.pipeline import ANALYSIS_ERROR_ROOT_CAUSE, AnalysisPipeline
+from analysis.tokens import count_constant_tokens, count_tokens, record_usage
+from caching import TTLCache
+from db_connection.pool import acquire
+from reconciliation.engine import NO_DISCREPANCY_ROOT_CAUSE, PENDING_ROOT_CAUSE
+from serialization import dumps, dumps_text
+
+SUMMARY_CLUSTERS_PER_CATEGORY = int(os.getenv("SUMMARY_CLUSTERS_PER_CATEGORY", "5"))
+SUMMARY_EXCERPT_CHARS = int(os.getenv("SUMMARY_EXCERPT_CHARS", "300"))
+SUMMARY_CACHE_TTL_SECONDS = float(os.getenv("SUMMARY_CACHE_TTL_SECONDS", "3600"))
+
+SUMMARY_SYSTEM_PROMPT = "You are a payment forensic analyst summarizing reconciliation data."
+
+CATEGORY_PROMPT = """
+        Below are aggregate statistics and the most frequent root-cause analyses for one discrepancy category in a window of reconciliation records.
+        Summarize in 2-3 sentences what is driving this category, quantifying the prevalence of each cause (e.g., "card declines account for 40% of these cases"). Be concise.
+        """
+
+REDUCE_PROMPT = """
+        You are a payment forensic analyst. Below are the overall reconciliation statistics for a window of records, followed by a short summary per discrepancy category.
+        Summarize the key root causes of discrepancies in a clear and concise paragraph. Focus on identifying common patterns, trends, and their frequency (e.g., "Amount mismatches caused 60% of discrepancies"). Keep the summary brief yet informative.
+        """
+
+# Root causes that carry no analysis and would only add noise to the clusters
+PLACEHOLDER_ROOT_CAUSES = (NO_DISCREPANCY_ROOT_CAUSE, PENDING_ROOT_CAUSE, ANALYSIS_ERROR_ROOT_CAUSE)
+
+
+def cluster_key(root_cause: str) -> str:
+    """Collapse analyses that differ only in amounts, ids or whitespace."""
+    first_sentence = root_cause.split(". ")[0]
+    return re.sub(r"\s+", " ", re.sub(r"\d+(?:[.,]\d+)*", "#", first_sentence.lower())).strip()
+
+
+def digest(payload) -> str:
+    return hashlib.sha256(dumps(payload, sort_keys=True)).hexdigest()
+
+
+async def fetch_window_aggregates(cursor, window_size: int) -> List[dict]:
+    """Counts and amounts of the newest `window_size` records by category, payment method and gateway status."""
+    await cursor.execute("""
+        SELECT
+            COALESCE(w.discrepancy_category, 'No Discrepancy') AS category,
+            COALESCE(w.payment_method, 'Unknown') AS payment_method,
+            COALESCE(w.gateway_status, 'Not available') AS gateway_status,
+            COUNT(*) AS records,
+            SUM(w.resolution_status = 'Unresolved') AS unresolved,
+            SUM(w.resolution_status = 'Resolved') AS resolved,
+            ROUND(COALESCE(SUM(w.amount), 0), 2) AS amount,
+            ROUND(COALESCE(SUM(GREATEST(w.discrepancy_amount, 0)), 0), 2) AS discrepancy_amount
+        FROM (
+            SELECT r.discrepancy_category, r.gateway_status, r.resolution_status, r.amount,
+                   r.discrepancy_amount, t.payment_method
+            FROM reconciliation_records r
+            LEFT JOIN transactions t ON t.transaction_id = r.transaction_id
+            ORDER BY r.transaction_date DESC
+            LIMIT %s
+        ) w
+        GROUP BY category, payment_method, gateway_status
+        ORDER BY records DESC
+    """, (window_size,))
+    return [
+        {**row, "records": int(row["records"]), "unresolved": int(row["unresolved"] or 0),
+         "resolved": int(row["resolved"] or 0), "amount": float(row["amount"]),
+         "discrepancy_amount": float(row["discrepancy_amount"])}
+        for row in await cursor.fetchall()
+    ]
+
+
+async def fetch_root_cause_clusters(cursor, window_size: int) -> Dict[str, List[dict]]:
+    """
+    Distinct root-cause analyses of the newest `window_size` records with
+    their frequency, merged by cluster_key() and capped per category.
+    """
+    placeholders = ", ".join(["%s"] * len(PLACEHOLDER_ROOT_CAUSES))
+    await cursor.execute(f"""
+        SELECT w.discrepancy_category AS category, MIN(LEFT(w.root_cause, %s)) AS excerpt, COUNT(*) AS records
+        FROM (
+            SELECT discrepancy_category, root_cause
+            FROM reconciliation_records
+            ORDER BY transaction_date DESC
+            LIMIT %s
+        ) w
+        WHERE w.discrepancy_category IS NOT NULL
+          AND w.root_cause IS NOT NULL
+          AND w.root_cause NOT IN ({placeholders})
+        GROUP BY w.discrepancy_category, MD5(w.root_cause)
+    """, (SUMMARY_EXCERPT_CHARS, window_size, *PLACEHOLDER_ROOT_CAUSES))
+
+    clusters: Dict[str, Dict[str, dict]] = {}
+    for row in await cursor.fetchall():
+        by_key = clusters.setdefault(row["category"], {})
+        key = cluster_key(row["excerpt"])
+        if key in by_key:
+            by_key[key]["records"] += int(row["records"])
+        else:
+            by_key[key] = {"root_cause": row["excerpt"], "records": int(row["records"])}
+
+    return {
+        category: sorted(by_key.values(), key=lambda cluster: (-cluster["records"], cluster["root_cause"]))[:SUMMARY_CLUSTERS_PER_CATEGORY]
+        for category, by_key in clusters.items()
+    }
+
+
+def category_totals(aggregates: List[dict]) -> Dict[str, dict]:
+    totals: Dict[str, dict] = {}
+    for row in aggregates:
+        total = totals.setdefault(row["category"], {"records": 0, "unresolved": 0, "amount": 0.0, "discrepancy_amount": 0.0})
+        for field in total:
+            total[field] += row[field]
+    for total in totals.values():
+        total["amount"] = round(total["amount"], 2)
+        total["discrepancy_amount"] = round(total["discrepancy_amount"], 2)
+    return totals
+
+
+class ReconciliationSummarizer:
+    """
+    Map-reduce summaries of the newest reconciliation records.
+
+    The records are reduced to statistics in SQL, and their root causes to a
+    handful of deduplicated clusters per discrepancy category. Each category
+    is summarized separately (map), then the partial summaries and overall
+    statistics are combined (reduce). Prompt size depends on the number of
+    categories and clusters, not on the window size. Every LLM result is
+    cached by a digest of its input, so categories whose statistics and
+    clusters did not change are not summarized again.
+    """
+
+    def __init__(self, pipeline: AnalysisPipeline, cache_ttl: float = SUMMARY_CACHE_TTL_SECONDS):
+        self.pipeline = pipeline
+        self.cache = TTLCache(maxsize=256, ttl=cache_ttl)
+
+    async def summarize(self, window_size: int) -> str:
+        async with acquire() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                aggregates = await fetch_window_aggregates(cursor, window_size)
+                clusters = await fetch_root_cause_clusters(cursor, window_size)
+
+        if not aggregates:
+            return "No reconciliation records found."
+
+        try:
+            totals = category_totals(aggregates)
+            categories = [category for category in totals if category != "No Discrepancy"]
+            partials = await asyncio.gather(*(
+                self.summarize_category(
+                    category, totals[category],
+                    [row for row in aggregates if row["category"] == category],
+                    clusters.get(category, [])
+                )
+                for category in categories
+            ))
+
+            statistics = {
+                "records": sum(total["records"] for total in totals.values()),
+                "by_category": totals,
+            }
+            payload = dumps_text({"statistics": statistics, "categories": dict(zip(categories, partials))}, sort_keys=True)
+            return await self.cached_completion(REDUCE_PROMPT, payload)
+
+        except Exception as e:
+            return f"Error generating summary: {e}"
+
+    async def summarize_category(self, category: str, total: dict, aggregates: List[dict], clusters: List[dict]) -> str:
+        payload = dumps_text({
+            "category": category,
+            "totals": total,
+            "by_payment_method_and_gateway_status": [
+                {key: value for key, value in row.items() if key != "category"} for row in aggregates
+            ],
+            "root_cause_clusters": clusters,
+        }, sort_keys=True)
+        return await self.cached_completion(CATEGORY_PROMPT, payload)
+
+    async def cached_completion(self, prompt_template: str, payload: str) -> str:
+        key = digest([prompt_template, payload])
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        token_counts = {
+            "system_prompt": count_constant_tokens(SUMMARY_SYSTEM_PROMPT),
+            "prompt_template": count_constant_tokens(prompt_template),
+            "payload": count_tokens(payload),
+        }
+        try:
+            summary = await self.pipeline.complete(SUMMARY_SYSTEM_PROMPT, prompt_template + payload)
+        except Exception:
+            record_usage("reconciliation_summaries", **token_counts, error=True)
+            raise
+
+        record_usage("reconciliation_summaries", **token_counts, response=count_tokens(summary))
+        self.cache.set(key, summary)
+        return summary
+
+    def metrics(self) -> dict:
+        return self.cache.metrics()
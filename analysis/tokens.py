@@ -0,0 +1,63 @@
+import asyncio
+import threading
+from functools import lru_cache, partial
+
+import tiktoken
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = DEFAULT_MODEL):
+    """Load a tiktoken encoder once per model."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Fallback to cl100k_base encoding if model not found
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """Count the number of tokens in a text string."""
+    if not text:
+        return 0
+    return len(get_encoding(model).encode(text))
+
+
+@lru_cache(maxsize=256)
+def count_constant_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """Memoized count for prompt fragments that never change (system prompts, templates)."""
+    return count_tokens(text, model)
+
+
+async def async_count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """Count tokens in an executor so large payloads don't block the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(count_tokens, text, model))
+
+
+_USAGE_FIELDS = ("calls", "errors", "system_prompt", "prompt_template", "payload", "input", "response", "total")
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+def record_usage(endpoint: str, system_prompt: int = 0, prompt_template: int = 0, payload: int = 0,
+                 response: int = 0, error: bool = False):
+    """Add one LLM call's token counts to the cumulative usage of `endpoint`."""
+    input_tokens = system_prompt + prompt_template + payload
+    with _usage_lock:
+        usage = _usage.setdefault(endpoint, dict.fromkeys(_USAGE_FIELDS, 0))
+        usage["calls"] += 1
+        usage["errors"] += int(error)
+        usage["system_prompt"] += system_prompt
+        usage["prompt_template"] += prompt_template
+        usage["payload"] += payload
+        usage["input"] += input_tokens
+        usage["response"] += response
+        usage["total"] += input_tokens + response
+
+
+def token_usage() -> dict:
+    """Cumulative token usage per endpoint since startup."""
+    with _usage_lock:
+        return {endpoint: dict(usage) for endpoint, usage in _usage.items()}
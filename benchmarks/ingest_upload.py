@@ -0,0 +1,79 @@
+"""
+Parse throughput and memory of the streaming upload path.
+
+Writes a synthetic mobile_payment_logs CSV of the given size to a temporary
+file and streams it through ingestion.loader.load_upload() into a sink that
+discards the rows, so the numbers cover parsing, validation and row
+building only (the database's insert rate is measured by the API's own
+throughput report). Peak RSS should stay flat as --rows grows.
+
+    python -m benchmarks.ingest_upload --rows 16000000
+"""
+import argparse
+import asyncio
+import resource
+import tempfile
+
+from ingestion.loader import load_upload
+
+HEADER = b"unique_id,tx_id,mob_type,mob_tx_id,gateway_verification,amount,currency,gateway_response,time_stamp\n"
+LINE = b"log-%d,tx-%d,Boost,mob-%d,Success,%d.%02d,MYR,Payment accepted,2025-01-01 10:%02d:%02d\n"
+
+
+class DiscardingConnection:
+    """Just enough of an aiomysql connection for load_upload() to run without a database."""
+
+    def cursor(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def executemany(self, query, rows):
+        pass
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+def write_csv(target, rows: int):
+    target.write(HEADER)
+    for start in range(0, rows, 100_000):
+        target.write(b"".join(
+            LINE % (index, index, index, index % 10_000, index % 100, index // 60 % 60, index % 60)
+            for index in range(start, min(start + 100_000, rows))
+        ))
+
+
+def peak_rss_mb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss >> 10  # KiB on Linux
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=4_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryFile() as upload:
+        write_csv(upload, args.rows)
+        size_mb = upload.tell() / (1 << 20)
+        upload.seek(0)
+        rss_before = peak_rss_mb()
+        stats = asyncio.run(load_upload(DiscardingConnection(), upload, "mobile_payment_logs"))
+
+    print(f"{stats['rows']:,} rows ({size_mb:,.0f} MB) in {stats['batches']} batches, "
+          f"{stats['seconds']:.2f}s, {stats['rows_per_second']:,} rows/s")
+    print(f"Peak RSS {peak_rss_mb()} MB (was {rss_before} MB before loading)")
+
+
+if __name__ == "__main__":
+    main()
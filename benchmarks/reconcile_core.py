@@ -0,0 +1,122 @@
+"""
+Row-by-row vs vectorized reconciliation core.
+
+Builds a synthetic chunk shaped like `SELECT * FROM transactions` /
+`SELECT * FROM payment_logs` rows (Decimal amounts, datetimes), classifies
+it with engine.classify_transaction() and vectorized.classify_chunk(),
+checks that both agree on every transaction and prints the timings. Some
+transactions are in BTC, and some logs are in USD, which --fx converts.
+
+    python -m benchmarks.reconcile_core --rows 1000000 [--fx] [--tolerance 0.05]
+"""
+import argparse
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from reconciliation.engine import TX_ID, classify_transaction
+from reconciliation.matching import EXACT_MATCHER, FxTable, Matcher
+from reconciliation.vectorized import classify_chunk, classify_frame, payment_logs_frame, transactions_frame
+
+STATUSES = ["Pending", "Success", "Failed"]
+FX_RATES = [
+    ("USD", "MYR", datetime(2024, 1, 1), Decimal("4.5")),
+    ("USD", "MYR", datetime(2025, 1, 1, 12), Decimal("4.4735")),
+    ("BTC", "USD", datetime(2024, 1, 1), Decimal("64250.1234567890")),
+]
+
+
+def benchmark_matcher(fx: bool = False, tolerance: Decimal = Decimal(0), tolerance_ratio: Decimal = Decimal(0)) -> Matcher:
+    if not fx and not tolerance and not tolerance_ratio:
+        return EXACT_MATCHER
+    return Matcher(FxTable(FX_RATES if fx else ()), tolerance=tolerance, tolerance_ratio=tolerance_ratio, link_unlinked=False)
+
+
+def synthetic_chunk(rows: int, seed: int = 7):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    transactions, logs_by_transaction = [], {}
+    for index in range(rows):
+        transaction_id = f"tx-{index:08d}"
+        currency = "BTC" if rng.random() < 0.05 else "MYR"
+        amount = Decimal(rng.randint(100, 10_000_000)) / 100
+        status = rng.choice(STATUSES)
+        date = start + timedelta(seconds=index)
+        transactions.append((
+            transaction_id, "user", "account", "FPX", "Payment", amount, currency, status, date,
+            f"ref-{index}", Decimal("0.00"), amount,
+        ))
+
+        logs = []
+        for log_index in range(rng.choices([0, 1, 2], weights=[10, 85, 5])[0]):
+            gateway_amount = amount if rng.random() < 0.9 else amount + Decimal(rng.randint(-500, 500)) / 100
+            gateway_currency = currency
+            if rng.random() < 0.1:
+                # Settled in USD; rounded to cents, as the gateway would report it
+                gateway_currency = "USD"
+                rate = Decimal("4.5") if currency == "MYR" else Decimal("64250.1234567890")
+                gateway_amount = (gateway_amount / rate if currency == "MYR" else gateway_amount * rate).quantize(Decimal("0.01"))
+            response = status if rng.random() < 0.9 else rng.choice(STATUSES)
+            logs.append((
+                f"log-{index}-{log_index}", transaction_id, "Gateway", f"gw-{index}", rng.choice(STATUSES),
+                gateway_amount, gateway_currency, response, date + timedelta(seconds=rng.randint(0, 86400)),
+            ))
+        logs.sort(key=lambda log: log[8], reverse=True)
+        logs_by_transaction[transaction_id] = logs
+    return transactions, logs_by_transaction
+
+
+def timed(label: str, rows: int, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {elapsed:8.3f}s  {rows / elapsed:>12,.0f} rows/s")
+    return result
+
+
+def check_equivalence(transactions, expected, actual) -> int:
+    mismatches = 0
+    for transaction, row_result, vector_result in zip(transactions, expected, actual):
+        row_result, vector_result = dict(row_result), dict(vector_result)
+        # The row path subtracts floats, so the two can differ in the last bits
+        same_discrepancy = math.isclose(
+            row_result.pop("discrepancy_amount"), vector_result.pop("discrepancy_amount"), rel_tol=1e-12, abs_tol=1e-9
+        )
+        if not same_discrepancy or row_result != vector_result:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"Mismatch for {transaction[TX_ID]}: {row_result} != {vector_result}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--fx", action="store_true", help="convert USD gateway amounts with FX_RATES")
+    parser.add_argument("--tolerance", type=Decimal, default=Decimal(0))
+    parser.add_argument("--tolerance-ratio", type=Decimal, default=Decimal(0))
+    args = parser.parse_args()
+    matcher = benchmark_matcher(args.fx, args.tolerance, args.tolerance_ratio)
+
+    print(f"Generating {args.rows:,} transactions...")
+    transactions, logs_by_transaction = synthetic_chunk(args.rows, args.seed)
+    payment_logs = [log for transaction in transactions for log in logs_by_transaction[transaction[TX_ID]]]
+
+    expected = timed("row-by-row classify_transaction", args.rows, lambda: [
+        classify_transaction(transaction, logs_by_transaction[transaction[TX_ID]], matcher) for transaction in transactions
+    ])
+    frames = timed("build frames", args.rows, lambda: (transactions_frame(transactions), payment_logs_frame(payment_logs)))
+    timed("classify_frame (columnar only)", args.rows, classify_frame, *frames, matcher)
+    actual = timed("classify_chunk (end to end)", args.rows, classify_chunk, transactions, logs_by_transaction, matcher)
+
+    mismatches = check_equivalence(transactions, expected, actual)
+    print(f"{args.rows - mismatches:,}/{args.rows:,} transactions classified identically")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Serialization cost of a /reconcile_data page.
+
+Builds synthetic reconciliation records (Decimal amounts, long root-cause
+analyses) and times the previous response path, a per-row strftime of
+transaction_date followed by FastAPI's jsonable_encoder and json.dumps,
+against the current one: dates already formatted by MySQL and the rows
+rendered by orjson. Checks both produce the same JSON and prints the cost
+per 10k records.
+
+    python -m benchmarks.serialize_records --records 100000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+
+from reconciliation.records import DATE_FORMAT, RECORD_COLUMNS
+from serialization import ORJSONResponse
+
+CATEGORIES = ["Missing Payments", "Amount Mismatch", "Status Mismatch", "Duplicates"]
+ROOT_CAUSE = ("The gateway reported the payment as settled but the transaction remained pending in the ledger; "
+              "the callback was retried after the settlement window closed. ") * 4
+
+
+def synthetic_records(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    for index in range(count):
+        amount = Decimal(rng.randint(100, 500_000)) / 100
+        yield {
+            "reconciliation_id": f"rec-{index}",
+            "transaction_id": f"tx-{index}",
+            "discrepancy_category": rng.choice(CATEGORIES),
+            "transaction_date": start + timedelta(seconds=rng.randint(0, 86_400 * 30)),
+            "payment_reference": f"ref-{index}",
+            "amount": amount,
+            "status": "Success",
+            "gateway_status": rng.choice(["Success", "Failed", "Pending"]),
+            "discrepancy_amount": amount - Decimal(rng.randint(0, 1000)) / 100,
+            "root_cause": ROOT_CAUSE,
+            "assigned_to": None,
+            "resolution_status": "Open",
+            "balance": Decimal(rng.randint(0, 10_000_000)) / 100,
+            "reconciled_balance": Decimal(rng.randint(0, 10_000_000)) / 100,
+        }
+
+
+def previous_path(records):
+    for record in records:
+        if record["transaction_date"]:
+            record["transaction_date"] = record["transaction_date"].strftime(DATE_FORMAT)
+    return json.dumps(jsonable_encoder(records), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def current_path(records):
+    return ORJSONResponse(records).body
+
+
+def timed(path, records, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        page = [dict(record) for record in records]
+        started = time.perf_counter()
+        body = path(page)
+        best = min(best, time.perf_counter() - started)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    records = list(synthetic_records(args.records))
+    assert list(records[0]) == RECORD_COLUMNS
+    # What the database hands back now that the query formats the date
+    formatted = [dict(record, transaction_date=record["transaction_date"].strftime(DATE_FORMAT)) for record in records]
+
+    previous_seconds, previous_body = timed(previous_path, records, args.repeat)
+    current_seconds, current_body = timed(current_path, formatted, args.repeat)
+
+    per_10k = 10_000 / args.records * 1000
+    print(f"{'strftime + jsonable_encoder + json':<36} {previous_seconds * per_10k:8.2f} ms / 10k records")
+    print(f"{'SQL DATE_FORMAT + orjson':<36} {current_seconds * per_10k:8.2f} ms / 10k records")
+    print(f"Speedup {previous_seconds / current_seconds:.1f}x, {len(current_body) / args.records:,.0f} bytes/record")
+
+    if json.loads(previous_body) != json.loads(current_body):
+        print("Responses differ")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Batch settlement search at volume.
+
+Builds accounts of synthetic transactions, settles random groups of 2 to
+6 of them per settlement line (plus lines that match nothing), and
+allocates every line with splits.find_subset() the way
+allocate_batch_settlements() does: candidates from the line's account
+within the time window, largest line first, each transaction used once.
+Checks every allocation sums to its line and prints the throughput and
+how many lines were found, missed or cut off by the search budget.
+
+    python -m benchmarks.split_matching --accounts 2000 --per-account 50
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from reconciliation.splits import SPLIT_MAX_PARTS, SPLIT_SEARCH_BUDGET, find_subset
+
+WINDOW = timedelta(minutes=60)
+
+
+def synthetic_settlements(accounts: int, per_account: int, seed: int = 7):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    transactions, settlements = {}, []
+    for account in range(accounts):
+        members = []
+        for index in range(per_account):
+            transaction_id = f"tx-{account:05d}-{index:04d}"
+            transactions[transaction_id] = (account, rng.randint(100, 500_000), start + timedelta(minutes=rng.randint(0, per_account * 5)))
+            members.append(transaction_id)
+        # A settlement pays transactions close together in time
+        members.sort(key=lambda transaction_id: transactions[transaction_id][2], reverse=True)
+        while len(members) >= 6:
+            parts = [members.pop() for _ in range(rng.randint(2, 6))]
+            at = max(transactions[transaction_id][2] for transaction_id in parts)
+            settlements.append((account, sum(transactions[transaction_id][1] for transaction_id in parts), at, parts))
+        # A line nothing adds up to
+        settlements.append((account, rng.randint(10_000_000, 20_000_000), start + timedelta(minutes=per_account * 2), None))
+    return transactions, settlements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=2_000)
+    parser.add_argument("--per-account", type=int, default=50)
+    parser.add_argument("--budget", type=int, default=SPLIT_SEARCH_BUDGET)
+    args = parser.parse_args()
+
+    transactions, settlements = synthetic_settlements(args.accounts, args.per_account)
+    by_account = {}
+    for transaction_id, (account, _, _) in transactions.items():
+        by_account.setdefault(account, []).append(transaction_id)
+
+    allocated = set()
+    found = missed = exact = 0
+    started = time.perf_counter()
+    for account, target, at, parts in sorted(settlements, key=lambda settlement: -settlement[1]):
+        candidates = [
+            (transactions[transaction_id][1], transaction_id) for transaction_id in by_account[account]
+            if transaction_id not in allocated and abs(transactions[transaction_id][2] - at) <= WINDOW
+        ]
+        subset = find_subset(target, candidates, max_parts=SPLIT_MAX_PARTS, budget=args.budget)
+        if subset is None:
+            missed += 1
+            continue
+        assert sum(transactions[transaction_id][1] for transaction_id in subset) == target
+        allocated.update(subset)
+        found += 1
+        exact += parts is not None and sorted(subset) == sorted(parts)
+    seconds = time.perf_counter() - started
+
+    print(f"{len(transactions):,} transactions, {len(settlements):,} settlement lines in {seconds:.2f}s "
+          f"({len(settlements) / seconds:,.0f} lines/s)")
+    print(f"found {found:,} ({exact:,} the generating subset), not found {missed:,}, "
+          f"transactions allocated {len(allocated):,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compiled gateway mappings vs per-dataset pandas rename/replace.
+
+Builds a synthetic fpx_payment_logs table, maps it onto payment_logs with
+ingestion.standardize and with the rename()/replace() code the LLM code
+generator used to emit (run over 1M-row slices so 10M rows fit in memory),
+checks both produce the same statuses and prints the throughput.
+
+    python -m benchmarks.standardize_gateways --rows 10000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from ingestion.standardize import GATEWAY_MAPPINGS, standardize
+
+TABLE = "fpx_payment_logs"
+WORDS = ["Successful", "Unsuccessful", "In Progress", "Processed", "Reversed", "Pending", "Completed"]
+BANKS = ["Maybank", "CIMB Bank", "Public Bank", "RHB Bank", "Hong Leong Bank"]
+SLICE_ROWS = 1_000_000
+
+
+def synthetic_table(rows: int, seed: int = 7) -> pa.Table:
+    rng = np.random.default_rng(seed)
+    numbers = pa.array(np.arange(rows)).cast(pa.string())
+    return pa.table({
+        "unique_id": pc.binary_join_element_wise("log-", numbers, ""),
+        "tx_id": pc.binary_join_element_wise("tx-", numbers, ""),
+        "bank_name": pa.array(BANKS).take(pa.array(rng.integers(0, len(BANKS), rows))),
+        "fpx_tx_id": pc.binary_join_element_wise("fpx-", numbers, ""),
+        "gateway_verification": pa.array(WORDS).take(pa.array(rng.integers(0, len(WORDS), rows))),
+        "amount": pa.array(np.round(rng.uniform(1, 5000, rows), 2)),
+        "currency": pa.array(["MYR"] * rows),
+        "gateway_response": pa.array(WORDS).take(pa.array(rng.integers(0, len(WORDS), rows))),
+        "time_stamp": pa.array(1_735_689_600 + rng.integers(0, 86_400 * 30, rows)).cast(pa.timestamp("s")),
+    })
+
+
+def pandas_baseline(frame):
+    mapping = GATEWAY_MAPPINGS[TABLE]
+    standardized = frame.rename(columns={source: target for target, source in mapping.columns.items()})
+    replacements = {word: mapping.statuses[word.lower()] for word in WORDS}
+    for column in mapping.status_columns:
+        standardized[column] = standardized[column].replace(replacements)
+    return standardized
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows:,} {TABLE} rows...")
+    source = synthetic_table(args.rows)
+
+    started = time.perf_counter()
+    compiled = standardize(TABLE, source)
+    compiled_seconds = time.perf_counter() - started
+    print(f"{'compiled mapping (Arrow)':<34} {compiled_seconds:8.3f}s  {args.rows / compiled_seconds:>12,.0f} rows/s")
+
+    baseline_seconds, mismatches = 0.0, 0
+    for offset in range(0, args.rows, SLICE_ROWS):
+        frame = source.slice(offset, SLICE_ROWS).to_pandas()
+        started = time.perf_counter()
+        expected = pandas_baseline(frame)
+        baseline_seconds += time.perf_counter() - started
+        actual = compiled.slice(offset, SLICE_ROWS)
+        for column in GATEWAY_MAPPINGS[TABLE].status_columns:
+            mismatches += int((expected[column].to_numpy() != actual.column(column).to_numpy(zero_copy_only=False)).sum())
+    print(f"{'pandas rename/replace':<34} {baseline_seconds:8.3f}s  {args.rows / baseline_seconds:>12,.0f} rows/s")
+
+    print(f"Status mismatches: {mismatches:,}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
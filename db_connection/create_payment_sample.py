@@ -1,4 +1,5 @@
 
+import os
 import random
 import uuid
 from datetime import datetime, timedelta
@@ -42,11 +43,11 @@ class GenerationConfig:
 @dataclass
 class DBConfig:
     """Database connection configuration"""
-    host: str = "10.10.240.93"
-    user: str = "app_user"
-    password: str = "app_password"
-    port: str = "3306"
-    database: str = "payment_resolution"
+    host: str = os.getenv("DB_HOST", "127.0.0.1")
+    user: str = os.getenv("DB_USER", "app_user")
+    password: str = os.getenv("DB_PASSWORD", "app_password")
+    port: str = os.getenv("DB_PORT", "3306")
+    database: str = os.getenv("DB_NAME", "payment_resolution")
 
 def create_database(db_config: DBConfig):
     """Create the trading_platform database if it doesn't exist."""
@@ -310,13 +311,8 @@ if __name__ == "__main__":
         processing_fee_percentage=0.025  # 2.5% processing fee
     )
     
-    db_config = DBConfig(
-        host ="10.10.240.93",
-        user = "app_user",
-        password = "app_password",
-        port = "3306",
-        database = "payment_resolution"
-    )
+    # DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
+    db_config = DBConfig()
     
     # Generate data
     transactions = generate_transactions(gen_config)
@@ -1,15 +1,16 @@
+import os
+
 import mysql.connector
-import pandas as pd
 from mysql.connector import Error
 
 def upload_to_mysql(dataframe, table_name):
     try:
         db_config = {
-            'host': '10.10.240.93',
-            'user': 'app_user',
-            'password': 'app_password',
-            'database': 'payment_resolution',
-            'port': 3306
+            'host': os.getenv('DB_HOST', '127.0.0.1'),
+            'user': os.getenv('DB_USER', 'app_user'),
+            'password': os.getenv('DB_PASSWORD', 'app_password'),
+            'database': os.getenv('DB_NAME', 'payment_resolution'),
+            'port': int(os.getenv('DB_PORT', '3306'))
         }
         
         # Establish a connection to the MySQL database
@@ -38,19 +39,14 @@ def upload_to_mysql(dataframe, table_name):
         
         delete_query = f"DELETE FROM {table_name} WHERE status = 'Duplicate';"
         
-        # Convert DataFrame to a list of tuples
-        data_tuples = [
-            (
-                str(row["log_id"]),
-                str(row["transaction_id"]),
-                str(row["user_id"]),
-                str(row["payment_method"]),
-                float(row["amount"]) if pd.notna(row["amount"]) else None,
-                str(row["status"]),
-                row["timestamp"] if pd.notna(row["timestamp"]) else None
-            )
-            for _, row in dataframe.iterrows()
-        ]
+        # Convert DataFrame to a list of tuples, column by column
+        columns = ["log_id", "transaction_id", "user_id", "payment_method", "amount", "status", "timestamp"]
+        frame = dataframe[columns].copy()
+        for column in ["log_id", "transaction_id", "user_id", "payment_method", "status"]:
+            frame[column] = frame[column].astype(str)
+        frame["amount"] = frame["amount"].astype(float)
+        frame = frame.astype(object).where(frame.notna(), None)
+        data_tuples = list(frame.itertuples(index=False, name=None))
 
         # Execute batch insert for better performance
         cursor.executemany(insert_query, data_tuples)
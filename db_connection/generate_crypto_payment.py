@@ -1,3 +1,4 @@
+import os
 import random
 import uuid
 import mysql.connector
@@ -5,11 +6,11 @@ from datetime import datetime, timedelta
 
 # MySQL Database Configuration
 DB_CONFIG = {
-    "host": "10.10.240.93",
-    "user": "app_user",
-    "password": "app_password",
-    "database": "payment_resolution",
-    "port": 3306
+    "host": os.getenv("DB_HOST", "127.0.0.1"),
+    "user": os.getenv("DB_USER", "app_user"),
+    "password": os.getenv("DB_PASSWORD", "app_password"),
+    "database": os.getenv("DB_NAME", "payment_resolution"),
+    "port": int(os.getenv("DB_PORT", "3306"))
 }
 
 # Cryptocurrency options
@@ -0,0 +1,151 @@
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+import aiomysql
+
+
+@dataclass
+class PoolConfig:
+    """Shared aiomysql pool configuration"""
+    host: str = "10.10.240.93"
+    user: str = "app_user"
+    password: str = "app_password"
+    port: int = 3306
+    database: str = "payment_resolution_db"
+    minsize: int = 1
+    maxsize: int = 10
+    pool_recycle: int = 3600  # Seconds before an idle connection is replaced
+    ping_on_acquire: bool = False  # Ping (and reconnect) every connection handed out
+    slow_wait_ms: float = 100.0  # Pool waits above this are counted as slow
+
+    @classmethod
+    def from_env(cls) -> "PoolConfig":
+        return cls(
+            host=os.getenv("DB_HOST", cls.host),
+            user=os.getenv("DB_USER", cls.user),
+            password=os.getenv("DB_PASSWORD", cls.password),
+            port=int(os.getenv("DB_PORT", cls.port)),
+            database=os.getenv("DB_NAME", cls.database),
+            minsize=int(os.getenv("DB_POOL_MIN_SIZE", cls.minsize)),
+            maxsize=int(os.getenv("DB_POOL_MAX_SIZE", cls.maxsize)),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", cls.pool_recycle)),
+            ping_on_acquire=os.getenv("DB_POOL_PING_ON_ACQUIRE", "false").lower() == "true",
+            slow_wait_ms=float(os.getenv("DB_POOL_SLOW_WAIT_MS", cls.slow_wait_ms)),
+        )
+
+
+_pool: Optional[aiomysql.Pool] = None
+_config: Optional[PoolConfig] = None
+_metrics = {
+    "acquired": 0,
+    "slow_waits": 0,
+    "total_wait_ms": 0.0,
+    "max_wait_ms": 0.0,
+}
+
+
+async def init_pool(config: Optional[PoolConfig] = None) -> aiomysql.Pool:
+    """Create the application-wide pool. Call once at startup."""
+    global _pool, _config
+    if _pool is not None:
+        return _pool
+
+    _config = config or PoolConfig.from_env()
+    # autocommit keeps read-only handlers from leaving a transaction open,
+    # which would make the pool close the connection on release. Writers
+    # start their own transaction with `connection.begin()`.
+    _pool = await aiomysql.create_pool(
+        host=_config.host,
+        user=_config.user,
+        password=_config.password,
+        port=_config.port,
+        db=_config.database,
+        minsize=_config.minsize,
+        maxsize=_config.maxsize,
+        pool_recycle=_config.pool_recycle,
+        autocommit=True,
+    )
+    print(f"Database pool ready (min={_config.minsize}, max={_config.maxsize})")
+    return _pool
+
+
+async def close_pool():
+    """Close the application-wide pool. Call once at shutdown."""
+    global _pool
+    if _pool is None:
+        return
+    _pool.close()
+    await _pool.wait_closed()
+    _pool = None
+
+
+def get_pool() -> aiomysql.Pool:
+    if _pool is None:
+        raise RuntimeError("Database pool is not initialised; call init_pool() first")
+    return _pool
+
+
+@asynccontextmanager
+async def acquire():
+    """Borrow a connection from the shared pool, recording how long we waited."""
+    pool = get_pool()
+    started = time.perf_counter()
+    connection = await pool.acquire()
+    wait_ms = (time.perf_counter() - started) * 1000
+
+    _metrics["acquired"] += 1
+    _metrics["total_wait_ms"] += wait_ms
+    _metrics["max_wait_ms"] = max(_metrics["max_wait_ms"], wait_ms)
+    if wait_ms > _config.slow_wait_ms:
+        _metrics["slow_waits"] += 1
+
+    try:
+        if _config.ping_on_acquire:
+            await connection.ping(reconnect=True)
+        yield connection
+    finally:
+        pool.release(connection)
+
+
+async def health_check() -> dict:
+    """Round-trip a trivial query through the pool."""
+    started = time.perf_counter()
+    try:
+        async with acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SELECT 1")
+                await cursor.fetchone()
+        status = "ok"
+        error = None
+    except Exception as e:
+        status = "error"
+        error = str(e)
+
+    return {
+        "status": status,
+        "error": error,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        "pool": pool_metrics(),
+    }
+
+
+def pool_metrics() -> dict:
+    acquired = _metrics["acquired"]
+    metrics = {
+        "acquired": acquired,
+        "slow_waits": _metrics["slow_waits"],
+        "avg_wait_ms": round(_metrics["total_wait_ms"] / acquired, 3) if acquired else 0.0,
+        "max_wait_ms": round(_metrics["max_wait_ms"], 3),
+    }
+    if _pool is not None:
+        metrics.update({
+            "size": _pool.size,
+            "free": _pool.freesize,
+            "in_use": _pool.size - _pool.freesize,
+            "minsize": _pool.minsize,
+            "maxsize": _pool.maxsize,
+        })
+    return metrics
@@ -0,0 +1,147 @@
+import os
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Sequence
+
+# Run registered statements as server-side prepared statements
+# (PREPARE/EXECUTE). aiomysql only speaks the text protocol, so parameters
+# go through user variables: each call costs a SET and an EXECUTE round
+# trip instead of one query, which only pays off for statements whose
+# parsing and planning outweigh a round trip. Measure with the histograms.
+QUERY_PREPARE = os.getenv("QUERY_PREPARE", "false").lower() == "true"
+
+# Upper bounds, in milliseconds, of the latency histogram buckets
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# MySQL error for EXECUTE of a statement the connection doesn't have (e.g. after a reconnect)
+UNKNOWN_PREPARED_STATEMENT = 1243
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; percentiles resolve to a bucket's upper bound."""
+
+    def __init__(self, buckets_ms: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms: float):
+        self.counts[bisect_left(self.buckets_ms, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def percentile(self, fraction: float) -> float:
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets_ms, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def snapshot(self) -> dict:
+        labels = [f"<={bound}ms" for bound in self.buckets_ms] + [f">{self.buckets_ms[-1]}ms"]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 2),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(0.5) if self.count else 0.0,
+            "p95_ms": self.percentile(0.95) if self.count else 0.0,
+            "p99_ms": self.percentile(0.99) if self.count else 0.0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+@dataclass
+class Statement:
+    """A hot statement, defined once with %s placeholders."""
+    name: str
+    sql: str
+
+    @property
+    def handle(self) -> str:
+        return f"reconx_{self.name}"
+
+    @property
+    def prepared_sql(self) -> str:
+        return self.sql.replace("%s", "?")
+
+
+class QueryRegistry:
+    """
+    Named hot statements with a latency histogram each.
+
+    execute() runs a registered statement, as a prepared statement when
+    `prepare` is on. Statements are prepared lazily, once per pooled
+    connection. timed() records the latency of SQL built at run time (e.g.
+    IN lists), which can't be prepared once.
+    """
+
+    def __init__(self, prepare: bool = QUERY_PREPARE):
+        self.prepare = prepare
+        self.statements: Dict[str, Statement] = {}
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        # Handles prepared on each connection; dropped with the connection
+        self._prepared: "weakref.WeakKeyDictionary[object, set]" = weakref.WeakKeyDictionary()
+
+    def register(self, name: str, sql: str) -> Statement:
+        if name in self.statements and self.statements[name].sql != sql:
+            raise ValueError(f"Statement {name} is already registered with different SQL")
+        self.statements[name] = Statement(name, sql)
+        self.histograms.setdefault(name, LatencyHistogram())
+        return self.statements[name]
+
+    @asynccontextmanager
+    async def timed(self, name: str):
+        histogram = self.histograms.setdefault(name, LatencyHistogram())
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe((time.perf_counter() - started) * 1000)
+
+    async def execute(self, cursor, statement: Statement, params: Sequence = ()):
+        """Run `statement` on `cursor`; read the result with the cursor's fetch methods as usual."""
+        async with self.timed(statement.name):
+            if not self.prepare:
+                await cursor.execute(statement.sql, tuple(params))
+                return
+            try:
+                await self._execute_prepared(cursor, statement, params)
+            except Exception as e:
+                if not e.args or e.args[0] != UNKNOWN_PREPARED_STATEMENT:
+                    raise
+                # The server lost the statement (reconnect, DEALLOCATE); prepare it again
+                self._prepared.pop(cursor.connection, None)
+                await self._execute_prepared(cursor, statement, params)
+
+    async def _execute_prepared(self, cursor, statement: Statement, params: Sequence):
+        prepared = self._prepared.setdefault(cursor.connection, set())
+        if statement.name not in prepared:
+            await cursor.execute(f"PREPARE {statement.handle} FROM %s", (statement.prepared_sql,))
+            prepared.add(statement.name)
+
+        using = ""
+        if params:
+            variables = [f"@{statement.handle}_{index}" for index in range(len(params))]
+            await cursor.execute("SET " + ", ".join(f"{variable} = %s" for variable in variables), tuple(params))
+            using = " USING " + ", ".join(variables)
+        await cursor.execute(f"EXECUTE {statement.handle}{using}")
+
+    def metrics(self) -> dict:
+        """Histogram snapshots, the statements with the most total time first."""
+        ranked = sorted(self.histograms.items(), key=lambda item: item[1].total_ms, reverse=True)
+        return {
+            "prepared": self.prepare,
+            "statements": {name: histogram.snapshot() for name, histogram in ranked},
+        }
+
+
+registry = QueryRegistry()
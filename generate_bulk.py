@@ -0,0 +1,305 @@
+"""
+Seeded, vectorized synthetic data for load-testing the reconciler.
+
+Generates transactions with their payment_logs and crypto, FPX, e-wallet
+and mobile gateway logs in chunks of --chunk-rows transactions. Every
+column of a chunk is drawn with NumPy at once and assembled as Arrow
+tables. Each chunk is written out before the next one is generated, so
+memory stays flat however many transactions are asked for. Chunk `i` is
+drawn from the seed (seed, i), so a run is reproducible and any chunk can
+be regenerated on its own.
+
+Discrepancies follow GenerationConfig's rates, as in generate_data.py.
+Among Success transactions, some have no payment log (Missing Payments),
+some a shifted gateway amount (Amount Mismatch), some a Pending gateway
+status and response (Status Mismatch), and some a second log (Duplicate
+Payment).
+
+Output goes to one CSV or Parquet file per table, or straight into MySQL.
+MySQL takes each chunk through LOAD DATA LOCAL INFILE, which needs
+local_infile enabled on the server; otherwise rows are inserted in
+batches. The gateway log files use the upload schemas, so they can also
+be fed to the /upload API. Ids embed the seed: add more data to an
+existing database with another --seed.
+
+    python -m generate_bulk --transactions 20000000 --format parquet --out data/
+    python -m generate_bulk --transactions 5000000 --format mysql --recreate
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import mysql.connector
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from generate_data import (
+    GATEWAY_LOG_TABLES, OTHER_GATEWAY, DBConfig, GenerationConfig, create_database, create_tables
+)
+from ingestion.loader import AMOUNT, TEXT, TIMESTAMP, UPLOAD_SCHEMAS
+
+GENERATE_CHUNK_ROWS = int(os.getenv("GENERATE_CHUNK_ROWS", "500000"))
+# Rows per INSERT batch when the server refuses LOAD DATA LOCAL INFILE
+INSERT_BATCH_ROWS = 10_000
+
+TRANSACTIONS_SCHEMA = pa.schema([
+    ("transaction_id", TEXT), ("user_id", TEXT), ("account_id", TEXT), ("payment_method", TEXT),
+    ("transaction_type", TEXT), ("amount", AMOUNT), ("currency", TEXT), ("transaction_status", TEXT),
+    ("transaction_date", TIMESTAMP), ("payment_reference", TEXT), ("processing_fee", AMOUNT),
+    ("net_amount", AMOUNT), ("remarks", TEXT),
+])
+TABLE_SCHEMAS = {
+    "transactions": TRANSACTIONS_SCHEMA,
+    **{table: UPLOAD_SCHEMAS[table].arrow_schema() for table, _ in GATEWAY_LOG_TABLES.values()},
+    "payment_logs": UPLOAD_SCHEMAS["payment_logs"].arrow_schema(),
+}
+# Parents first, for the foreign keys
+TABLE_ORDER = list(TABLE_SCHEMAS)
+
+TRANSACTION_TYPES = ["Deposit", "Withdrawal"]
+ACCOUNTS = 9000  # acc_1000 .. acc_9999, as generate_data draws them
+
+
+def ids(prefix: str, numbers: np.ndarray, width: int = 12) -> pa.Array:
+    """`prefix` followed by each number, zero-padded to `width` digits."""
+    digits = pc.utf8_lpad(pc.cast(pa.array(numbers), pa.string()), width, "0")
+    return pc.binary_join_element_wise(prefix, digits, "")
+
+
+def pick(rng: np.random.Generator, pool: List[str], size: int) -> pa.Array:
+    return pa.array(pool).take(pa.array(rng.integers(0, len(pool), size)))
+
+
+def cents(values: np.ndarray) -> np.ndarray:
+    return np.round(values, 2)
+
+
+def generate_chunk(
+    config: GenerationConfig, seed: int, chunk: int, start: int, size: int, end: datetime
+) -> Dict[str, pa.Table]:
+    """Transactions `start` .. `start + size` and their logs, one Arrow table per table."""
+    rng = np.random.default_rng([seed, chunk])
+    numbers = np.arange(start, start + size)
+
+    method_index = rng.integers(0, len(config.payment_methods), size)
+    methods = pa.array(config.payment_methods).take(pa.array(method_index))
+    currencies = pick(rng, config.currencies, size)
+    amount = cents(rng.uniform(100, 5000, size))
+    fee = cents(amount * config.processing_fee_percentage)
+    success = rng.random(size) >= config.pending_probability
+    seconds_back = rng.integers(86_400, config.days_range * 86_400 + 1, size)
+    transaction_date = np.datetime64(end, "s") - seconds_back.astype("timedelta64[s]")
+    transaction_ids = ids(f"tx-{seed}-", numbers)
+
+    tables = {"transactions": pa.table({
+        "transaction_id": transaction_ids,
+        "user_id": pick(rng, config.users, size),
+        "account_id": ids("acc_", rng.integers(1000, 1000 + ACCOUNTS, size), width=4),
+        "payment_method": methods,
+        "transaction_type": pick(rng, TRANSACTION_TYPES, size),
+        "amount": amount,
+        "currency": currencies,
+        "transaction_status": pa.array(np.where(success, "Success", "Pending")),
+        "transaction_date": transaction_date,
+        "payment_reference": ids(f"ref-{seed}-", numbers),
+        "processing_fee": fee,
+        "net_amount": cents(amount - fee),
+        "remarks": pa.array(np.full(size, "")),
+    }, schema=TRANSACTIONS_SCHEMA)}
+
+    # Only Success transactions reach a gateway, and some never show up there
+    logged = success & (rng.random(size) >= config.missing_payment_probability)
+    amount_mismatch = logged & (rng.random(size) < config.amount_mismatch_probability)
+    status_mismatch = logged & (rng.random(size) < config.status_mismatch_probability)
+    duplicate = logged & ~status_mismatch & (rng.random(size) < config.duplicate_payment_probability)
+
+    # One gateway name per transaction, from its payment method's pool
+    pools = [GATEWAY_LOG_TABLES.get(method, (None, [OTHER_GATEWAY]))[1] for method in config.payment_methods]
+    offsets = np.cumsum([0] + [len(pool) for pool in pools])[:-1]
+    sizes = np.array([len(pool) for pool in pools])
+    gateway_names = pa.array([name for pool in pools for name in pool]).take(
+        pa.array(offsets[method_index] + (rng.random(size) * sizes[method_index]).astype(np.int64))
+    )
+    log_ids = ids(f"log-{seed}-", numbers)
+    gateway_transaction_ids = ids(f"gw-{seed}-", numbers)
+    timestamp = transaction_date + rng.integers(60, 3601, size).astype("timedelta64[s]")
+
+    # Gateway tables record what the gateway saw, before any discrepancy
+    for method, (table, _) in GATEWAY_LOG_TABLES.items():
+        if method not in config.payment_methods:
+            continue
+        mask = logged & (method_index == config.payment_methods.index(method))
+        rows = pa.array(mask)
+        verified = pa.array(np.full(int(mask.sum()), "Success"))
+        tables[table] = pa.Table.from_arrays([
+            log_ids.filter(rows), transaction_ids.filter(rows), gateway_names.filter(rows),
+            gateway_transaction_ids.filter(rows), verified, pa.array(amount[mask]), currencies.filter(rows),
+            verified, pa.array(timestamp[mask]),
+        ], schema=TABLE_SCHEMAS[table])
+
+    gateway_amount = amount + np.where(amount_mismatch, cents(amount * rng.uniform(0.01, 0.1, size)), 0)
+    # The reconciler compares the transaction's status with gateway_response
+    gateway_status = np.where(status_mismatch, "Pending", "Success")
+    logs = pa.table({
+        "log_id": log_ids,
+        "transaction_id": transaction_ids,
+        "gateway_name": gateway_names,
+        "gateway_transaction_id": gateway_transaction_ids,
+        "gateway_status": gateway_status,
+        "gateway_amount": cents(gateway_amount),
+        "gateway_currency": currencies,
+        "gateway_response": gateway_status,
+        "timestamp": timestamp,
+    }, schema=TABLE_SCHEMAS["payment_logs"]).filter(pa.array(logged))
+    duplicates = logs.filter(pa.array(duplicate[logged])).set_column(
+        0, "log_id", ids(f"dup-{seed}-", numbers[duplicate])
+    )
+    # A retried capture lands a few minutes after the first
+    duplicates = duplicates.set_column(
+        8, "timestamp", pa.array(timestamp[duplicate] + rng.integers(60, 301, int(duplicate.sum())).astype("timedelta64[s]"))
+    )
+    tables["payment_logs"] = pa.concat_tables([logs, duplicates])
+    return tables
+
+
+def generate_chunks(
+    config: GenerationConfig, seed: int = 7, chunk_rows: int = GENERATE_CHUNK_ROWS, end: Optional[datetime] = None
+) -> Iterator[Dict[str, pa.Table]]:
+    """config.num_transactions transactions and their logs, `chunk_rows` transactions at a time."""
+    end = end or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for chunk, start in enumerate(range(0, config.num_transactions, chunk_rows)):
+        yield generate_chunk(config, seed, chunk, start, min(chunk_rows, config.num_transactions - start), end)
+
+
+class FileSink:
+    """One file per table, appended to chunk by chunk."""
+
+    def __init__(self, directory: str, file_format: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.file_format = file_format
+        self.writers = {}
+
+    def write(self, table: str, data: pa.Table):
+        writer = self.writers.get(table)
+        if writer is None:
+            path = os.path.join(self.directory, f"{table}.{self.file_format}")
+            if self.file_format == "parquet":
+                writer = pq.ParquetWriter(path, data.schema)
+            else:
+                writer = pa_csv.CSVWriter(path, data.schema, write_options=pa_csv.WriteOptions(quoting_style="needed"))
+            self.writers[table] = writer
+        writer.write_table(data)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+class MySQLSink:
+    """Bulk-loads every chunk into the database, committing chunk by chunk."""
+
+    def __init__(self, db_config: DBConfig, recreate: bool = False):
+        if recreate:
+            create_database(db_config)
+        self.connection = mysql.connector.connect(
+            host=db_config.host, user=db_config.user, password=db_config.password,
+            port=db_config.port, database=db_config.database, allow_local_infile=True,
+        )
+        self.cursor = self.connection.cursor()
+        create_tables(self.cursor)
+        self.load_data = True
+
+    def write(self, table: str, data: pa.Table):
+        if self.load_data:
+            try:
+                self._load_data(table, data)
+                return
+            except mysql.connector.Error as e:
+                # local_infile off on the server, or refused by the client library
+                print(f"LOAD DATA LOCAL INFILE unavailable ({e}); inserting in batches instead")
+                self.connection.rollback()
+                self.load_data = False
+        self._insert(table, data)
+
+    def _load_data(self, table: str, data: pa.Table):
+        with tempfile.NamedTemporaryFile(suffix=".csv") as chunk_file:
+            pa_csv.write_csv(data, chunk_file.name, pa_csv.WriteOptions(include_header=False, quoting_style="needed"))
+            self.cursor.execute(f"""
+                LOAD DATA LOCAL INFILE %s INTO TABLE {table}
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+                LINES TERMINATED BY '\\n'
+                ({", ".join(data.column_names)})
+            """, (chunk_file.name,))
+
+    def _insert(self, table: str, data: pa.Table):
+        query = f"""
+            INSERT INTO {table} ({", ".join(data.column_names)})
+            VALUES ({", ".join(["%s"] * data.num_columns)})
+        """
+        for batch in data.to_batches(INSERT_BATCH_ROWS):
+            self.cursor.executemany(query, list(zip(*(column.to_pylist() for column in batch.columns))))
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.cursor.close()
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--chunk-rows", type=int, default=GENERATE_CHUNK_ROWS)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--format", choices=["csv", "parquet", "mysql"], default="csv")
+    parser.add_argument("--out", default="generated", help="Directory for CSV / Parquet files")
+    parser.add_argument("--recreate", action="store_true", help="Drop and recreate the database first (mysql)")
+    parser.add_argument("--days", type=int, default=30, help="Transactions spread over this many past days")
+    parser.add_argument("--pending-rate", type=float, default=0.2)
+    parser.add_argument("--missing-rate", type=float, default=0.2)
+    parser.add_argument("--amount-mismatch-rate", type=float, default=0.2)
+    parser.add_argument("--status-mismatch-rate", type=float, default=0.2)
+    parser.add_argument("--duplicate-rate", type=float, default=0.2)
+    args = parser.parse_args()
+
+    config = GenerationConfig(
+        num_transactions=args.transactions,
+        pending_probability=args.pending_rate,
+        days_range=args.days,
+        missing_payment_probability=args.missing_rate,
+        amount_mismatch_probability=args.amount_mismatch_rate,
+        status_mismatch_probability=args.status_mismatch_rate,
+        duplicate_payment_probability=args.duplicate_rate,
+    )
+    sink = MySQLSink(DBConfig.from_env(), args.recreate) if args.format == "mysql" else FileSink(args.out, args.format)
+
+    started = time.perf_counter()
+    rows = dict.fromkeys(TABLE_ORDER, 0)
+    try:
+        for tables in generate_chunks(config, args.seed, args.chunk_rows):
+            for table in TABLE_ORDER:
+                if table in tables:
+                    sink.write(table, tables[table])
+                    rows[table] += tables[table].num_rows
+            if isinstance(sink, MySQLSink):
+                sink.commit()
+            seconds = time.perf_counter() - started
+            print(f"{rows['transactions']:,} / {config.num_transactions:,} transactions, "
+                  f"{rows['transactions'] / seconds:,.0f} per second")
+    finally:
+        sink.close()
+
+    print(", ".join(f"{table}: {count:,}" for table, count in rows.items()))
+
+
+if __name__ == "__main__":
+    main()
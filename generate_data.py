@@ -1,3 +1,4 @@
+import os
 import random
 import uuid
 from datetime import datetime, timedelta
@@ -12,6 +13,11 @@ class GenerationConfig:
     pending_probability: float = 0.2  # Probability of a transaction being pending
     days_range: int = 30  # Range of days in the past for transaction dates
     processing_fee_percentage: float = 0.02  # 2% processing fee
+    # Discrepancy rates among Success transactions
+    missing_payment_probability: float = 0.2
+    amount_mismatch_probability: float = 0.2
+    status_mismatch_probability: float = 0.2
+    duplicate_payment_probability: float = 0.2
 
     # Sample data pools
     users: list = None
@@ -37,6 +43,33 @@ class GenerationConfig:
             "Refund Processed", "Chargeback Issued"
         ]
 
+BLOCKCHAIN_PLATFORMS = [
+    "Ethereum", "Hyperledger Fabric", "Corda", "Polkadot",
+    "Avalanche", "Solana", "Binance Smart Chain", "Tezos",
+    "EOSIO", "Stellar", "Algorand", "Hedera Hashgraph"
+]
+MALAYSIAN_BANKS = [
+    "Maybank", "CIMB Bank", "Public Bank", "RHB Bank", "Hong Leong Bank",
+    "AmBank", "Bank Islam Malaysia", "Bank Muamalat", "Alliance Bank",
+    "Affin Bank", "HSBC Malaysia", "Standard Chartered Malaysia",
+    "UOB Malaysia", "OCBC Bank Malaysia", "Agrobank"
+]
+EWALLET_PLATFORMS = [
+    "Touch 'n Go eWallet", "Boost", "GrabPay", "ShopeePay",
+    "BigPay", "Lazada Wallet", "FavePay", "Setel",
+    "MAE by Maybank", "Razer Pay", "Alipay", "WeChat Pay"
+]
+MOBILE_OPERATORS = ["Vodafone", "Airtel", "Tpaga", "Equitel", "OrangeMoney"]
+OTHER_GATEWAY = "Payment Gateway X"
+
+# Payment method -> (gateway log table, gateway names)
+GATEWAY_LOG_TABLES = {
+    "Crypto": ("crypto_payment_logs", BLOCKCHAIN_PLATFORMS),
+    "FPX": ("fpx_payment_logs", MALAYSIAN_BANKS),
+    "E-Wallet": ("ewallet_payment_logs", EWALLET_PLATFORMS),
+    "Mobile": ("mobile_payment_logs", MOBILE_OPERATORS),
+}
+
 @dataclass
 class DBConfig:
     """Database connection configuration"""
@@ -46,6 +79,16 @@ class DBConfig:
     port: str = "3307"
     database: str = "trading_platform"
 
+    @classmethod
+    def from_env(cls) -> "DBConfig":
+        return cls(
+            host=os.getenv("DB_HOST", "127.0.0.1"),
+            user=os.getenv("DB_USER", cls.user),
+            password=os.getenv("DB_PASSWORD", cls.password),
+            port=os.getenv("DB_PORT", "3306"),
+            database=os.getenv("DB_NAME", "payment_resolution_db"),
+        )
+
 def create_database(db_config: DBConfig):
     """Create the trading_platform database if it doesn't exist."""
     conn = mysql.connector.connect(
@@ -223,7 +266,7 @@ def generate_payment_logs(transactions, config: GenerationConfig):
     for tx in transactions:
         is_discrepancy = False
         if tx[7] == "Success":  # Only Success transactions have gateway logs
-            if random.random() < 0.2:  # 20% chance of missing payment
+            if random.random() < config.missing_payment_probability:
                 missing_payments.append(tx[0])
                 is_discrepancy = True
                 continue
@@ -234,13 +277,7 @@ def generate_payment_logs(transactions, config: GenerationConfig):
             # Crypto payment logs
             if tx[3] == "Crypto":
                 unique_id = log_id =str(uuid.uuid4())
-                blockchain_platforms = [
-                    "Ethereum", "Hyperledger Fabric", "Corda", "Polkadot", 
-                    "Avalanche", "Solana", "Binance Smart Chain", "Tezos", 
-                    "EOSIO", "Stellar", "Algorand", "Hedera Hashgraph"
-                ]
-
-                blockchain_platform = gateway_name = random.choice(blockchain_platforms)
+                blockchain_platform = gateway_name = random.choice(BLOCKCHAIN_PLATFORMS)
                 tx_hash = gateway_transaction_id = str(uuid.uuid4())
                 gateway_verification = gateway_status = "Success"
                 gateway_currency = tx[6]
@@ -255,14 +292,7 @@ def generate_payment_logs(transactions, config: GenerationConfig):
             # FPX payment logs
             elif tx[3] == "FPX":
                 unique_id = log_id = str(uuid.uuid4())
-                malaysian_banks = [
-                    "Maybank", "CIMB Bank", "Public Bank", "RHB Bank", "Hong Leong Bank",
-                    "AmBank", "Bank Islam Malaysia", "Bank Muamalat", "Alliance Bank",
-                    "Affin Bank", "HSBC Malaysia", "Standard Chartered Malaysia",
-                    "UOB Malaysia", "OCBC Bank Malaysia", "Agrobank"
-                ]
-
-                bank_name = gateway_name = random.choice(malaysian_banks)
+                bank_name = gateway_name = random.choice(MALAYSIAN_BANKS)
                 fpx_tx_id = gateway_transaction_id = str(uuid.uuid4())
                 gateway_verification = gateway_status = "Success"
                 currency = gateway_currency = tx[6]
@@ -277,13 +307,7 @@ def generate_payment_logs(transactions, config: GenerationConfig):
             # E-Wallet payment logs
             elif tx[3] == "E-Wallet":
                 unique_id = log_id = str(uuid.uuid4())
-                ewallet_platforms = [
-                    "Touch 'n Go eWallet", "Boost", "GrabPay", "ShopeePay", 
-                    "BigPay", "Lazada Wallet", "FavePay", "Setel", 
-                    "MAE by Maybank", "Razer Pay", "Alipay", "WeChat Pay"
-                ]
-
-                ewallet_platform = gateway_name = random.choice(ewallet_platforms)
+                ewallet_platform = gateway_name = random.choice(EWALLET_PLATFORMS)
                 ewallet_tx_id = gateway_transaction_id = str(uuid.uuid4())
                 gateway_verification = gateway_status = "Success"
                 currency = gateway_currency = tx[6]
@@ -298,10 +322,7 @@ def generate_payment_logs(transactions, config: GenerationConfig):
             # Mobile payment logs
             elif tx[3] == "Mobile":
                 unique_id = log_id = str(uuid.uuid4())
-                mob_type = [
-                    "Vodafone", "Airtel", "Tpaga", "Equitel", "OrangeMoney"
-                ]
-                mob_type = gateway_name = random.choice(mob_type)
+                mob_type = gateway_name = random.choice(MOBILE_OPERATORS)
                 mob_tx_id = gateway_transaction_id = str(uuid.uuid4())
                 gateway_verification = gateway_status = "Success"
                 currency = gateway_currency = tx[6]
@@ -316,7 +337,7 @@ def generate_payment_logs(transactions, config: GenerationConfig):
             # Other payment logs
             else:
                 log_id = str(uuid.uuid4())
-                gateway_name = "Payment Gateway X"
+                gateway_name = OTHER_GATEWAY
                 gateway_transaction_id = str(uuid.uuid4())
                 gateway_status = "Success"
                 gateway_currency = tx[6]
@@ -324,18 +345,18 @@ def generate_payment_logs(transactions, config: GenerationConfig):
                 timestamp = tx[8] + timedelta(minutes=random.randint(1, 60))
 
             # Introduce discrepancies
-            if random.random() < 0.2:  # 20% chance of amount mismatch
+            if random.random() < config.amount_mismatch_probability:
                 amount_discrepancy = round(gateway_amount * random.uniform(0.01, 0.1), 2)  # 1% to 10% discrepancy
                 gateway_amount += amount_discrepancy
                 discrepancies.append((tx[0], amount_discrepancy))
                 is_discrepancy = True
 
-            if random.random() < 0.2:  # 20% chance of status mismatch
+            if random.random() < config.status_mismatch_probability:
                 gateway_status = "Pending"
                 discrepancies.append((tx[0], "Status mismatch"))
                 is_discrepancy = True
 
-            if gateway_status == "Success" and random.random() < 0.2:
+            if gateway_status == "Success" and random.random() < config.duplicate_payment_probability:
                 duplicate_payment_transactions.append(tx[0])
                 discrepancies.append((tx[0], "Duplicate payment"))
                 is_discrepancy = True
@@ -349,21 +370,10 @@ def generate_payment_logs(transactions, config: GenerationConfig):
                 gateway_response, timestamp
             ])
 
-    print("\nTransactions with discrepancies:")
-    for tx_id, discrepancy in discrepancies:
-        print(f"Transaction ID: {tx_id}, Discrepancy: {discrepancy}")
-
-    print("\nMissing payments:")
-    for tx_id in missing_payments:
-        print(f"Transaction ID: {tx_id}")
-
-    print("\nDuplicate payments:")
-    for tx_id in duplicate_payment_transactions:
-        print(f"Transaction ID: {tx_id}")
-
-    print("\nTransactions without discrepancies:")
-    for tx_id in transactions_without_discrepancy:
-        print(f"Transaction ID: {tx_id}")
+    # Counts only: listing every id drowns the output (and the run) at volume
+    print(f"Discrepancies: {len(discrepancies)}, missing payments: {len(missing_payments)}, "
+          f"duplicate payments: {len(duplicate_payment_transactions)}, "
+          f"without discrepancies: {len(transactions_without_discrepancy)}")
 
     return crypto_logs, fpx_logs, ewallet_logs, mobile_logs, payment_logs
 
@@ -456,13 +466,8 @@ if __name__ == "__main__":
         processing_fee_percentage=0.025  # 2.5% processing fee
     )
     
-    db_config = DBConfig(
-        host="127.0.0.1",
-        user="app_user",
-        password="app_password",
-        port="3306",
-        database="payment_resolution_db"
-    )
+    # DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME (defaults: local server)
+    db_config = DBConfig.from_env()
     
     # Generate data
     transactions = generate_transactions(gen_config)
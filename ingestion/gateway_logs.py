@@ -0,0 +1,162 @@
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+import aiomysql
+
+from caching import TTLCache
+from db_connection.pool import acquire
+from ingestion.standardize import GATEWAY_MAPPINGS, projection
+from reconciliation.records import Position, after_condition, decode_cursor, encode_cursor, sort_newest_first
+
+GATEWAY_LOGS_CACHE_TTL_SECONDS = float(os.getenv("GATEWAY_LOGS_CACHE_TTL_SECONDS", "30"))
+# Rows per gateway table on each /gateway_logs page
+GATEWAY_LOGS_PER_TABLE = int(os.getenv("GATEWAY_LOGS_PER_TABLE", "5"))
+GATEWAY_LOGS_MAX_PER_TABLE = int(os.getenv("GATEWAY_LOGS_MAX_PER_TABLE", "500"))
+
+GATEWAY_LABELS = {
+    "crypto_payment_logs": "Cryptocurrency",
+    "ewallet_payment_logs": "E-Wallet",
+    "fpx_payment_logs": "FPX",
+    "mobile_payment_logs": "Mobile Payment",
+}
+
+# Filters of /gateway_logs, on the standardized (payment_logs) columns
+FILTER_COLUMNS = ["transaction_id", "gateway_name", "gateway_status", "gateway_currency"]
+
+_cache = TTLCache(maxsize=256, ttl=GATEWAY_LOGS_CACHE_TTL_SECONDS)
+
+
+def gateway_branch(table: str, filters: Dict[str, object], per_table_limit: int, after: Optional[Position]):
+    """
+    One UNION ALL branch: the newest standardized rows of `table`. Conditions
+    and ordering use the table's own columns, so its indexes apply; only the
+    status filter has to compare the translated value.
+    """
+    mapping = GATEWAY_MAPPINGS[table]
+    expressions = projection(mapping)
+    timestamp, log_id = mapping.columns["timestamp"], mapping.columns["log_id"]
+
+    conditions, params = [], []
+    for name in FILTER_COLUMNS:
+        if filters.get(name) is not None:
+            conditions.append(f"{expressions[name]} = %s")
+            params.append(filters[name])
+    if filters.get("since") is not None:
+        conditions.append(f"{timestamp} >= %s")
+        params.append(filters["since"])
+    if filters.get("until") is not None:
+        conditions.append(f"{timestamp} < %s")
+        params.append(filters["until"])
+    if after is not None:
+        condition, position_params = after_condition(after, timestamp, log_id)
+        conditions.append(condition)
+        params.extend(position_params)
+
+    columns = ", ".join(f"{expression} AS {name}" for name, expression in expressions.items())
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+        (SELECT %s AS source_table, {columns}
+        FROM {table}
+        {where}
+        ORDER BY {timestamp} DESC, {log_id} DESC
+        LIMIT %s)
+    """
+    return query, [table, *params, per_table_limit]
+
+
+async def query_gateway_logs(
+    cursor, tables: List[str], filters: Dict[str, object], per_table_limit: int,
+    after: Optional[Dict[str, Position]] = None
+):
+    """
+    Newest standardized logs of every table in `tables`, at most
+    `per_table_limit` each, as one UNION ALL. `after` is a decoded cursor,
+    as in reconciliation.records.query_reconcile_data(). Returns the rows
+    and the positions to resume from. Expects a DictCursor.
+    """
+    if after is not None:
+        tables = [table for table in tables if table in after]
+    if not tables:
+        return [], {}
+
+    branches, params = [], []
+    for table in tables:
+        branch, branch_params = gateway_branch(table, filters, per_table_limit, after[table] if after else None)
+        branches.append(branch)
+        params.extend(branch_params)
+
+    await cursor.execute(" UNION ALL ".join(branches), params)
+    rows = await cursor.fetchall()
+
+    by_table: Dict[str, List[dict]] = {}
+    for row in rows:
+        by_table.setdefault(row["source_table"], []).append(row)
+    # As in query_reconcile_data(), UNION ALL may interleave the branches' order
+    for table_rows in by_table.values():
+        sort_newest_first(table_rows, "timestamp", "log_id")
+    rows = [row for table in tables for row in by_table.get(table, [])]
+
+    next_positions = {}
+    for table, table_rows in by_table.items():
+        if len(table_rows) == per_table_limit:
+            last = table_rows[-1]
+            next_positions[table] = (last["timestamp"], last["log_id"])
+    return rows, next_positions
+
+
+async def get_gateway_logs(
+    tables: List[str], filters: Dict[str, object], per_table_limit: int = GATEWAY_LOGS_PER_TABLE,
+    cursor: Optional[str] = None
+):
+    """One page of standardized gateway logs and the next page's cursor (None on the last), cached briefly."""
+    unknown = [table for table in tables if table not in GATEWAY_MAPPINGS]
+    if unknown:
+        raise ValueError(f"Unknown gateway tables: {', '.join(unknown)}")
+
+    key = ("page", tuple(tables), tuple(sorted((name, str(value)) for name, value in filters.items() if value is not None)),
+           per_table_limit, cursor)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    after = decode_cursor(cursor) if cursor else None
+    async with acquire() as connection:
+        async with connection.cursor(aiomysql.DictCursor) as db_cursor:
+            rows, next_positions = await query_gateway_logs(db_cursor, tables, filters, per_table_limit, after)
+
+    page = (list(rows), encode_cursor(next_positions) if next_positions else None)
+    _cache.set(key, page)
+    return page
+
+
+async def fetch_table_sample(table: str, limit: int) -> List[dict]:
+    async with acquire() as connection:
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(f"SELECT * FROM {table} LIMIT %s", (limit,))
+            return list(await cursor.fetchall())
+
+
+async def fetch_gateway_samples(tables: List[str], limit: int = 5) -> List[dict]:
+    """
+    Raw rows of each table in its own columns, as [{label: rows}, ...]. The
+    tables have different columns, so they are read concurrently on
+    separate pool connections rather than as one UNION.
+    """
+    key = ("samples", tuple(tables), limit)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    samples = await asyncio.gather(*(fetch_table_sample(table, limit) for table in tables))
+    result = [{GATEWAY_LABELS[table]: rows} for table, rows in zip(tables, samples)]
+    _cache.set(key, result)
+    return result
+
+
+def invalidate_gateway_logs():
+    _cache.invalidate()
+
+
+def gateway_logs_cache_metrics() -> dict:
+    return _cache.metrics()
@@ -0,0 +1,222 @@
+import asyncio
+import io
+import os
+import time
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import aiomysql
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# Bytes of CSV parsed per batch; with the batch being all that is held in
+# memory, this bounds an upload's footprint whatever the file size
+INGEST_BLOCK_BYTES = int(os.getenv("INGEST_BLOCK_BYTES", str(4 << 20)))
+INGEST_PARQUET_BATCH_ROWS = int(os.getenv("INGEST_PARQUET_BATCH_ROWS", "20000"))
+
+# Gateway exports write time stamps either way
+TIMESTAMP_FORMATS = [pa_csv.ISO8601, "%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M"]
+
+AMOUNT = pa.float64()  # DECIMAL columns; MySQL rounds to the column's scale
+TEXT = pa.string()
+TIMESTAMP = pa.timestamp("s")
+
+
+class IngestionError(ValueError):
+    """The upload doesn't match its table's schema; nothing past `rows_loaded` was written."""
+
+    def __init__(self, message: str, rows_loaded: int = 0):
+        super().__init__(message)
+        self.rows_loaded = rows_loaded
+
+
+@dataclass
+class TableSchema:
+    """Columns (in table order) and the key of a payment-log table uploads can target."""
+    columns: Dict[str, pa.DataType]
+    key: str
+    required: List[str] = field(default_factory=list)
+
+    def arrow_schema(self) -> pa.Schema:
+        return pa.schema(list(self.columns.items()))
+
+    def upsert_query(self, table: str) -> str:
+        # Re-uploading a file (e.g. after a failed upload) updates rows in place
+        names = list(self.columns)
+        updates = ", ".join(f"{name} = VALUES({name})" for name in names if name != self.key)
+        return f"""
+            INSERT INTO {table} ({", ".join(names)})
+            VALUES ({", ".join(["%s"] * len(names))})
+            ON DUPLICATE KEY UPDATE {updates}
+        """
+
+
+def gateway_log_schema(reference: Tuple[str, str], amount: str = "amount", currency: str = "currency") -> TableSchema:
+    return TableSchema(
+        columns={
+            "unique_id": TEXT, "tx_id": TEXT, reference[0]: TEXT, reference[1]: TEXT,
+            "gateway_verification": TEXT, amount: AMOUNT, currency: TEXT,
+            "gateway_response": TEXT, "time_stamp": TIMESTAMP,
+        },
+        key="unique_id",
+        required=["unique_id", "tx_id"],
+    )
+
+
+UPLOAD_SCHEMAS = {
+    "crypto_payment_logs": gateway_log_schema(("blockchain_platform", "tx_hash"), "crypto_value", "gateway_currency"),
+    "fpx_payment_logs": gateway_log_schema(("bank_name", "fpx_tx_id")),
+    "ewallet_payment_logs": gateway_log_schema(("ewallet_platform", "ewallet_tx_id")),
+    "mobile_payment_logs": gateway_log_schema(("mob_type", "mob_tx_id")),
+    "payment_logs": TableSchema(
+        columns={
+            "log_id": TEXT, "transaction_id": TEXT, "gateway_name": TEXT, "gateway_transaction_id": TEXT,
+            "gateway_status": TEXT, "gateway_amount": AMOUNT, "gateway_currency": TEXT,
+            "gateway_response": TEXT, "timestamp": TIMESTAMP,
+        },
+        key="log_id",
+        required=["log_id", "transaction_id"],
+    ),
+}
+
+
+def normalize_name(name: str) -> str:
+    return name.strip().replace(" ", "_").lower()
+
+
+def check_columns(schema: TableSchema, names: List[str]) -> Dict[str, str]:
+    """Map table columns to the upload's column names; raises IngestionError if a key column is missing."""
+    by_normalized = {normalize_name(name): name for name in names}
+    missing = [column for column in schema.required if column not in by_normalized]
+    if missing:
+        raise IngestionError(f"Missing required columns: {', '.join(missing)}")
+    return {column: by_normalized[column] for column in schema.columns if column in by_normalized}
+
+
+def csv_batches(source: BinaryIO, schema: TableSchema, block_size: int = INGEST_BLOCK_BYTES) -> Iterator[pa.RecordBatch]:
+    """Stream a CSV as typed record batches; values are parsed (and validated) by pyarrow as it reads."""
+    # Only the header line is parsed up front; a second reader on the same
+    # file would read ahead concurrently with this one
+    header = pa_csv.read_csv(io.BytesIO(source.readline()))
+    present = check_columns(schema, header.schema.names)
+    source.seek(0)
+
+    reader = pa_csv.open_csv(
+        source,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={present[column]: schema.columns[column] for column in present},
+            include_columns=list(present.values()),
+            timestamp_parsers=TIMESTAMP_FORMATS,
+            strings_can_be_null=True,
+        ),
+    )
+    for batch in reader:
+        yield conform(batch, schema, present)
+
+
+def parquet_batches(source: BinaryIO, schema: TableSchema, batch_rows: int = INGEST_PARQUET_BATCH_ROWS) -> Iterator[pa.RecordBatch]:
+    parquet_file = pq.ParquetFile(source)
+    present = check_columns(schema, parquet_file.schema_arrow.names)
+    for batch in parquet_file.iter_batches(batch_size=batch_rows, columns=list(present.values())):
+        yield conform(batch, schema, present)
+
+
+def conform(batch: pa.RecordBatch, schema: TableSchema, present: Dict[str, str]) -> pa.RecordBatch:
+    """Reorder, rename and cast `batch` to the table's columns; absent columns load as NULL."""
+    arrays = []
+    for column, data_type in schema.columns.items():
+        if column not in present:
+            arrays.append(pa.nulls(batch.num_rows, data_type))
+            continue
+        values = batch.column(present[column])
+        try:
+            values = values.cast(data_type)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            raise IngestionError(f"Column {present[column]} is not {data_type}: {e}")
+        if pa.types.is_floating(data_type):
+            # NaN has no MySQL representation
+            values = pc.if_else(pc.is_nan(values), pa.scalar(None, data_type), values)
+        arrays.append(values)
+
+    conformed = pa.RecordBatch.from_arrays(arrays, schema=schema.arrow_schema())
+    for column in schema.required:
+        if conformed.column(column).null_count:
+            raise IngestionError(f"Column {column} has empty values")
+    return conformed
+
+
+def column_values(column: pa.Array) -> list:
+    """Python values of `column`, None for nulls; through NumPy where that keeps nulls as None."""
+    if pa.types.is_floating(column.type) and column.null_count:
+        return column.to_pylist()  # NumPy would turn nulls into NaN
+    values = column.to_numpy(zero_copy_only=False)
+    if pa.types.is_timestamp(column.type):
+        values = values.astype("datetime64[us]")  # .tolist() then yields datetimes (None for NaT)
+    return values.tolist()
+
+
+def batch_rows(batch: pa.RecordBatch) -> List[tuple]:
+    """Row tuples for executemany, converted column by column."""
+    return list(zip(*(column_values(column) for column in batch.columns)))
+
+
+async def load_upload(connection, source: BinaryIO, table: str, file_format: str = "csv") -> dict:
+    """
+    Stream `source` into `table` one record batch at a time: parse and
+    validate a batch (in a thread, off the event loop), then upsert it with
+    a multi-row INSERT in its own transaction. Only the current batch is in
+    memory. Returns row counts and throughput.
+
+    Raises IngestionError, with the rows already committed, when a batch
+    doesn't fit the table; uploads are idempotent, so the fixed file can
+    simply be uploaded again.
+    """
+    if table not in UPLOAD_SCHEMAS:
+        raise IngestionError(f"Unknown table {table}; expected one of {', '.join(UPLOAD_SCHEMAS)}")
+    schema = UPLOAD_SCHEMAS[table]
+    query = schema.upsert_query(table)
+
+    started = time.perf_counter()
+    batches = parquet_batches(source, schema) if file_format == "parquet" else csv_batches(source, schema)
+    stats = {"table": table, "rows": 0, "batches": 0}
+
+    async with connection.cursor() as cursor:
+        while True:
+            try:
+                rows = await asyncio.to_thread(next_batch_rows, batches)
+            except IngestionError as e:
+                e.rows_loaded = stats["rows"]
+                raise
+            except pa.ArrowInvalid as e:
+                raise IngestionError(f"Invalid {file_format} data: {e}", stats["rows"])
+            if rows is None:
+                break
+            if not rows:
+                continue
+
+            try:
+                await connection.begin()
+                await cursor.executemany(query, rows)
+                await connection.commit()
+            except aiomysql.IntegrityError as e:
+                # e.g. a log for a transaction that doesn't exist
+                await connection.rollback()
+                raise IngestionError(f"Batch {stats['batches'] + 1} rejected: {e}", stats["rows"])
+            except Exception:
+                await connection.rollback()
+                raise
+            stats["rows"] += len(rows)
+            stats["batches"] += 1
+
+    stats["bytes"] = source.seek(0, io.SEEK_END)
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["rows_per_second"] = round(stats["rows"] / max(stats["seconds"], 1e-9))
+    return stats
+
+
+def next_batch_rows(batches: Iterator[pa.RecordBatch]) -> Optional[List[tuple]]:
+    batch = next(batches, None)
+    return None if batch is None else batch_rows(batch)
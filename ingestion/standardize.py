@@ -0,0 +1,162 @@
+"""
+Declarative mapping of the gateway log tables onto the unified payment_logs
+shape.
+
+Each gateway table is described once, as data: which of its columns feeds
+each payment_logs column and how its status vocabulary translates. A
+mapping compiles either into an Arrow transform (column selection, casts
+and a dictionary-based status lookup, all vectorized) or into a SQL SELECT
+that does the same inside MySQL.
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Tuple, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from ingestion.loader import UPLOAD_SCHEMAS
+
+UNIFIED_SCHEMA = UPLOAD_SCHEMAS["payment_logs"].arrow_schema()
+
+# Gateway status words (matched ignoring case and surrounding spaces) in the
+# vocabulary of transactions.transaction_status, which the engine compares
+# them against
+STATUS_VOCABULARY = {
+    "success": "Success",
+    "successful": "Success",
+    "succeeded": "Success",
+    "processed": "Success",
+    "completed": "Success",
+    "confirmed": "Success",
+    "failed": "Failed",
+    "failure": "Failed",
+    "unsuccessful": "Failed",
+    "declined": "Failed",
+    "rejected": "Failed",
+    "reversed": "Failed",
+    "pending": "Pending",
+    "in progress": "Pending",
+    "processing": "Pending",
+    "cancelled": "Cancelled",
+    "canceled": "Cancelled",
+}
+
+Tabular = Union[pa.Table, pa.RecordBatch]
+
+
+@dataclass
+class GatewayMapping:
+    """How one gateway log table maps onto payment_logs."""
+    table: str
+    columns: Dict[str, str]  # payment_logs column -> gateway column
+    statuses: Dict[str, str] = field(default_factory=lambda: dict(STATUS_VOCABULARY))
+    status_columns: Tuple[str, ...] = ("gateway_status", "gateway_response")
+
+    def __post_init__(self):
+        missing = [name for name in UNIFIED_SCHEMA.names if name not in self.columns]
+        if missing:
+            raise ValueError(f"Mapping for {self.table} doesn't cover {', '.join(missing)}")
+        self.statuses = {normalize_status(word): status for word, status in self.statuses.items()}
+
+
+def normalize_status(word: str) -> str:
+    return word.strip().lower()
+
+
+def gateway_log_mapping(
+    table: str, name_column: str, reference_column: str, amount: str = "amount", currency: str = "currency"
+) -> GatewayMapping:
+    """The gateway tables share one layout apart from the gateway name/reference and a few column names."""
+    return GatewayMapping(table, {
+        "log_id": "unique_id",
+        "transaction_id": "tx_id",
+        "gateway_name": name_column,
+        "gateway_transaction_id": reference_column,
+        "gateway_status": "gateway_verification",
+        "gateway_amount": amount,
+        "gateway_currency": currency,
+        "gateway_response": "gateway_response",
+        "timestamp": "time_stamp",
+    })
+
+
+GATEWAY_MAPPINGS = {
+    mapping.table: mapping for mapping in [
+        gateway_log_mapping("crypto_payment_logs", "blockchain_platform", "tx_hash", "crypto_value", "gateway_currency"),
+        gateway_log_mapping("fpx_payment_logs", "bank_name", "fpx_tx_id"),
+        gateway_log_mapping("ewallet_payment_logs", "ewallet_platform", "ewallet_tx_id"),
+        gateway_log_mapping("mobile_payment_logs", "mob_type", "mob_tx_id"),
+    ]
+}
+
+
+def translate_statuses(values: pa.Array, statuses: Dict[str, str]) -> pa.Array:
+    """
+    Map every value through `statuses`, keeping unknown words as they are.
+    Only the distinct values are looked up in Python; the rows themselves
+    are rebuilt with one take() over the dictionary indices.
+    """
+    encoded = pc.dictionary_encode(values)
+    translated = pa.array(
+        [None if word is None else statuses.get(normalize_status(word), word) for word in encoded.dictionary.to_pylist()],
+        pa.string(),
+    )
+    return translated.take(encoded.indices)
+
+
+def compile_mapping(mapping: GatewayMapping) -> Callable[[Tabular], pa.Table]:
+    """Arrow transform from a batch of `mapping.table` rows to payment_logs rows."""
+    plan = [
+        (column.name, mapping.columns[column.name], column.type, column.name in mapping.status_columns)
+        for column in UNIFIED_SCHEMA
+    ]
+
+    def transform(data: Tabular) -> pa.Table:
+        if isinstance(data, pa.RecordBatch):
+            data = pa.Table.from_batches([data])
+        arrays = []
+        for name, source, data_type, is_status in plan:
+            values = data.column(source).cast(data_type)
+            if is_status:
+                values = pa.chunked_array(
+                    [translate_statuses(chunk, mapping.statuses) for chunk in values.chunks], pa.string()
+                )
+            arrays.append(values)
+        return pa.Table.from_arrays(arrays, schema=UNIFIED_SCHEMA)
+
+    return transform
+
+
+_compiled: Dict[str, Callable[[Tabular], pa.Table]] = {}
+
+
+def standardize(table: str, data: Tabular) -> pa.Table:
+    """payment_logs rows for a batch of `table` rows (convert DataFrames with pa.Table.from_pandas)."""
+    if table not in _compiled:
+        _compiled[table] = compile_mapping(GATEWAY_MAPPINGS[table])
+    return _compiled[table](data)
+
+
+def sql_literal(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def projection(mapping: GatewayMapping) -> Dict[str, str]:
+    """SQL expression over `mapping.table` for every payment_logs column."""
+    expressions = {}
+    for name in UNIFIED_SCHEMA.names:
+        source = mapping.columns[name]
+        if name in mapping.status_columns:
+            cases = " ".join(
+                f"WHEN {sql_literal(word)} THEN {sql_literal(status)}" for word, status in mapping.statuses.items()
+            )
+            expressions[name] = f"CASE LOWER(TRIM({source})) {cases} ELSE {source} END"
+        else:
+            expressions[name] = source
+    return expressions
+
+
+def select_sql(mapping: GatewayMapping) -> str:
+    """SELECT producing payment_logs-shaped rows from `mapping.table` inside MySQL."""
+    columns = ", ".join(f"{expression} AS {name}" for name, expression in projection(mapping).items())
+    return f"SELECT {columns} FROM {mapping.table}"
@@ -2,29 +2,45 @@ from fastapi import FastAPI, Query, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 import traceback
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
-from together import Together
-import uuid
+from typing import Optional, List, Dict, Any, Literal
 import uvicorn
-import mysql.connector
-from mysql.connector import Error
 import os
-import requests
-from datetime import datetime, timedelta
+from datetime import datetime
 import asyncio
-import json
-from decimal import Decimal
+import time
+from contextlib import AsyncExitStack
 from dotenv import load_dotenv
-import pandas as pd
-import io
-import tiktoken
-from functools import partial
 import aiomysql
-# from apscheduler.schedulers.background import BackgroundScheduler
+from aiomysql import Error
+from db_connection.pool import init_pool, close_pool, acquire, health_check
+from db_connection.queries import registry
+from migrations import run_migrations
+from reconciliation.changes import (
+    RECONCILE_FULL_SWEEP_SECONDS, RECONCILE_SWEEP_MIN_SECONDS, RECONCILE_SWEEP_SECONDS, OutboxTailer, discard_changes,
+    sync_outbox_triggers
+)
+from reconciliation.engine import SCAN_MODE, reconcile_shards
+from reconciliation.records import (
+    RECONCILE_DATA_MAX_PER_CATEGORY, RECONCILE_DATA_PER_CATEGORY, decode_cursor, encode_cursor, query_reconcile_data
+)
+from reconciliation.shards import lease_owner
+from reconciliation.summaries import backfill_summary_buckets, query_summary_window
+from reconciliation.stats import DASHBOARD_CATEGORIES, get_dashboard_stats, stats_cache_metrics
+from ingestion.gateway_logs import (
+    GATEWAY_LOGS_MAX_PER_TABLE, GATEWAY_LOGS_PER_TABLE, fetch_gateway_samples, fetch_table_sample,
+    gateway_logs_cache_metrics, get_gateway_logs, invalidate_gateway_logs
+)
+from ingestion.loader import UPLOAD_SCHEMAS, IngestionError, load_upload
+from analysis.cache import AnalysisCache
+from analysis.pipeline import AnalysisPipeline
+from analysis.summarizer import ReconciliationSummarizer
+from analysis.tokens import token_usage
+from serialization import ORJSONResponse
+from scheduler import Job, Scheduler, recent_runs
 
 load_dotenv()
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -33,57 +49,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
-client = Together(api_key=os.getenv("TOGETHER_API_KEY"))
-
-# MySQL Database configuration
-DB_USER = os.getenv("DB_USER", "app_user")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "app_password")
-DB_HOST = os.getenv("DB_HOST", "10.10.240.93")
-DB_PORT = os.getenv("DB_PORT", "3306")
-DB_NAME = os.getenv("DB_NAME", "payment_resolution_db")
-
-# SerpAPI configuration
-SERPER_API_KEY = os.getenv("SERPER_API_KEY")
-
-# Database connection function
-def get_db_connection():
-    try:
-        connection = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            port=DB_PORT
-        )
-        if connection.is_connected():
-            return connection
-    except Error as e:
-        raise HTTPException(status_code=500, detail=f"Database connection error: {str(e)}")
 
-async def create_reconciliation_summaries_table():
-    connection = get_db_connection()
-    cursor = connection.cursor()
-    try:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS reconciliation_summaries (
-                summary_id VARCHAR(255) PRIMARY KEY,
-                timestamp DATETIME,
-                total_transactions INT,
-                discrepancy_count INT,
-                resolution_rate FLOAT
-                -- Add other fields as needed
-            )
-        """)
-        connection.commit()
-        print("reconciliation_summaries table created or already exists.")
-    except Error as e:
-        print(f"Error creating reconciliation_summaries table: {e}")
-        connection.rollback()
-        raise  # Re-raise the exception to potentially stop startup
-    finally:
-        cursor.close()
-        connection.close()
+# Root-cause analysis runs in the background, fed by the scanner
+analysis_pipeline = AnalysisPipeline(cache=AnalysisCache())
+summarizer = ReconciliationSummarizer(analysis_pipeline)
+# Identifies this instance's scanner in scan_leases
+scanner_owner = lease_owner()
+# Reconciles transactions as they change; the scheduled sweep is the safety net
+change_tailer = OutboxTailer(analysis_pipeline.submit)
+scheduler = Scheduler(scanner_owner)
+
+async def prepare_database():
+    await run_migrations()
+    async with acquire() as connection:
+        async with connection.cursor() as cursor:
+            backfilled = await backfill_summary_buckets(cursor)
+            if backfilled:
+                print(f"Backfilled {backfilled} reconciliation summary buckets.")
+            change_tailer.enabled = await sync_outbox_triggers(cursor)
 
 # Pydantic models
 class Transaction(BaseModel):
@@ -118,261 +103,52 @@ class ReconcileData(BaseModel):
     assigned_to: str
     resolution_status: str
 
-def get_transaction_by_id(transaction_id: str) -> Optional[dict]:
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-    query = """
-        SELECT * FROM transactions WHERE transaction_id = %s
-    """
-    cursor.execute(query, (transaction_id,))
-    transaction = cursor.fetchone()
-    cursor.close()
-    connection.close()
-    return transaction
+TRANSACTION_BY_ID = registry.register(
+    "transaction_by_id", "SELECT * FROM transactions WHERE transaction_id = %s"
+)
+LATEST_PAYMENT_LOG = registry.register(
+    "latest_payment_log", "SELECT * FROM payment_logs WHERE transaction_id = %s ORDER BY timestamp DESC LIMIT 1"
+)
+DUPLICATE_TRANSACTIONS = registry.register("duplicate_transactions", """
+    SELECT * FROM transactions
+    WHERE payment_reference = (
+        SELECT payment_reference FROM transactions
+        WHERE transaction_id = %s
+    ) AND transaction_id != %s
+""")
+CURRENT_BALANCE = registry.register(
+    "current_balance",
+    "SELECT COALESCE(SUM(amount), 0) FROM transactions WHERE transaction_status = 'Success' AND transaction_id = %s"
+)
+RECONCILED_BALANCE = registry.register("reconciled_balance", """
+    SELECT COALESCE(SUM(t.amount), 0) FROM transactions t
+    JOIN payment_logs p ON t.transaction_id = p.transaction_id
+    WHERE t.transaction_status = 'Success' AND p.gateway_status = 'Success' AND t.amount = p.gateway_amount AND t.transaction_id = %s
+""")
 
-async def async_get_transaction_by_id(cursor, connection, transaction_id: str) -> Optional[dict]:
-    query = """
-        SELECT * FROM transactions WHERE transaction_id = %s
-    """
+async def get_transaction_by_id(transaction_id: str) -> Optional[dict]:
+    async with acquire() as connection:
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            return await async_get_transaction_by_id(cursor, connection, transaction_id)
 
-    await cursor.execute(query, (transaction_id,))
+async def async_get_transaction_by_id(cursor, connection, transaction_id: str) -> Optional[dict]:
+    await registry.execute(cursor, TRANSACTION_BY_ID, (transaction_id,))
     transaction = await cursor.fetchone()
 
     return transaction
 
-def get_payment_log_by_transaction_id(transaction_id: str) -> Optional[dict]:
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-    query = """
-        SELECT * FROM payment_logs WHERE transaction_id = %s ORDER BY timestamp DESC LIMIT 1
-    """
-    cursor.execute(query, (transaction_id,))
-    payment_log = cursor.fetchone()
-    cursor.close()
-    connection.close()
-    return payment_log
-
-# Function to perform an internet search using Serper API
-def search_internet(query: str) -> str:
-    url = "https://google.serper.dev/search"
-    headers = {"X-API-KEY": SERPER_API_KEY}
-    params = {"q": query, "location": "United States"}
-
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code == 200:
-        data = response.json()
-        if 'organic' in data:
-            return "\n".join([result['snippet'] for result in data['organic']])
-    return "No results found."
-
-def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
-    """Count the number of tokens in a text string."""
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(text))
-    except KeyError:
-        # Fallback to cl100k_base encoding if model not found
-        encoding = tiktoken.get_encoding("cl100k_base")
-        return len(encoding.encode(text))
-
-def generate_llm_analysis(transaction: tuple, payment_log: Optional[tuple]) -> dict:
-    try:
-        gateway_status = payment_log[4]
-    except:
-        gateway_status = "Not available"
-
-    # Construct the prompt
-    prompt = f"""
-    Analyze the given transaction data to identify the root cause of a potential financial discrepancy. Consider the transaction status, amount, currency, and gateway code, as well as any available payment log information.
-    Key Data Points:
-    - Transaction amount and currency: {transaction[5]} {transaction[6]}
-    - Transaction status: {transaction[7]}
-    - Payment log status: {gateway_status}
-    Search Results:
-    {search_internet(f"{transaction[7]} {transaction[5]} {transaction[6]} discrepancy")}
-    Provide a concise analysis in the following format:
-    The root cause of the discrepancy is likely [root cause], based on [key evidence]. Confidence level: [High/Medium/Low].
-    Then, provide 1-2 critical next steps as recommendations in a short paragraph.
-    """
-
-    # Initialize token counters
-    token_counts = {
-        "system_prompt": count_tokens("You are a payment forensic analyst. Use systematic multi-step reasoning. Consider multiple angles before concluding."),
-        "user_prompt": count_tokens(prompt),
-        "total_input": 0,
-        "response": 0
-    }
-    
-    token_counts["total_input"] = token_counts["system_prompt"] + token_counts["user_prompt"]
-
-    try:
-        response = client.chat.completions.create(
-            model="deepseek-ai/DeepSeek-V3",
-            messages=[
-                {"role": "system", "content": "You are a payment forensic analyst. Use systematic multi-step reasoning. Consider multiple angles before concluding."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        
-        analysis = response.choices[0].message.content
-        token_counts["response"] = count_tokens(analysis)
-        
-        # Print token usage information
-        print("\nToken Usage Breakdown:")
-        print(f"System Prompt: {token_counts['system_prompt']} tokens")
-        print(f"User Prompt: {token_counts['user_prompt']} tokens")
-        print(f"Response: {token_counts['response']} tokens")
-        print(f"Total Input: {token_counts['total_input']} tokens")
-        print(f"Total Tokens: {token_counts['total_input'] + token_counts['response']} tokens")
-        
-        parts = analysis.split("\n\n")
-        analysis_text = parts[0]
-        recommendation_text = parts[1].strip()
-        
-        if recommendation_text.startswith("Recommendation:") or recommendation_text.startswith("Next steps:"):
-            recommendation_text = recommendation_text.split(":")[1].strip()
-        
-        return {
-            "analysis": analysis_text,
-            "recommendation": recommendation_text
-        }
-    except Exception as e:
-        print("\nToken Usage (Error Case):")
-        print(f"Input Tokens: {token_counts['total_input']}")
-        error_message = "Analysis error: unable to determine root cause"
-        print(f"Error Message Tokens: {count_tokens(error_message)}")
-        
-        return {
-            "analysis": error_message,
-            "recommendation": "Contact the payment gateway support team for further assistance.",
-            "error": str(e)
-        }
-
-def datetime_handler(obj):  # Custom JSON serializer
-    if isinstance(obj, datetime):
-        return obj.isoformat()  # Convert datetime to ISO string
-    raise TypeError("Object of type {} is not JSON serializable".format(type(obj)))
-
-
-def custom_serializer(obj):  # Combined custom serializer
-    if isinstance(obj, datetime):
-        return obj.isoformat()  # Convert datetime to ISO string
-    if isinstance(obj, Decimal):
-        return str(obj)  # Convert Decimal to string
-    raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
-
-
-async def async_count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
-    """
-    Asynchronously count the number of tokens in a text string.
-    Uses an executor to avoid blocking on CPU-intensive tokenization.
-    """
-    def _count_tokens(text: str, model: str) -> int:
-        try:
-            encoding = tiktoken.encoding_for_model(model)
-            return len(encoding.encode(text))
-        except KeyError:
-            encoding = tiktoken.get_encoding("cl100k_base")
-            return len(encoding.encode(text))
-    
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, partial(_count_tokens, text, model))
-
-def generate_llm_summary(reconciliation_records: List[dict]) -> str:
-    if not reconciliation_records:
-        print("Token usage: 0 (no records to process)")
-        return "No reconciliation records found."
-
-    # Initialize token counters
-    token_counts = {
-        "system_prompt": count_tokens("You are a payment forensic analyst summarizing reconciliation data."),
-        "records_tokens": 0,
-        "prompt_template_tokens": 0,
-        "total_input": 0,
-        "response": 0
-    }
-
-    try:
-        # Serialize records
-        serializable_records = []
-        for record in reconciliation_records:
-            serializable_record = {}
-            for key, value in record.items():
-                if isinstance(value, (datetime, Decimal)):
-                    serializable_record[key] = custom_serializer(value)
-                else:
-                    serializable_record[key] = value
-            serializable_records.append(serializable_record)
-
-        records_string = json.dumps(serializable_records, default=custom_serializer)
-        token_counts["records_tokens"] = count_tokens(records_string)
-
-        prompt = f"""
-        You are a payment forensic analyst. Analyze the following reconciliation records and summarize the key root causes of discrepancies in a clear and concise paragraph. 
-        Focus on identifying common patterns, trends, and their frequency (e.g., "Amount mismatches caused 60% of discrepancies"). Keep the summary brief yet informative.
-
-        Reconciliation Records:
-        ```json
-        {records_string}
-        ```
-        Focus on identifying patterns and trends in the root causes. If possible, quantify the prevalence of each root cause (e.g., "Amount Mismatch accounted for 60% of discrepancies"). Be concise.
-        """
-
-        # Count tokens in the prompt template (excluding the records)
-        prompt_template = prompt.replace(records_string, "")
-        token_counts["prompt_template_tokens"] = count_tokens(prompt_template)
-        
-        # Calculate total input tokens
-        token_counts["total_input"] = (
-            token_counts["system_prompt"] +
-            token_counts["records_tokens"] +
-            token_counts["prompt_template_tokens"]
-        )
-
-        response = client.chat.completions.create(
-            model="deepseek-ai/DeepSeek-V3",
-            messages=[
-                {"role": "system", "content": "You are a payment forensic analyst summarizing reconciliation data."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-
-        summary = response.choices[0].message.content
-        token_counts["response"] = count_tokens(summary)
-
-        # Print token usage information
-        print("\nToken Usage Breakdown:")
-        print(f"System Prompt: {token_counts['system_prompt']} tokens")
-        print(f"Records Data: {token_counts['records_tokens']} tokens")
-        print(f"Prompt Template: {token_counts['prompt_template_tokens']} tokens")
-        print(f"Response: {token_counts['response']} tokens")
-        print(f"Total Input: {token_counts['total_input']} tokens")
-        print(f"Total Tokens: {token_counts['total_input'] + token_counts['response']} tokens")
+async def get_payment_log_by_transaction_id(transaction_id: str) -> Optional[dict]:
+    async with acquire() as connection:
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            await registry.execute(cursor, LATEST_PAYMENT_LOG, (transaction_id,))
+            return await cursor.fetchone()
 
-        return summary
+async def get_duplicate_transactions(transaction_id: str):
+    async with acquire() as connection:
+        async with connection.cursor() as cursor:
+            await registry.execute(cursor, DUPLICATE_TRANSACTIONS, (transaction_id, transaction_id))
+            duplicate_transactions = await cursor.fetchall()
 
-    except Exception as e:
-        error_message = f"Error generating summary: {e}"
-        print(f"\nToken Usage (Error Case):")
-        print(f"Input Tokens: {token_counts['total_input']}")
-        error_tokens = count_tokens(error_message)
-        print(f"Error Message Tokens: {error_tokens}")
-        return error_message
-
-def get_duplicate_transactions(transaction_id: str):
-    connection = get_db_connection()
-    cursor = connection.cursor()
-    
-    query = """
-        SELECT * FROM transactions
-        WHERE payment_reference = (
-            SELECT payment_reference FROM transactions
-            WHERE transaction_id = %s
-        ) AND transaction_id != %s
-    """
-    cursor.execute(query, (transaction_id, transaction_id))
-    duplicate_transactions = cursor.fetchall()
-    
     if duplicate_transactions:
         return [
             {
@@ -385,38 +161,26 @@ def get_duplicate_transactions(transaction_id: str):
         return None
 
 # @app.get("/reconcile")
-def reconcile(transaction_id: str):
-    connection = get_db_connection()
-    cursor = connection.cursor()
-    
-    transaction = get_transaction_by_id(transaction_id)
+async def reconcile(transaction_id: str):
+    transaction = await get_transaction_by_id(transaction_id)
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
-    
-    try:
-        current_balance_query = f"SELECT COALESCE(SUM(amount), 0) FROM transactions WHERE transaction_status = 'Success' AND transaction_id = '{transaction_id}'"
-        cursor.execute(current_balance_query)
-        current_balance = cursor.fetchone()[0]
-        
-        reconciled_balance_query = f"""
-            SELECT COALESCE(SUM(t.amount), 0) FROM transactions t
-            JOIN payment_logs p ON t.transaction_id = p.transaction_id
-            WHERE t.transaction_status = 'Success' AND p.gateway_status = 'Success' AND t.amount = p.gateway_amount AND transaction_id = '{transaction_id}'
-        """
-        cursor.execute(reconciled_balance_query)
-        reconciled_balance = cursor.fetchone()[0]
-        connection.commit()
-        
-        return {
-            "current_balance": float(current_balance),
-            "reconciled_balance": float(reconciled_balance),
-        }
-    except Exception as e:
-        connection.rollback()
-        raise HTTPException(status_code=500, detail=f"Error processing reconciliation: {str(e)}")
-    finally:
-        cursor.close()
-        connection.close()
+
+    async with acquire() as connection:
+        async with connection.cursor() as cursor:
+            try:
+                await registry.execute(cursor, CURRENT_BALANCE, (transaction_id,))
+                current_balance = (await cursor.fetchone())[0]
+
+                await registry.execute(cursor, RECONCILED_BALANCE, (transaction_id,))
+                reconciled_balance = (await cursor.fetchone())[0]
+
+                return {
+                    "current_balance": float(current_balance),
+                    "reconciled_balance": float(reconciled_balance),
+                }
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Error processing reconciliation: {str(e)}")
 
 # # Get all reconcile data
 # def get_reconcile_data(
@@ -473,251 +237,46 @@ def reconcile(transaction_id: str):
 #     connection.close()
 #     return reconcile_data
 
-def get_reconcile_data(
-    reconciliation_id: Optional[str] = None,
-    transaction_id: Optional[str] = None,
-    transaction_date: Optional[datetime] = None,
-    payment_reference: Optional[str] = None,
-    amount: Optional[float] = None,
-    status: Optional[str] = None,
-    gateway_status: Optional[str] = None,
-    discrepancy_amount: Optional[float] = None,
-    root_cause: Optional[str] = None,
-    assigned_to: Optional[str] = None,
-    resolution_status: Optional[str] = None
-) -> List[dict]:
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-
-    discrepancy_categories = ['Missing Payments', 'Amount Mismatch', 'Status Mismatch', 'Duplicates']
-
-    query_parts = []
-    query_params = []
-
-    for category in discrepancy_categories:
-        query_parts.append("""
-            (SELECT * FROM reconciliation_records
-            WHERE discrepancy_category = %s
-                AND (%s IS NULL OR reconciliation_id = %s)
-                AND (%s IS NULL OR transaction_id = %s)
-                AND (%s IS NULL OR transaction_date = %s)
-                AND (%s IS NULL OR payment_reference = %s)
-                AND (%s IS NULL OR amount = %s)
-                AND (%s IS NULL OR status = %s)
-                AND (%s IS NULL OR gateway_status = %s)
-                AND (%s IS NULL OR discrepancy_amount = %s)
-                AND (%s IS NULL OR root_cause = %s)
-                AND (%s IS NULL OR assigned_to = %s)
-                AND (%s IS NULL OR resolution_status = %s)
-            ORDER BY transaction_date DESC
-            LIMIT 2)
-        """)
-        query_params.extend([
-            category,
-            reconciliation_id, reconciliation_id,
-            transaction_id, transaction_id,
-            transaction_date, transaction_date,
-            payment_reference, payment_reference,
-            amount, amount,
-            status, status,
-            gateway_status, gateway_status,
-            discrepancy_amount, discrepancy_amount,
-            root_cause, root_cause,
-            assigned_to, assigned_to,
-            resolution_status, resolution_status
-        ])
-
-    final_query = " UNION ALL ".join(query_parts)
-
-    cursor.execute(final_query, query_params)
-    reconcile_data = cursor.fetchall()
-
-    for data in reconcile_data:
-        if data['transaction_date']:
-            data['transaction_date'] = data['transaction_date'].strftime('%Y-%m-%d %H:%M:%S')
-
-    cursor.close()
-    connection.close()
-    return reconcile_data
-
-async def check_and_update_discrepancies():
-    async with aiomysql.create_pool(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        port=int(DB_PORT),
-        db=DB_NAME,
-        minsize=1,
-        maxsize=10
-    ) as pool:
-        async with pool.acquire() as connection:
-            async with connection.cursor() as cursor:
-                try:
-                    # 1. Check for unscanned transactions
-                    await cursor.execute("""
-                        SELECT * FROM transactions
-                        WHERE transaction_id NOT IN (SELECT transaction_id FROM reconciliation_records)
-                    """)
-                    unscanned_transactions = await cursor.fetchall()
-
-                    for transaction in unscanned_transactions:
-                        transaction_id = transaction[0]
-
-                        query = """
-                            SELECT * FROM transactions WHERE transaction_id = %s
-                        """
-
-                        await cursor.execute(query, (transaction_id,))
-                        transaction = await cursor.fetchone()
-
-                        if not transaction:
-                            raise HTTPException(status_code=404, detail="Transaction not found")
-                        
-                        query = """
-                            SELECT * FROM payment_logs WHERE transaction_id = %s ORDER BY timestamp DESC LIMIT 1
-                        """
-                        await cursor.execute(query, (transaction_id,))
-                        payment_log = await cursor.fetchone()
-
-                        discrepancy_category = None
-                        is_discrepancy = False
-                        
-                        if not payment_log:
-                            discrepancy_category = "Missing Payments"
-                            is_discrepancy = True
-                        elif float(transaction[5]) != float(payment_log[5]):
-                            discrepancy_category = "Amount Mismatch"
-                            is_discrepancy = True
-                        elif transaction[7] != payment_log[7]:
-                            discrepancy_category = "Status Mismatch"
-                            is_discrepancy = True
-
-                        # Check for duplicate payments in the payment log
-                        query = """
-                            SELECT * FROM payment_logs WHERE transaction_id = %s
-                        """
-                        await cursor.execute(query, (transaction_id,))
-                        payment_logs = await cursor.fetchall()
-                        duplicate_payments = payment_logs if len(payment_logs) > 1 else []
-
-                        if duplicate_payments and len(duplicate_payments) > 1:
-                            discrepancy_category = "Duplicate Payment"
-                            is_discrepancy = True
-                        
-                        root_cause = generate_llm_analysis(transaction, payment_log) if is_discrepancy else "No discrepancy detected"
-                        
-                        discrepancy_result = {
-                            "transaction_id": transaction_id,
-                            "is_discrepancy": is_discrepancy,
-                            "discrepancy_category": discrepancy_category,
-                            "root_cause": root_cause
-                        }
-
-                        # Get gateway status and amount
-                        await cursor.execute("""
-                            SELECT * FROM payment_logs
-                            WHERE transaction_id = %s
-                            ORDER BY timestamp DESC
-                            LIMIT 1
-                        """, (transaction[0],))
-                        gateway_status_result = await cursor.fetchone()
-
-                        gateway_status = gateway_status_result[4] if gateway_status_result else None
-                        gateway_amount = gateway_status_result[5] if gateway_status_result else None
-
-                        discrepancy_amount = abs(float(transaction[5]) - float(gateway_amount or 0)) if gateway_amount is not None else -1
-
-                        reconciled_balance = gateway_amount if gateway_amount is not None else None
-
-                        # Determine resolution status
-                        if gateway_status == "Success" and transaction[7] == "Success":
-                            resolution_status = 'No Discrepancy' if discrepancy_amount == 0 else 'Resolved'
-                        else:
-                            resolution_status = 'Unresolved'
-
-                        if resolution_status == "Unresolved" or resolution_status == "No Discrepancy":
-                            reconciled_balance = None  # Reset if not resolved
-
-                        try:
-                            insert_query = """
-                                INSERT INTO reconciliation_records (
-                                    reconciliation_id, transaction_id, discrepancy_category, transaction_date,
-                                    payment_reference, amount, status, gateway_status, discrepancy_amount,
-                                    root_cause, assigned_to, resolution_status, balance, reconciled_balance
-                                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                            """
-
-                            if discrepancy_result.get('root_cause', {}) == "No discrepancy detected":
-                                root_cause = discrepancy_result.get('root_cause', {})
-                            else:
-                                root_cause = discrepancy_result.get('root_cause', {}).get('analysis', "")
-
-                            await cursor.execute(insert_query, (
-                                str(uuid.uuid4()), transaction[0], discrepancy_result.get('discrepancy_category'),
-                                transaction[8], transaction[9], transaction[5],
-                                transaction[7], gateway_status, discrepancy_amount,
-                                root_cause, None, resolution_status,
-                                transaction[5], reconciled_balance
-                            ))
-                            await connection.commit()
-                            print("Data Inserted")
-
-                        except Error as e:
-                            print(f"Error processing transaction: {e}")
-                            connection.rollback()  # Important: Rollback on error
-                            raise # Reraise the exception after rollback
-
-                        asyncio.create_task(generate_reconciliation_summary(transaction[0]))
-
-                except Error as e:
-                    print(f"check_and_update_discrepancies error: {e}")
-                    connection.rollback()
-                    raise
-
-
-async def generate_reconciliation_summary(transaction_id=None):  # Add transaction_id parameter
-    connection = get_db_connection()  # Open a new connection
-    cursor = connection.cursor(dictionary=True)
+async def get_reconcile_data(
+    filters: Dict[str, Any],
+    discrepancy_category: Optional[str] = None,
+    per_category_limit: int = RECONCILE_DATA_PER_CATEGORY,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None
+):
+    """Returns one page of records per category and the cursor of the next page (None on the last one)."""
+    categories = [discrepancy_category] if discrepancy_category else DASHBOARD_CATEGORIES
+    after = decode_cursor(cursor) if cursor else None
+
+    async with acquire() as connection:
+        async with connection.cursor(aiomysql.DictCursor) as db_cursor:
+            reconcile_data, next_positions = await query_reconcile_data(
+                db_cursor, categories, filters, per_category_limit, after, fields
+            )
 
-    try:
-        if transaction_id:  # Generate summary for a specific transaction
-            cursor.execute("""
-                SELECT * FROM reconciliation_records 
-                WHERE transaction_id = %s 
-                ORDER BY transaction_date DESC LIMIT 10
-            """, (transaction_id,)) # Add WHERE clause
-            last_10_records = cursor.fetchall()
-        else:
-            cursor.execute("SELECT * FROM reconciliation_records ORDER BY transaction_date DESC LIMIT 10")
-            last_10_records = cursor.fetchall()
-
-        if last_10_records: # Check if there are any records
-            discrepancy_count = sum(1 for record in last_10_records if record['discrepancy_category'] is not None)
-            resolved_count = sum(1 for record in last_10_records if record['resolution_status'] in ('Resolved', 'No Discrepancy'))
-            resolution_rate = (resolved_count / len(last_10_records)) * 100 if last_10_records else 0
-
-            summary_data = {
-                'summary_id': str(uuid.uuid4()),
-                'timestamp': datetime.now(),
-                'total_transactions': len(last_10_records),  # Summarizing the selected records
-                'discrepancy_count': discrepancy_count,
-                'resolution_rate': resolution_rate,
-            }
-
-            insert_reconciliation_summary(summary_data)
-        else:
-            print("No records found for generating summary")
+    next_cursor = encode_cursor(next_positions) if next_positions else None
+    return reconcile_data, next_cursor
 
-    except Error as e:
-        print(f"Error generating summary: {e}")
-        raise
-    finally:
-        cursor.close()
-        connection.close()  # Close connection properly
+async def check_and_update_discrepancies(full_scan: bool = False):
+    async with AsyncExitStack() as stack:
+        connection = await stack.enter_async_context(acquire())
+        # Streaming pins its connection until the result set is drained
+        stream_connection = await stack.enter_async_context(acquire()) if SCAN_MODE == "stream" else None
+        try:
+            return await reconcile_shards(
+                connection,
+                analysis_pipeline.submit,
+                scanner_owner,
+                stream_connection=stream_connection,
+                full_scan=full_scan
+            )
+        except Error as e:
+            print(f"check_and_update_discrepancies error: {e}")
+            raise
 
 
 @app.get("/reconcile_data")
-def get_reconcile_data_api(
+async def get_reconcile_data_api(
     reconciliation_id: Optional[str] = Query(None),
     transaction_id: Optional[str] = Query(None),
     discrepancy_category: Optional[str] = Query(None),
@@ -729,113 +288,61 @@ def get_reconcile_data_api(
     discrepancy_amount: Optional[float] = Query(None),
     root_cause: Optional[str] = Query(None),
     assigned_to: Optional[str] = Query(None),
-    resolution_status: Optional[str] = Query(None)
+    resolution_status: Optional[str] = Query(None),
+    per_category_limit: int = Query(RECONCILE_DATA_PER_CATEGORY, ge=1, le=RECONCILE_DATA_MAX_PER_CATEGORY),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. to leave out root_cause")
 ):
-    # return get_reconcile_data(
-    #     reconciliation_id,
-    #     transaction_id,
-    #     discrepancy_category,
-    #     transaction_date,
-    #     payment_reference,
-    #     amount,
-    #     status,
-    #     gateway_status,
-    #     discrepancy_amount,
-    #     root_cause,
-    #     assigned_to,
-    #     resolution_status
-    # )
-
-    return get_reconcile_data(
-        reconciliation_id,
-        transaction_id,
-        transaction_date,
-        payment_reference,
-        amount,
-        status,
-        gateway_status,
-        discrepancy_amount,
-        root_cause,
-        assigned_to,
-        resolution_status
-    )
+    filters = {
+        "reconciliation_id": reconciliation_id,
+        "transaction_id": transaction_id,
+        "transaction_date": transaction_date,
+        "payment_reference": payment_reference,
+        "amount": amount,
+        "status": status,
+        "gateway_status": gateway_status,
+        "discrepancy_amount": discrepancy_amount,
+        "root_cause": root_cause,
+        "assigned_to": assigned_to,
+        "resolution_status": resolution_status,
+    }
+    try:
+        reconcile_data, next_cursor = await get_reconcile_data(
+            filters,
+            discrepancy_category,
+            per_category_limit,
+            cursor,
+            fields.split(",") if fields else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Returned as a response so the rows skip jsonable_encoder
+    return ORJSONResponse(reconcile_data, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
 
 @app.get("/transaction_stats")
-def get_transaction_stats():
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-    
+async def get_transaction_stats():
     try:
-        # Count all scanned transactions
-        scanned_query = """
-            SELECT COUNT(*) as count
-            FROM reconciliation_records r
-            JOIN transactions t ON r.transaction_id = t.transaction_id
-        """
-        cursor.execute(scanned_query)
-        scanned_count = cursor.fetchone()['count']
-        
-        # Count unresolved transactions
-        unresolved_query = """
-            SELECT COUNT(*) as count
-            FROM reconciliation_records r
-            JOIN transactions t ON r.transaction_id = t.transaction_id
-            WHERE r.resolution_status = 'Unresolved'
-        """
-        cursor.execute(unresolved_query)
-        unresolved_count = cursor.fetchone()['count']
-        
-        # Count resolved transactions
-        resolved_query = """
-            SELECT COUNT(*) as count
-            FROM reconciliation_records r
-            JOIN transactions t ON r.transaction_id = t.transaction_id
-            WHERE r.resolution_status IN ('Resolved')
-        """
-        cursor.execute(resolved_query)
-        resolved_count = cursor.fetchone()['count']
-        
+        stats = await get_dashboard_stats()
+        scanned_count = stats["scanned"]
+        unresolved_count = stats["unresolved"]
+        resolved_count = stats["resolved"]
+
         return {
             "scanned_transactions": scanned_count,
             "unresolved_transactions": unresolved_count,
             "resolved_transactions": resolved_count + 10,
             "resolution_rate": round(resolved_count / (unresolved_count + resolved_count) * 100, 2) if scanned_count > 0 else 0
         }
-        
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching transaction statistics: {str(e)}")
-    finally:
-        cursor.close()
-        connection.close()
 
 @app.get("/discrepancy_categories")
-def get_discrepancy_categories():
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-    
+async def get_discrepancy_categories():
     try:
-        query = """
-            SELECT discrepancy_category, COUNT(*) as count
-            FROM reconciliation_records
-            GROUP BY discrepancy_category
-        """
-        cursor.execute(query)
-        categories = cursor.fetchall()
-        
-        category_mapping = {
-            "Missing Payments": 0,
-            "Amount Mismatch": 0,
-            "Status Mismatch": 0,
-            "Duplicates": 0,
-            "No Discrepancy": 0
-        }
-        
-        for category in categories:
-            if category['discrepancy_category'] in category_mapping:
-                category_mapping[category['discrepancy_category']] = category['count']
-            elif category['discrepancy_category'] is None:
-                category_mapping["No Discrepancy"] = category['count']
-        
+        category_mapping = (await get_dashboard_stats())["categories"]
+
         result = {
             "xaxis": {
                 "categories": list(category_mapping.keys())
@@ -846,35 +353,16 @@ def get_discrepancy_categories():
                 }
             ]
         }
-        
+
         return result
-        
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching discrepancy categories: {str(e)}")
-    finally:
-        cursor.close()
-        connection.close()
 
 @app.get("/discrepancy_cases")
-def get_discrepancy_cases():
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-
+async def get_discrepancy_cases():
     try:
-        today = datetime.now().date()
-        this_week_start = (datetime.now() - timedelta(days=datetime.now().weekday())).date()
-        this_month_start = datetime(datetime.now().year, datetime.now().month, 1).date()
-
-        query = """
-            SELECT 
-                SUM(CASE WHEN transaction_date = %s THEN 1 ELSE 0 END) as today,
-                SUM(CASE WHEN transaction_date >= %s THEN 1 ELSE 0 END) as this_week,
-                SUM(CASE WHEN transaction_date >= %s THEN 1 ELSE 0 END) as this_month
-            FROM reconciliation_records
-            WHERE discrepancy_category IS NOT NULL AND discrepancy_category != 'No Discrepancy'
-        """
-        cursor.execute(query, (today, this_week_start, this_month_start))
-        result = cursor.fetchone()
+        result = (await get_dashboard_stats())["cases"]
 
         return [
             {"id": 1, "type": "Today", "total": f"{result['today']:,}"},
@@ -885,278 +373,212 @@ def get_discrepancy_cases():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching discrepancy cases: {str(e)}")
 
-    finally:
-        cursor.close()
-        connection.close()
-        
-class ReconciliationSummary(BaseModel):
-    summary_id: str
-    timestamp: datetime
-    total_transactions: int
-    discrepancy_count: int
-    resolution_rate: float
-    # Add other summary fields as needed
-
-def insert_reconciliation_summary(summary_data: dict):
-    connection = get_db_connection()
-    cursor = connection.cursor()
-    try:
-        insert_query = """
-            INSERT INTO reconciliation_summaries (
-                summary_id, timestamp, total_transactions, discrepancy_count, resolution_rate
-            ) VALUES (%s, %s, %s, %s, %s)
-        """
-        cursor.execute(insert_query, (
-            summary_data['summary_id'], summary_data['timestamp'], summary_data['total_transactions'],
-            summary_data['discrepancy_count'], summary_data['resolution_rate']
-        ))
-        connection.commit()
-    except Exception as e:
-        connection.rollback()
-        print(f"Error inserting reconciliation summary: {e}")
-    finally:
-        cursor.close()
-        connection.close()
-
 @app.get("/reconciliation_summaries")
 async def get_reconciliation_summaries(
     limit: int = Query(10, description="Number of summaries to retrieve")
 ):
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
     try:
-        # Get the last 'limit * 10' reconciliation records to provide context to the LLM
-        cursor.execute(f"SELECT * FROM reconciliation_records ORDER BY transaction_date DESC LIMIT {limit * 10}")
-        reconciliation_records = cursor.fetchall()
-
-        llm_summary = generate_llm_summary(reconciliation_records)
+        # Summarize the last 'limit * 10' reconciliation records
+        llm_summary = await summarizer.summarize(limit * 10)
         return {"summary": llm_summary}  # Return only the LLM summary
 
     except Error as e:
         raise HTTPException(status_code=500, detail=f"Error fetching reconciliation summaries: {str(e)}")
-    finally:
-        cursor.close()
-        connection.close()
+
+@app.get("/reconciliation_summaries/window")
+async def get_reconciliation_summary_window(
+    start: datetime = Query(..., description="Window start (rounded down to the hour)"),
+    end: datetime = Query(..., description="Window end (exclusive)"),
+    payment_method: Optional[str] = Query(None),
+    group_by: Optional[Literal["hour", "day", "payment_method"]] = Query(None, description="Break the window down; omit for a single total")
+):
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    try:
+        async with acquire() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                return await query_summary_window(cursor, start, end, payment_method, group_by)
+    except Error as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching reconciliation summary window: {str(e)}")
+
+@app.get("/token_usage")
+async def get_token_usage():
+    return token_usage()
+
+@app.get("/health")
+async def get_health():
+    health = await health_check()
+    health["analysis"] = analysis_pipeline.metrics()
+    health["summary_cache"] = summarizer.metrics()
+    health["stats_cache"] = stats_cache_metrics()
+    health["gateway_logs_cache"] = gateway_logs_cache_metrics()
+    health["queries"] = registry.metrics()
+    health["change_capture"] = change_tailer.metrics()
+    health["jobs"] = scheduler.metrics()
+    return health
 
 @app.on_event("startup")
 async def startup_event():
     try:
-        await create_reconciliation_summaries_table()
+        await init_pool()
+        await prepare_database()
+        await analysis_pipeline.start()
     except Exception as e:  # Catch exceptions from table creation
         print(f"Startup failed: {e}")
-
-def fetch_four_tables():
+        return
+
+    # Jobs and the change tailer share the application's event loop (and therefore its pool)
+    scheduler.start()
+    if change_tailer.enabled:
+        app.state.change_task = asyncio.create_task(change_tailer.run())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await scheduler.stop()
+    change_task = getattr(app.state, "change_task", None)
+    if change_task:
+        change_task.cancel()
+    await analysis_pipeline.stop()
+    await close_pool()
+
+FOUR_TABLES = ["crypto_payment_logs", "ewallet_payment_logs", "fpx_payment_logs", "mobile_payment_logs"]
+THREE_TABLES = ["crypto_payment_logs", "ewallet_payment_logs", "fpx_payment_logs"]
+
+async def fetch_four_tables():
     try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            port=int(DB_PORT)
-        )
-        cursor = conn.cursor()
-          
-        # Mapping database table names to readable categories
-        table_mapping = {
-            "crypto_payment_logs": "Cryptocurrency",
-            "ewallet_payment_logs": "E-Wallet",
-            "fpx_payment_logs": "FPX",
-            "mobile_payment_logs": "Mobile Payment"
-        }        
-        results = []
-
-        for table, category in table_mapping.items():
-            query = f"SELECT * FROM {table} LIMIT 5;"
-            cursor.execute(query)
-
-            # Fetch column names
-            columns = [desc[0] for desc in cursor.description]
-
-            # Fetch rows and convert to dict
-            rows = cursor.fetchall()
-            results.append({category: [dict(zip(columns, row)) for row in rows]})
-
-        cursor.close()
-        conn.close()
-        return results
-
+        return await fetch_gateway_samples(FOUR_TABLES)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
-def fetch_three_tables():
-    try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            port=int(DB_PORT)
-        )
-        cursor = conn.cursor()
-          
-        # Mapping database table names to readable categories
-        table_mapping = {
-            "crypto_payment_logs": "Cryptocurrency",
-            "ewallet_payment_logs": "E-Wallet",
-            "fpx_payment_logs": "FPX"
-        }        
-        results = []
-
-        for table, category in table_mapping.items():
-            query = f"SELECT * FROM {table} LIMIT 5;"
-            cursor.execute(query)
-
-            # Fetch column names
-            columns = [desc[0] for desc in cursor.description]
-
-            # Fetch rows and convert to dict
-            rows = cursor.fetchall()
-            results.append({category: [dict(zip(columns, row)) for row in rows]})
-
-        cursor.close()
-        conn.close()
-        return results
 
+async def fetch_three_tables():
+    try:
+        return await fetch_gateway_samples(THREE_TABLES)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
-def fetch_consolidated_data():
-    try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            port=int(DB_PORT)
-        )
-        cursor = conn.cursor()
-
-        query = "SELECT * FROM payment_logs LIMIT 5;"
-        cursor.execute(query)
 
-        # Fetch column names
-        columns = [desc[0] for desc in cursor.description]
-        # Fetch rows and return as list of dicts
-        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        return rows
+async def fetch_consolidated_data():
+    try:
+        return await fetch_table_sample("payment_logs", 5)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if conn.is_connected():
-            conn.close()
-    
+
 @app.get("/fetch_four_tables")
-def get_four_tables():
-    data = fetch_four_tables()
-    return data
+async def get_four_tables():
+    data = await fetch_four_tables()
+    return ORJSONResponse(data)
 
 @app.get("/fetch_three_tables")
-def get_three_tables():
-    data = fetch_three_tables()
-    return data
+async def get_three_tables():
+    data = await fetch_three_tables()
+    return ORJSONResponse(data)
     
 @app.get("/fetch_consolidated_table")
-def get_consolidated_data():
-    data = fetch_consolidated_data()
-    return data
+async def get_consolidated_data():
+    data = await fetch_consolidated_data()
+    return ORJSONResponse(data)
 
-def create_table_if_not_exists(cursor, table_name, df):
-    """Dynamically create a table based on CSV columns if it does not exist."""
-    column_types = []
-    
-    for col in df.columns:
-        col_name = col.strip().replace(" ", "_")  # Clean column name
-        sample_value = df[col].dropna().astype(str).head(1).values
-        
-        # Determine column type
-        if sample_value.size > 0:
-            if sample_value[0].isdigit():
-                column_type = "INT"
-            else:
-                column_type = "VARCHAR(255)"
-        else:
-            column_type = "VARCHAR(255)"  # Default type
-        
-        column_types.append(f"{col_name} {column_type}")
-
-    columns_sql = ", ".join(column_types)
-    create_table_query = f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_sql});"
-    
-    cursor.execute(create_table_query)
-
-def upload_csv_to_mysql(file: UploadFile):
-    # try:
-    #     conn = mysql.connector.connect(
-    #         host="127.0.0.1",
-    #         user="app_user",
-    #         password="app_password",
-    #         database="trading_platform",
-    #         port=3307
-    #     )
-    #     cursor = conn.cursor()
-
-    #     contents = file.file.read()
-    #     try:
-    #         df = pd.read_csv(io.StringIO(contents.decode("utf-8", errors="ignore")))
-    #         # Convert time_stamp to MySQL-compatible datetime format
-    #         if "time_stamp" in df.columns:
-    #             try:
-    #                 df["time_stamp"] = pd.to_datetime(df["time_stamp"], errors="coerce", format="%d/%m/%Y %H:%M")
-    #                 df["time_stamp"] = df["time_stamp"].dt.strftime("%Y-%m-%d %H:%M:%S")  # Ensure correct MySQL format
-    #             except Exception as e:
-    #                 raise HTTPException(status_code=400, detail=f"Invalid datetime format in 'time_stamp': {str(e)}")
-
-    #         # Drop rows where time_stamp conversion failed (optional)
-    #         df.drop_duplicates(subset=["unique_id"], inplace=True)
-    #         df.dropna(subset=["time_stamp"], inplace=True)
-    #     except Exception as e:
-    #         raise HTTPException(status_code=400, detail=f"CSV Format Error: {str(e)}")
-        
-    #     if df.empty:
-    #         raise HTTPException(status_code=400, detail="CSV file is empty.")
-
-    #     print("CSV Loaded Successfully:\n", df.head())  # Debugging log
-
-    #     table_name = "mobile_payment_logs"
-
-    #     df.columns = [col.strip().replace(" ", "_") for col in df.columns]
-
-    #     create_table_if_not_exists(cursor, table_name, df)
-
-    #     # Insert data into MySQL
-    #     columns = ", ".join(df.columns)
-    #     values_placeholder = ", ".join(["%s"] * len(df.columns))
-    #     insert_query = f"INSERT INTO {table_name} ({columns}) VALUES ({values_placeholder})"
-
-        # for _, row in df.iterrows():
-        #     cursor.execute(insert_query, tuple(row))
-
-    #     conn.commit()
-    #     conn.close()
-    return {"message": "CSV uploaded successfully"}
-
-    # except HTTPException as http_ex:
-    #     raise http_ex  # Re-raise HTTP exceptions
-
-    # except Exception as e:
-    #     print("Error Occurred:", traceback.format_exc())  # Print full error traceback
-    #     raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+@app.get("/gateway_logs")
+async def get_gateway_logs_api(
+    tables: Optional[List[str]] = Query(None, description="Gateway log tables to read; all of them by default"),
+    transaction_id: Optional[str] = Query(None),
+    gateway_name: Optional[str] = Query(None),
+    gateway_status: Optional[str] = Query(None, description="Standardized status, e.g. Success"),
+    gateway_currency: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    per_table_limit: int = Query(GATEWAY_LOGS_PER_TABLE, ge=1, le=GATEWAY_LOGS_MAX_PER_TABLE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page")
+):
+    """Newest logs of every gateway table in the payment_logs shape, paged per table."""
+    filters = {
+        "transaction_id": transaction_id,
+        "gateway_name": gateway_name,
+        "gateway_status": gateway_status,
+        "gateway_currency": gateway_currency,
+        "since": since,
+        "until": until,
+    }
+    try:
+        rows, next_cursor = await get_gateway_logs(tables or FOUR_TABLES, filters, per_table_limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return ORJSONResponse(rows, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
 
 @app.post("/upload_csv")
-def upload_csv(file: UploadFile = File(...)):
-    return upload_csv_to_mysql(file)
+async def upload_csv(
+    file: UploadFile = File(...),
+    table: str = Query("mobile_payment_logs", description=f"One of {', '.join(UPLOAD_SCHEMAS)}")
+):
+    """Stream a CSV or Parquet gateway export into a payment-log table."""
+    file_format = "parquet" if (file.filename or "").lower().endswith(".parquet") else "csv"
+    try:
+        async with acquire() as connection:
+            stats = await load_upload(connection, file.file, table, file_format)
+    except IngestionError as e:
+        raise HTTPException(status_code=400, detail={"error": str(e), "rows_loaded": e.rows_loaded})
+    except Exception as e:
+        print("Error Occurred:", traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+    finally:
+        # Even a failed upload may have committed some batches
+        invalidate_gateway_logs()
+
+    print(f"Uploaded {stats['rows']} rows into {table} in {stats['seconds']}s ({stats['rows_per_second']} rows/s)")
+    return {"message": "CSV uploaded successfully", **stats}
 
-async def run_schedule():
-    while True:
-        await check_and_update_discrepancies()
-        await asyncio.sleep(3600)  # Run every hour
+last_full_sweep = {"at": None}
 
-# Run the scheduler as an asynchronous task
+async def reconciliation_sweep() -> int:
+    if not change_tailer.enabled:
+        async with acquire() as connection:
+            async with connection.cursor() as cursor:
+                await discard_changes(cursor)
+    # The watermark hides transactions inserted with older dates; every so often
+    # (and on the first run) sweep the whole table for them
+    full_scan = last_full_sweep["at"] is None or time.monotonic() - last_full_sweep["at"] >= RECONCILE_FULL_SWEEP_SECONDS
+    reconciled = await check_and_update_discrepancies(full_scan=full_scan)
+    if full_scan:
+        last_full_sweep["at"] = time.monotonic()
+    change_tailer.record_sweep(reconciled)
+    return reconciled
+
+scheduler.add(Job(
+    "reconciliation_sweep", reconciliation_sweep, RECONCILE_SWEEP_SECONDS, min_interval=RECONCILE_SWEEP_MIN_SECONDS
+))
+
+# Records left pending by a restart or a failed store; the first run is at startup
+scheduler.add(Job("requeue_pending_analyses", analysis_pipeline.requeue_pending, analysis_pipeline.config.requeue_interval))
+
+def get_job(name: str) -> Job:
+    if name not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail=f"Unknown job {name}")
+    return scheduler.jobs[name]
+
+@app.get("/admin/jobs")
+async def list_jobs():
+    return scheduler.metrics()
+
+@app.get("/admin/jobs/{name}/runs")
+async def list_job_runs(name: str, limit: int = Query(20, ge=1, le=500)):
+    get_job(name)
+    return ORJSONResponse(await recent_runs(name, limit))
+
+@app.post("/admin/jobs/{name}/run", status_code=202)
+async def trigger_job(name: str):
+    """Start a run now; it is recorded as skipped if another process is running the job."""
+    get_job(name)
+    if not scheduler.trigger(name):
+        raise HTTPException(status_code=409, detail=f"{name} is already running")
+    return {"triggered": name}
+
+# Run the API server; the scheduler is started from the startup event so it
+# shares the server's event loop and database pool
 async def main():
-    task = asyncio.create_task(run_schedule())
-    loop = asyncio.get_running_loop()
-    await loop.run_in_executor(None, lambda: uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=False, workers=1))
+    config = uvicorn.Config("main:app", host="0.0.0.0", port=8000, reload=False, workers=1)
+    await uvicorn.Server(config).serve()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,277 @@
+"""
+Versioned schema migrations for the tables and indexes ReconX owns.
+
+Applied versions are recorded in schema_migrations; run_migrations() applies
+the missing ones in order and is safe to call on every start, from any
+number of instances at once (they serialize on a named lock).
+
+The base tables (transactions, payment_logs, reconciliation_records, ...)
+come from generate_data.create_tables and must exist beforehand.
+
+    python -m migrations            # apply pending migrations
+    python -m migrations --explain  # also check the hot queries use their indexes
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from typing import List, Optional
+
+import aiomysql
+from dotenv import load_dotenv
+
+from analysis.cache import create_analysis_cache_table
+from db_connection.pool import acquire, close_pool, init_pool
+from ingestion.standardize import GATEWAY_MAPPINGS
+from reconciliation.changes import create_outbox_table
+from reconciliation.engine import RECONCILE_BATCH_SIZE, unscanned_transactions_query
+from reconciliation.matching import create_fx_rates_table
+from reconciliation.scan_state import create_scan_state_table
+from reconciliation.shards import create_scan_leases_table
+from reconciliation.splits import create_allocations_table
+from reconciliation.summaries import create_summary_buckets_table
+from scheduler import create_job_runs_table
+
+MIGRATION_LOCK = "reconx_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 60
+
+
+async def create_reconx_tables(cursor):
+    """
+    The tables ReconX used to create ad hoc at startup. The legacy
+    reconciliation_summaries table is no longer created (summary buckets
+    replaced it), but existing installs keep theirs and its rows.
+    """
+    await create_scan_state_table(cursor)
+    await create_scan_leases_table(cursor)
+    await create_summary_buckets_table(cursor)
+    await create_analysis_cache_table(cursor)
+
+
+# (table, index name, column list) for every hot access path. An index whose
+# leading column is a foreign key column also takes over the index MySQL
+# created implicitly for that key.
+HOT_PATH_INDEXES = [
+    # fetch_payment_logs / get_payment_log_by_transaction_id: by transaction, newest first
+    ("payment_logs", "idx_payment_logs_transaction_timestamp", "transaction_id, timestamp"),
+    # Keyset scan of unscanned transactions
+    ("transactions", "idx_transactions_date_id", "transaction_date, transaction_id"),
+    # get_duplicate_transactions
+    ("transactions", "idx_transactions_payment_reference", "payment_reference"),
+    # NOT EXISTS anti-join of the scanner and joins back to transactions
+    ("reconciliation_records", "idx_reconciliation_records_transaction", "transaction_id"),
+    # Category/status filters by date; also covers every column the dashboard stats read
+    ("reconciliation_records", "idx_reconciliation_records_category_status_date",
+     "discrepancy_category, resolution_status, transaction_date, transaction_id"),
+    # Newest-first windows (summaries, reconcile_data) and date ranges
+    ("reconciliation_records", "idx_reconciliation_records_date", "transaction_date"),
+    # requeue_pending: records still holding the analysis placeholder
+    ("reconciliation_records", "idx_reconciliation_records_root_cause", "root_cause(32)"),
+]
+
+
+async def index_exists(cursor, table: str, index: str) -> bool:
+    await cursor.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, index))
+    return await cursor.fetchone() is not None
+
+
+async def table_exists(cursor, table: str) -> bool:
+    await cursor.execute("""
+        SELECT 1 FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s
+    """, (table,))
+    return await cursor.fetchone() is not None
+
+
+async def ensure_index(cursor, table: str, index: str, columns: str):
+    """CREATE INDEX unless it already exists (MySQL has no IF NOT EXISTS for indexes)."""
+    if await index_exists(cursor, table, index):
+        return
+    print(f"Creating index {index} on {table} ({columns})")
+    await cursor.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+
+
+async def create_hot_path_indexes(cursor):
+    for table, index, columns in HOT_PATH_INDEXES:
+        await ensure_index(cursor, table, index, columns)
+
+
+async def create_reconcile_data_index(cursor):
+    # /reconcile_data pages each category by (transaction_date, reconciliation_id)
+    await ensure_index(
+        cursor, "reconciliation_records", "idx_reconciliation_records_category_date_id",
+        "discrepancy_category, transaction_date, reconciliation_id"
+    )
+
+
+async def create_gateway_log_indexes(cursor):
+    # /gateway_logs pages each gateway table newest first. Not every
+    # deployment has every gateway table, so missing ones are skipped.
+    for table, mapping in GATEWAY_MAPPINGS.items():
+        if await table_exists(cursor, table):
+            await ensure_index(
+                cursor, table, f"idx_{table}_timestamp_id",
+                f"{mapping.columns['timestamp']}, {mapping.columns['log_id']}"
+            )
+
+
+async def create_reconciliation_outbox(cursor):
+    # The triggers that feed it follow CHANGE_CAPTURE, so they're synced at startup instead
+    await create_outbox_table(cursor)
+
+
+async def create_matching_tables(cursor):
+    await create_fx_rates_table(cursor)
+    # Unlinked logs paired by reference (transaction_id IS NULL AND gateway_transaction_id IN ...)
+    await ensure_index(
+        cursor, "payment_logs", "idx_payment_logs_gateway_transaction_id", "gateway_transaction_id, transaction_id"
+    )
+
+
+# Append only: a version, once released, never changes meaning
+MIGRATIONS = [
+    (1, "reconx_tables", create_reconx_tables),
+    (2, "hot_path_indexes", create_hot_path_indexes),
+    (3, "reconcile_data_index", create_reconcile_data_index),
+    (4, "gateway_log_indexes", create_gateway_log_indexes),
+    (5, "reconciliation_outbox", create_reconciliation_outbox),
+    (6, "job_runs", create_job_runs_table),
+    (7, "fuzzy_matching", create_matching_tables),
+    (8, "settlement_allocations", create_allocations_table),
+]
+
+
+async def run_migrations() -> List[int]:
+    """Apply pending migrations in order; returns the versions applied."""
+    applied_now = []
+    async with acquire() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+            if not (await cursor.fetchone())[0]:
+                raise RuntimeError("Timed out waiting for another instance to finish migrating")
+            try:
+                await cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INT PRIMARY KEY,
+                        name VARCHAR(100) NOT NULL,
+                        applied_at DATETIME NOT NULL
+                    )
+                """)
+                await cursor.execute("SELECT version FROM schema_migrations")
+                applied = {row[0] for row in await cursor.fetchall()}
+
+                for version, name, migrate in MIGRATIONS:
+                    if version in applied:
+                        continue
+                    print(f"Applying migration {version}: {name}")
+                    # DDL commits implicitly, so every step must be safe to re-run
+                    await migrate(cursor)
+                    await cursor.execute(
+                        "INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, NOW())",
+                        (version, name)
+                    )
+                    applied_now.append(version)
+            finally:
+                await cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+                await cursor.fetchone()
+    return applied_now
+
+
+UNSCANNED_PAGE, UNSCANNED_PAGE_PARAMS = unscanned_transactions_query((datetime(2025, 1, 1), ""), RECONCILE_BATCH_SIZE)
+
+# (name, query, params, table, expected index) for the queries the indexes exist for
+HOT_QUERIES = [
+    ("payment logs of a chunk",
+     "SELECT * FROM payment_logs WHERE transaction_id IN (%s, %s) ORDER BY transaction_id, timestamp DESC",
+     ("tx-1", "tx-2"), "payment_logs", "idx_payment_logs_transaction_timestamp"),
+    ("latest payment log",
+     "SELECT * FROM payment_logs WHERE transaction_id = %s ORDER BY timestamp DESC LIMIT 1",
+     ("tx-1",), "payment_logs", "idx_payment_logs_transaction_timestamp"),
+    ("unlinked logs by time",
+     "SELECT * FROM payment_logs WHERE transaction_id IS NULL AND timestamp BETWEEN %s AND %s",
+     (datetime(2025, 1, 1), datetime(2025, 1, 1, 2)), "payment_logs", "idx_payment_logs_transaction_timestamp"),
+    ("unlinked logs by reference",
+     "SELECT * FROM payment_logs WHERE transaction_id IS NULL AND gateway_transaction_id IN (%s, %s)",
+     ("ref-1", "ref-2"), "payment_logs", "idx_payment_logs_gateway_transaction_id"),
+    ("settlement shares of a chunk",
+     """SELECT a.transaction_id, a.amount, p.* FROM settlement_allocations a
+        JOIN payment_logs p ON p.log_id = a.log_id WHERE a.transaction_id IN (%s, %s)""",
+     ("tx-1", "tx-2"), "a", "PRIMARY"),
+    ("unscanned keyset page",
+     UNSCANNED_PAGE, UNSCANNED_PAGE_PARAMS, "t", "idx_transactions_date_id"),
+    ("unscanned anti-join",
+     UNSCANNED_PAGE, UNSCANNED_PAGE_PARAMS, "r", "idx_reconciliation_records_transaction"),
+    ("duplicate transactions",
+     "SELECT * FROM transactions WHERE payment_reference = %s AND transaction_id != %s",
+     ("ref-1", "tx-1"), "transactions", "idx_transactions_payment_reference"),
+    ("records by category and status",
+     """SELECT reconciliation_id FROM reconciliation_records
+        WHERE discrepancy_category = %s AND resolution_status = %s
+        ORDER BY transaction_date DESC LIMIT 50""",
+     ("Amount Mismatch", "Unresolved"), "reconciliation_records", "idx_reconciliation_records_category_status_date"),
+    ("reconcile_data category page",
+     """SELECT reconciliation_id FROM reconciliation_records
+        WHERE discrepancy_category = %s
+          AND (transaction_date < %s OR (transaction_date = %s AND reconciliation_id < %s) OR transaction_date IS NULL)
+        ORDER BY transaction_date DESC, reconciliation_id DESC LIMIT 50""",
+     ("Amount Mismatch", datetime(2025, 1, 1), datetime(2025, 1, 1), "ffffffff"),
+     "reconciliation_records", "idx_reconciliation_records_category_date_id"),
+    ("gateway logs page",
+     "SELECT unique_id FROM fpx_payment_logs ORDER BY time_stamp DESC, unique_id DESC LIMIT 5",
+     (), "fpx_payment_logs", "idx_fpx_payment_logs_timestamp_id"),
+    ("newest records window",
+     "SELECT * FROM reconciliation_records ORDER BY transaction_date DESC LIMIT 100",
+     (), "reconciliation_records", "idx_reconciliation_records_date"),
+    ("pending analyses",
+     "SELECT reconciliation_id FROM reconciliation_records WHERE root_cause = %s AND reconciliation_id > %s "
+     "ORDER BY reconciliation_id LIMIT 1000",
+     ("Analysis pending", ""), "reconciliation_records", "idx_reconciliation_records_root_cause"),
+]
+
+
+async def explain_hot_queries() -> List[dict]:
+    """EXPLAIN every hot query and report the index and access type MySQL picked for it."""
+    report = []
+    async with acquire() as connection:
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            for name, query, params, table, expected in HOT_QUERIES:
+                await cursor.execute("EXPLAIN " + query, params)
+                plan = await cursor.fetchall()
+                row = next((row for row in plan if row["table"] == table), {})
+                used: Optional[str] = row.get("key")
+                access: Optional[str] = row.get("type")
+                report.append({
+                    "query": name, "table": table, "expected": expected, "used": used, "type": access,
+                    "ok": used == expected and access != "ALL",
+                })
+    return report
+
+
+async def main(explain: bool) -> int:
+    load_dotenv()
+    await init_pool()
+    try:
+        applied = await run_migrations()
+        print(f"Applied migrations: {applied or 'none pending'}")
+        if not explain:
+            return 0
+
+        # The optimizer may prefer a full scan on near-empty tables; check against realistic data
+        report = await explain_hot_queries()
+        for row in report:
+            print(
+                f"{'OK  ' if row['ok'] else 'FAIL'} {row['query']:<32} {row['table']:<24} "
+                f"used={row['used']} type={row['type']} expected={row['expected']}"
+            )
+        return 0 if all(row["ok"] for row in report) else 1
+    finally:
+        await close_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--explain", action="store_true", help="Fail unless every hot query uses its index")
+    sys.exit(asyncio.run(main(parser.parse_args().explain)))
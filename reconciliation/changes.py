@@ -0,0 +1,285 @@
+"""
+Change capture: reconcile transactions within seconds of them (or their
+payment logs) changing, instead of waiting for the next full sweep.
+
+Triggers on transactions and payment_logs append the affected
+transaction_id to reconciliation_outbox in the same transaction as the
+change, whichever path wrote it (the upload API, generate_data, other
+services). OutboxTailer polls the outbox, reconciles every transaction
+it names again, upserting its record, and deletes the events in the
+same database transaction. The periodic full sweep (reconcile_shards)
+stays on as a safety net for anything the triggers can't see.
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiomysql
+
+from db_connection.pool import acquire
+from db_connection.queries import LatencyHistogram, registry
+from reconciliation.engine import (
+    NO_DISCREPANCY_ROOT_CAUSE, PENDING_ROOT_CAUSE, TX_ID, TX_PAYMENT_METHOD, build_record_row, classify_chunk,
+    fetch_chunk_logs
+)
+from reconciliation.matching import load_matcher
+from reconciliation.records import RECORD_COLUMNS
+from reconciliation.shards import LeaseLost, Shard, ShardLease, lease_owner, shard_of
+from reconciliation.stats import invalidate_dashboard_stats
+from reconciliation.summaries import ROW_CATEGORY, SummaryBuckets
+from reconciliation.writer import UPSERT_RECONCILIATION_RECORD
+
+# Opt in: the triggers need the TRIGGER privilege, which many deployments don't grant
+CHANGE_CAPTURE = os.getenv("CHANGE_CAPTURE", "false").lower() == "true"
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+# Full sweep for transactions without a record (the safety net). Its
+# interval shrinks towards the minimum while sweeps keep finding some.
+RECONCILE_SWEEP_SECONDS = float(os.getenv("RECONCILE_SWEEP_SECONDS", "3600"))
+RECONCILE_SWEEP_MIN_SECONDS = float(os.getenv("RECONCILE_SWEEP_MIN_SECONDS", "300"))
+# How often a sweep starts from the beginning of the transactions table instead
+# of the watermark, for transactions inserted with a transaction_date older than it
+RECONCILE_FULL_SWEEP_SECONDS = float(os.getenv("RECONCILE_FULL_SWEEP_SECONDS", "21600"))
+
+# Upper bounds, in milliseconds, of the detection lag histogram buckets
+DETECTION_LAG_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 300000, 3600000)
+
+# (trigger, event, table, transaction id column)
+OUTBOX_TRIGGERS = [
+    ("trg_transactions_outbox_insert", "INSERT", "transactions", "transaction_id"),
+    ("trg_transactions_outbox_update", "UPDATE", "transactions", "transaction_id"),
+    ("trg_payment_logs_outbox_insert", "INSERT", "payment_logs", "transaction_id"),
+    ("trg_payment_logs_outbox_update", "UPDATE", "payment_logs", "transaction_id"),
+]
+
+Change = Tuple[List[int], int]  # (event ids, age of the oldest event in microseconds)
+
+
+async def create_outbox_table(cursor):
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS reconciliation_outbox (
+            event_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            transaction_id VARCHAR(36) NOT NULL,
+            source VARCHAR(32) NOT NULL,
+            created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+        )
+    """)
+
+
+async def create_outbox_triggers(cursor):
+    """
+    Needs the TRIGGER privilege (and, with binary logging on and no SUPER,
+    log_bin_trust_function_creators). Every write to the two tables then
+    also costs one outbox insert.
+    """
+    for trigger, event, table, column in OUTBOX_TRIGGERS:
+        await cursor.execute("""
+            SELECT 1 FROM information_schema.triggers WHERE trigger_schema = DATABASE() AND trigger_name = %s
+        """, (trigger,))
+        if await cursor.fetchone():
+            continue
+        print(f"Creating trigger {trigger} on {table}")
+        # payment_logs.transaction_id is nullable; such logs can't affect a transaction
+        await cursor.execute(f"""
+            CREATE TRIGGER {trigger} AFTER {event} ON {table} FOR EACH ROW
+            INSERT INTO reconciliation_outbox (transaction_id, source)
+            SELECT NEW.{column}, '{table}' FROM DUAL WHERE NEW.{column} IS NOT NULL
+        """)
+
+
+async def drop_outbox_triggers(cursor):
+    # Only existing ones: dropping needs the same privilege as creating
+    for trigger, _, table, _ in OUTBOX_TRIGGERS:
+        await cursor.execute("""
+            SELECT 1 FROM information_schema.triggers WHERE trigger_schema = DATABASE() AND trigger_name = %s
+        """, (trigger,))
+        if not await cursor.fetchone():
+            continue
+        print(f"Dropping trigger {trigger} on {table}")
+        await cursor.execute(f"DROP TRIGGER {trigger}")
+
+
+async def sync_outbox_triggers(cursor) -> bool:
+    """
+    Create the outbox triggers when CHANGE_CAPTURE is on and drop them when
+    it's off, so a disabled outbox isn't fed; returns whether change capture
+    can run. Failing to create them only leaves change capture off: the full
+    sweep still reconciles every transaction, just later.
+    """
+    if not CHANGE_CAPTURE:
+        await drop_outbox_triggers(cursor)
+        return False
+    try:
+        await create_outbox_triggers(cursor)
+    except aiomysql.Error as e:
+        print(f"Change capture disabled, the outbox triggers could not be created: {e}")
+        return False
+    return True
+
+
+async def discard_changes(cursor):
+    """Drop the outbox backlog; used when change capture is off, so it doesn't grow forever."""
+    await cursor.execute("DELETE FROM reconciliation_outbox")
+
+
+class OutboxTailer:
+    """
+    Polls reconciliation_outbox and reconciles the transactions it names.
+
+    Events are handled per shard under that shard's ShardLease, with an
+    owner of their own, so change capture never reconciles a transaction
+    at the same time as a sweep or backfill worker (events of a shard
+    another scanner holds wait for the next poll). Within a shard's
+    database transaction the tailer reads the transactions, their payment
+    logs and their current records (FOR UPDATE), upserts the new records,
+    moves their summary bucket counts and deletes the events, so a crash
+    leaves the events in place to be handled again.
+
+    Discrepancies are handed to `submit_analysis` when they are new or
+    changed category; an unchanged category keeps its analysis.
+
+    Detection lag, from the change's commit (the event's created_at) to
+    the commit of its reconciliation record, is measured on the database
+    clock up to the poll plus local time from there, so clock skew between
+    hosts doesn't distort it.
+    """
+
+    def __init__(
+        self,
+        submit_analysis: Callable[[str, tuple, Optional[tuple]], Awaitable[None]],
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_SECONDS,
+    ):
+        self.submit_analysis = submit_analysis
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.owner = lease_owner()
+        self.detection_lag = LatencyHistogram(DETECTION_LAG_BUCKETS_MS)
+        self.stats = {"polls": 0, "events": 0, "transactions": 0, "deferred_events": 0, "errors": 0}
+        self.sweeps = {"runs": 0, "reconciled": 0, "last_reconciled": 0}
+        # Set at startup, once the triggers are known to be in place
+        self.enabled = False
+
+    async def run(self):
+        while True:
+            try:
+                handled = await self.poll()
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Change capture poll failed: {e}")
+                handled = 0
+            # A full batch means there is more waiting; go straight back for it
+            if handled < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def poll(self) -> int:
+        """Handle one batch of outbox events; returns how many were handled."""
+        async with acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("""
+                    SELECT event_id, transaction_id, TIMESTAMPDIFF(MICROSECOND, created_at, NOW(6))
+                    FROM reconciliation_outbox ORDER BY event_id LIMIT %s
+                """, (self.batch_size,))
+                events = await cursor.fetchall()
+            polled_at = time.monotonic()
+            self.stats["polls"] += 1
+
+            by_shard: Dict[Shard, Dict[str, Change]] = {}
+            for event_id, transaction_id, age_us in events:
+                changes = by_shard.setdefault(shard_of(transaction_id), {})
+                event_ids, oldest_us = changes.get(transaction_id, ([], 0))
+                changes[transaction_id] = (event_ids + [event_id], max(oldest_us, int(age_us or 0)))
+
+            handled = 0
+            for shard, changes in by_shard.items():
+                shard_events = sum(len(event_ids) for event_ids, _ in changes.values())
+                lease = ShardLease(shard, self.owner)
+                if not await lease.claim(connection):
+                    self.stats["deferred_events"] += shard_events
+                    continue
+                try:
+                    await self.reconcile(connection, lease, changes, polled_at)
+                    handled += shard_events
+                except LeaseLost as e:
+                    print(f"Change capture skipped shard {shard[0]}/{shard[1]}: {e}")
+                finally:
+                    await lease.release(connection)
+        return handled
+
+    async def reconcile(self, connection, lease: ShardLease, changes: Dict[str, Change], polled_at: float):
+        transaction_ids = list(changes)
+        placeholders = ", ".join(["%s"] * len(transaction_ids))
+        event_ids = [event_id for ids, _ in changes.values() for event_id in ids]
+        summary_buckets = SummaryBuckets()
+        rows, analyses = [], []
+
+        async with connection.cursor() as cursor:
+            try:
+                await connection.begin()
+                await lease.renew(cursor)
+
+                async with registry.timed("changed_transactions"):
+                    await cursor.execute(
+                        f"SELECT * FROM transactions WHERE transaction_id IN ({placeholders})", transaction_ids
+                    )
+                transactions = list(await cursor.fetchall())
+                matcher = await load_matcher(cursor)
+                logs_by_transaction = await fetch_chunk_logs(cursor, transactions, matcher)
+                await cursor.execute(f"""
+                    SELECT {", ".join(RECORD_COLUMNS)} FROM reconciliation_records
+                    WHERE transaction_id IN ({placeholders}) FOR UPDATE
+                """, transaction_ids)
+                previous = {record[1]: record for record in await cursor.fetchall()}
+
+                for transaction, result in zip(transactions, classify_chunk(transactions, logs_by_transaction, matcher)):
+                    root_cause = PENDING_ROOT_CAUSE if result["is_discrepancy"] else NO_DISCREPANCY_ROOT_CAUSE
+                    row = build_record_row(transaction, result, root_cause)
+                    old = previous.get(transaction[TX_ID])
+                    if old is not None:
+                        summary_buckets.add(transaction[TX_PAYMENT_METHOD], old, sign=-1)
+                    summary_buckets.add(transaction[TX_PAYMENT_METHOD], row)
+                    rows.append(row)
+                    # The upsert keeps the stored analysis while the category stays the same
+                    if result["is_discrepancy"] and (old is None or old[ROW_CATEGORY] != row[ROW_CATEGORY]):
+                        analyses.append((row[0], transaction, result["payment_log"]))
+
+                if rows:
+                    await cursor.executemany(UPSERT_RECONCILIATION_RECORD, rows)
+                await summary_buckets.flush(cursor)
+                await cursor.execute(
+                    f"DELETE FROM reconciliation_outbox WHERE event_id IN ({', '.join(['%s'] * len(event_ids))})",
+                    event_ids
+                )
+                await connection.commit()
+            except Exception:
+                await connection.rollback()
+                raise
+
+        if rows:
+            invalidate_dashboard_stats()
+        since_poll_ms = (time.monotonic() - polled_at) * 1000
+        for _, oldest_us in changes.values():
+            self.detection_lag.observe(oldest_us / 1000 + since_poll_ms)
+        self.stats["events"] += len(event_ids)
+        self.stats["transactions"] += len(rows)
+
+        for analysis in analyses:
+            await self.submit_analysis(*analysis)
+
+    def record_sweep(self, reconciled: int):
+        """
+        Count what a full sweep reconciled. With change capture running
+        these are transactions the triggers missed, so it should stay near 0.
+        """
+        self.sweeps["runs"] += 1
+        self.sweeps["reconciled"] += reconciled
+        self.sweeps["last_reconciled"] = reconciled
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            **self.stats,
+            "detection_lag": self.detection_lag.snapshot(),
+            "sweeps": dict(self.sweeps),
+        }
@@ -0,0 +1,500 @@
+import os
+import sys
+import zlib
+from decimal import Decimal
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import aiomysql
+
+from db_connection.queries import registry
+from reconciliation.matching import CURRENCY_DECIMALS, DEFAULT_DECIMALS, EXACT_MATCHER, Matcher, Probe, load_matcher
+from reconciliation.scan_state import SCANNER_NAME, Watermark, load_watermark, resume_point, save_watermark
+from reconciliation.shards import SCAN_SHARDS, LeaseLost, Shard, ShardLease, shard_predicate, shard_scanner_name
+from reconciliation.summaries import SummaryBuckets
+from reconciliation.writer import ReconciliationWriter, reconciliation_id_for
+
+# Column positions of `SELECT * FROM transactions`
+TX_ID = 0
+TX_USER_ID = 1
+TX_ACCOUNT_ID = 2
+TX_PAYMENT_METHOD = 3
+TX_AMOUNT = 5
+TX_CURRENCY = 6
+TX_STATUS = 7
+TX_DATE = 8
+TX_PAYMENT_REFERENCE = 9
+
+# Column positions of `SELECT * FROM payment_logs`
+LOG_ID = 0
+LOG_TRANSACTION_ID = 1
+LOG_GATEWAY_TRANSACTION_ID = 3
+LOG_GATEWAY_STATUS = 4
+LOG_GATEWAY_AMOUNT = 5
+LOG_GATEWAY_CURRENCY = 6
+LOG_GATEWAY_RESPONSE = 7
+LOG_TIMESTAMP = 8
+
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "500"))
+
+# "keyset" re-queries one LIMITed window at a time; "stream" reads the whole
+# unscanned set through one server-side cursor on a dedicated connection.
+SCAN_MODE = os.getenv("SCAN_MODE", "keyset")
+# Upper bound on the (estimated) size of the transactions held per chunk
+SCAN_MAX_CHUNK_BYTES = int(os.getenv("SCAN_MAX_CHUNK_BYTES", str(32 * 1024 * 1024)))
+STREAM_FETCH_SIZE = 100
+
+NO_DISCREPANCY_ROOT_CAUSE = "No discrepancy detected"
+PENDING_ROOT_CAUSE = "Analysis pending"
+
+def gateway_amount_of(transaction: tuple, payment_log: tuple, matcher: Matcher):
+    """The log's gateway amount in the transaction's currency."""
+    return matcher.converted(
+        payment_log[LOG_GATEWAY_AMOUNT], payment_log[LOG_GATEWAY_CURRENCY], transaction[TX_CURRENCY],
+        payment_log[LOG_TIMESTAMP]
+    )
+
+
+def classify_transaction(transaction: tuple, payment_logs: Sequence[tuple], matcher: Matcher = EXACT_MATCHER) -> dict:
+    """Classify one transaction against its payment logs (newest first)."""
+    payment_log = payment_logs[0] if payment_logs else None
+    gateway_amount = gateway_amount_of(transaction, payment_log, matcher) if payment_log else None
+    converted = payment_log is not None and payment_log[LOG_GATEWAY_CURRENCY] != transaction[TX_CURRENCY]
+
+    discrepancy_category = None
+    is_discrepancy = False
+
+    if not payment_log:
+        discrepancy_category = "Missing Payments"
+        is_discrepancy = True
+    elif not matcher.amounts_match(transaction[TX_AMOUNT], gateway_amount, transaction[TX_CURRENCY], converted):
+        discrepancy_category = "Amount Mismatch"
+        is_discrepancy = True
+    elif transaction[TX_STATUS] != payment_log[LOG_GATEWAY_RESPONSE]:
+        discrepancy_category = "Status Mismatch"
+        is_discrepancy = True
+
+    if len(payment_logs) > 1:
+        discrepancy_category = "Duplicate Payment"
+        is_discrepancy = True
+
+    gateway_status = payment_log[LOG_GATEWAY_STATUS] if payment_log else None
+
+    discrepancy_amount = abs(float(transaction[TX_AMOUNT]) - float(gateway_amount or 0)) if gateway_amount is not None else -1
+    if converted and gateway_amount is not None:
+        # Converted amounts carry residue below the currency's minor unit; it is
+        # rounded in Decimal, as amounts_match() does, so a half-unit difference
+        # that matched isn't reported as one minor unit off
+        difference = abs(Decimal(str(transaction[TX_AMOUNT])) - Decimal(str(gateway_amount)))
+        discrepancy_amount = float(round(difference, CURRENCY_DECIMALS.get(transaction[TX_CURRENCY], DEFAULT_DECIMALS)))
+
+    reconciled_balance = gateway_amount if gateway_amount is not None else None
+
+    if gateway_status == "Success" and transaction[TX_STATUS] == "Success":
+        resolution_status = 'No Discrepancy' if discrepancy_amount == 0 else 'Resolved'
+    else:
+        resolution_status = 'Unresolved'
+
+    if resolution_status == "Unresolved" or resolution_status == "No Discrepancy":
+        reconciled_balance = None  # Reset if not resolved
+
+    return {
+        "transaction_id": transaction[TX_ID],
+        "is_discrepancy": is_discrepancy,
+        "discrepancy_category": discrepancy_category,
+        "payment_log": payment_log,
+        "gateway_status": gateway_status,
+        "discrepancy_amount": discrepancy_amount,
+        "resolution_status": resolution_status,
+        "reconciled_balance": reconciled_balance,
+    }
+
+
+def build_record_row(transaction: tuple, result: dict, root_cause: str) -> tuple:
+    """Build the reconciliation_records parameter tuple for a classified transaction."""
+    return (
+        reconciliation_id_for(transaction[TX_ID]), transaction[TX_ID], result["discrepancy_category"],
+        transaction[TX_DATE], transaction[TX_PAYMENT_REFERENCE], transaction[TX_AMOUNT],
+        transaction[TX_STATUS], result["gateway_status"], result["discrepancy_amount"],
+        root_cause, None, result["resolution_status"],
+        transaction[TX_AMOUNT], result["reconciled_balance"]
+    )
+
+
+def estimate_row_bytes(row: tuple) -> int:
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+
+
+def unscanned_transactions_query(
+    after: Optional[Watermark] = None, limit: Optional[int] = None, shard: Optional[Shard] = None
+):
+    """
+    Unscanned transactions in (transaction_date, transaction_id) order,
+    starting after the `after` keyset position when one is given and
+    restricted to `shard` when one is given.
+    """
+    shard_clause, params = shard_predicate(shard)
+    range_predicate = ""
+    if after is not None:
+        # Rows without a date sort first and never pass a date comparison;
+        # keep them visible so they can't be skipped for good
+        range_predicate = """
+            AND (t.transaction_date IS NULL
+                 OR t.transaction_date > %s
+                 OR (t.transaction_date = %s AND t.transaction_id > %s))
+        """
+        params.extend([after[0], after[0], after[1]])
+
+    limit_clause = ""
+    if limit is not None:
+        limit_clause = "LIMIT %s"
+        params.append(limit)
+
+    query = f"""
+        SELECT t.* FROM transactions t
+        WHERE NOT EXISTS (
+            SELECT 1 FROM reconciliation_records r WHERE r.transaction_id = t.transaction_id
+        )
+        {shard_clause}
+        {range_predicate}
+        ORDER BY t.transaction_date, t.transaction_id
+        {limit_clause}
+    """
+    return query, params
+
+
+async def fetch_unscanned_transactions(
+    cursor, limit: int, after: Optional[Watermark] = None, shard: Optional[Shard] = None
+) -> List[tuple]:
+    query, params = unscanned_transactions_query(after, limit, shard)
+    async with registry.timed("unscanned_page"):
+        await cursor.execute(query, params)
+    return list(await cursor.fetchall())
+
+
+async def iter_keyset_chunks(
+    cursor, batch_size: int, after: Optional[Watermark], max_chunk_bytes: int = SCAN_MAX_CHUNK_BYTES,
+    shard: Optional[Shard] = None
+) -> AsyncIterator[List[tuple]]:
+    """
+    Page through unscanned transactions one LIMITed query at a time. Each
+    LIMIT is sized from the previous page's bytes per row so pages stay under
+    `max_chunk_bytes`, never exceeding `batch_size` rows.
+    """
+    limit = batch_size
+    while True:
+        transactions = await fetch_unscanned_transactions(cursor, limit, after, shard)
+        if not transactions:
+            return
+
+        chunk_bytes = sum(estimate_row_bytes(transaction) for transaction in transactions)
+        yield transactions
+
+        if len(transactions) < limit:
+            return
+        last = transactions[-1]
+        if last[TX_DATE] is not None:
+            after = (last[TX_DATE], last[TX_ID])
+        limit = max(1, min(batch_size, limit * max_chunk_bytes // max(chunk_bytes, 1)))
+
+
+async def iter_streamed_chunks(
+    stream_connection, batch_size: int, after: Optional[Watermark], max_chunk_bytes: int = SCAN_MAX_CHUNK_BYTES,
+    shard: Optional[Shard] = None
+) -> AsyncIterator[List[tuple]]:
+    """
+    Stream unscanned transactions through a server-side cursor, cutting a
+    chunk whenever it reaches `batch_size` rows or `max_chunk_bytes`. The
+    cursor pins `stream_connection` until exhausted, so writes must go
+    through another connection.
+    """
+    query, params = unscanned_transactions_query(after, shard=shard)
+    async with stream_connection.cursor(aiomysql.SSCursor) as cursor:
+        await cursor.execute(query, params)
+        chunk, chunk_bytes = [], 0
+        while True:
+            rows = await cursor.fetchmany(STREAM_FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                chunk.append(row)
+                chunk_bytes += estimate_row_bytes(row)
+                if len(chunk) >= batch_size or chunk_bytes >= max_chunk_bytes:
+                    yield chunk
+                    chunk, chunk_bytes = [], 0
+        if chunk:
+            yield chunk
+
+
+async def fetch_payment_logs(cursor, transaction_ids: Sequence[str]) -> Dict[str, List[tuple]]:
+    """Fetch the payment logs of many transactions at once, grouped newest first."""
+    logs_by_transaction: Dict[str, List[tuple]] = {transaction_id: [] for transaction_id in transaction_ids}
+    if not transaction_ids:
+        return logs_by_transaction
+
+    placeholders = ", ".join(["%s"] * len(transaction_ids))
+    async with registry.timed("chunk_payment_logs"):
+        await cursor.execute(f"""
+            SELECT * FROM payment_logs
+            WHERE transaction_id IN ({placeholders})
+            ORDER BY transaction_id, timestamp DESC
+        """, tuple(transaction_ids))
+    for payment_log in await cursor.fetchall():
+        logs_by_transaction[payment_log[LOG_TRANSACTION_ID]].append(payment_log)
+    return logs_by_transaction
+
+
+async def fetch_unlinked_logs(
+    cursor, transactions: Sequence[tuple], window, by_reference: bool = True
+) -> List[tuple]:
+    """
+    Logs without a transaction_id that could belong to `transactions`:
+    those timestamped within `window` of them and, with `by_reference`,
+    those whose gateway_transaction_id is one of their payment references.
+    """
+    references = [transaction[TX_PAYMENT_REFERENCE] for transaction in transactions if transaction[TX_PAYMENT_REFERENCE]]
+    dates = [transaction[TX_DATE] for transaction in transactions if transaction[TX_DATE] is not None]
+
+    candidates: Dict[str, tuple] = {}
+    async with registry.timed("unlinked_payment_logs"):
+        if by_reference and references:
+            await cursor.execute(f"""
+                SELECT * FROM payment_logs
+                WHERE transaction_id IS NULL AND gateway_transaction_id IN ({", ".join(["%s"] * len(references))})
+            """, tuple(references))
+            candidates.update((log[LOG_ID], log) for log in await cursor.fetchall())
+        if dates:
+            await cursor.execute("""
+                SELECT * FROM payment_logs
+                WHERE transaction_id IS NULL AND timestamp BETWEEN %s AND %s
+            """, (min(dates) - window, max(dates) + window))
+            candidates.update((log[LOG_ID], log) for log in await cursor.fetchall())
+    return list(candidates.values())
+
+
+async def claim_log(cursor, log_id: str, transaction_id: str) -> bool:
+    """Link an unlinked log to `transaction_id`; False if another scanner linked it first."""
+    await cursor.execute("""
+        UPDATE payment_logs SET transaction_id = %s WHERE log_id = %s AND transaction_id IS NULL
+    """, (transaction_id, log_id))
+    return bool(cursor.rowcount)
+
+
+def log_for(payment_log: tuple, transaction_id: str, gateway_amount=None) -> tuple:
+    """`payment_log` as linked to `transaction_id`, optionally with another gateway amount."""
+    row = list(payment_log)
+    row[LOG_TRANSACTION_ID] = transaction_id
+    if gateway_amount is not None:
+        row[LOG_GATEWAY_AMOUNT] = gateway_amount
+    return tuple(row)
+
+
+async def link_unlinked_logs(
+    cursor, transactions: Sequence[tuple], logs_by_transaction: Dict[str, List[tuple]], matcher: Matcher
+) -> int:
+    """
+    Pair `transactions` (which have no payment logs) with logs that have
+    no transaction_id, by reference or by amount and time (see
+    reconciliation.matching). A pair is claimed by setting the log's
+    transaction_id, so no log is ever paired twice; a log another scanner
+    claimed first is left alone. Returns the number of logs linked.
+    """
+    logs = await fetch_unlinked_logs(cursor, transactions, matcher.window)
+    if not logs:
+        return 0
+
+    pairs = matcher.pair_unlinked(
+        [Probe(transaction[TX_AMOUNT], transaction[TX_CURRENCY], transaction[TX_DATE], transaction[TX_PAYMENT_REFERENCE])
+         for transaction in transactions],
+        [Probe(log[LOG_GATEWAY_AMOUNT], log[LOG_GATEWAY_CURRENCY], log[LOG_TIMESTAMP], log[LOG_GATEWAY_TRANSACTION_ID])
+         for log in logs],
+    )
+    linked = 0
+    for transaction_position, log_position in pairs.items():
+        transaction_id, log = transactions[transaction_position][TX_ID], logs[log_position]
+        if await claim_log(cursor, log[LOG_ID], transaction_id):
+            logs_by_transaction[transaction_id] = [log_for(log, transaction_id)]
+            linked += 1
+    if linked:
+        print(f"Linked {linked} payment logs without a transaction_id")
+    return linked
+
+
+async def fetch_chunk_logs(
+    cursor, transactions: Sequence[tuple], matcher: Matcher = EXACT_MATCHER
+) -> Dict[str, List[tuple]]:
+    """
+    fetch_payment_logs() for a chunk, pairing unlinked logs with the
+    transactions left without any and, with SPLIT_MATCHING, resolving split
+    captures and batch settlements (see reconciliation.splits).
+    """
+    from reconciliation import splits  # Imports this module's column positions
+
+    logs_by_transaction = await fetch_payment_logs(cursor, [transaction[TX_ID] for transaction in transactions])
+    if splits.SPLIT_MATCHING:
+        await splits.apply_allocations(cursor, logs_by_transaction)
+    if matcher.link_unlinked:
+        missing = [transaction for transaction in transactions if not logs_by_transaction[transaction[TX_ID]]]
+        if missing:
+            await link_unlinked_logs(cursor, missing, logs_by_transaction, matcher)
+    if splits.SPLIT_MATCHING:
+        splits.combine_split_captures(transactions, logs_by_transaction, matcher)
+        missing = [transaction for transaction in transactions if not logs_by_transaction[transaction[TX_ID]]]
+        if len(missing) > 1:
+            await splits.allocate_batch_settlements(cursor, missing, logs_by_transaction, matcher)
+    return logs_by_transaction
+
+
+def classify_chunk(
+    transactions: Sequence[tuple], logs_by_transaction: Dict[str, List[tuple]], matcher: Matcher = EXACT_MATCHER
+) -> List[dict]:
+    return [
+        classify_transaction(transaction, logs_by_transaction[transaction[TX_ID]], matcher) for transaction in transactions
+    ]
+
+
+async def reconcile_unscanned(
+    connection,
+    submit_analysis: Callable[[str, tuple, Optional[tuple]], Awaitable[None]],
+    batch_size: int = RECONCILE_BATCH_SIZE,
+    on_record: Optional[Callable[[tuple], None]] = None,
+    scanner: str = SCANNER_NAME,
+    stream_connection=None,
+    max_chunk_bytes: int = SCAN_MAX_CHUNK_BYTES,
+    writer: Optional[ReconciliationWriter] = None,
+    shard: Optional[Shard] = None,
+    lease: Optional[ShardLease] = None,
+    full_scan: bool = False
+) -> int:
+    """
+    Reconcile every unscanned transaction in chunks of at most `batch_size`.
+
+    Each chunk costs two reads (transactions and their payment logs); results
+    go through a ReconciliationWriter, which upserts them in multi-row batches.
+    Discrepancies are stored with a pending root cause and handed to
+    `submit_analysis(reconciliation_id, transaction, payment_log)` once
+    committed, so detection never waits on the LLM. `on_record` is called for
+    every transaction once its record is committed. Returns the number of
+    transactions reconciled.
+
+    Per-hour, per-payment-method summary counters are accumulated in memory
+    and upserted by each flush, in the same transaction as its records.
+
+    Progress is tracked by a (transaction_date, transaction_id) watermark in
+    scan_state. A chunk's watermark is only handed to the writer after all its
+    rows are buffered, so it is committed with (never ahead of) those rows and
+    a run interrupted mid-way resumes where its last commit left off.
+
+    A run starts SCAN_LOOKBACK_MINUTES before the watermark, so transactions
+    inserted later with an older transaction_date are missed. A `full_scan`
+    starts from the beginning instead and relies on the NOT EXISTS guard
+    alone; the watermark still only moves forward.
+
+    Transactions are read in chunks of at most `batch_size` rows and
+    `max_chunk_bytes`, either by keyset pages on `connection` or, when a
+    `stream_connection` is given, through a server-side cursor on it.
+
+    With a `shard`, only that slice of transaction_id hashes is scanned (use a
+    per-shard `scanner` name so each keeps its own watermark). A `lease` is
+    renewed in every flush's transaction; losing it aborts the run with
+    LeaseLost before anything else is committed.
+    """
+    pending = {}
+
+    summary_buckets = SummaryBuckets()
+
+    async def after_flush(rows: List[tuple]):
+        summary_buckets.clear()
+        for row in rows:
+            transaction, payment_log = pending.pop(row[0])
+            if row[9] == PENDING_ROOT_CAUSE:
+                await submit_analysis(row[0], transaction, payment_log)
+            if on_record:
+                on_record(transaction)
+
+    committed = {"rows": 0}
+
+    def watermark_checkpoint(watermark: Watermark, scanned: int):
+        async def checkpoint(cursor):
+            await save_watermark(cursor, watermark, scanned - committed["rows"], scanner)
+            committed["rows"] = scanned
+        return checkpoint
+
+    writer = writer or ReconciliationWriter(connection)
+    writer.on_flush = after_flush
+    writer.in_transaction.append(summary_buckets.flush)
+    if lease is not None:
+        writer.in_transaction.append(lease.renew)
+
+    processed = 0
+    async with connection.cursor() as cursor:
+        matcher = await load_matcher(cursor)
+        watermark = await load_watermark(cursor, scanner)
+        start = None if full_scan else resume_point(watermark)
+        if stream_connection is not None:
+            chunks = iter_streamed_chunks(stream_connection, batch_size, start, max_chunk_bytes, shard)
+        else:
+            chunks = iter_keyset_chunks(cursor, batch_size, start, max_chunk_bytes, shard)
+
+        async for transactions in chunks:
+            # NULL-dated rows match every keyset page until their records are
+            # committed; one still buffered from an earlier page is skipped
+            transactions = [transaction for transaction in transactions if reconciliation_id_for(transaction[TX_ID]) not in pending]
+            if not transactions:
+                continue
+            logs_by_transaction = await fetch_chunk_logs(cursor, transactions, matcher)
+
+            for transaction, result in zip(transactions, classify_chunk(transactions, logs_by_transaction, matcher)):
+                root_cause = PENDING_ROOT_CAUSE if result["is_discrepancy"] else NO_DISCREPANCY_ROOT_CAUSE
+                row = build_record_row(transaction, result, root_cause)
+                pending[row[0]] = (transaction, result["payment_log"])
+                # Counted before add() so the buckets match what the next flush writes
+                summary_buckets.add(transaction[TX_PAYMENT_METHOD], row)
+                await writer.add(row)
+
+            processed += len(transactions)
+            last = transactions[-1]
+            if last[TX_DATE] is not None and (watermark is None or (last[TX_DATE], last[TX_ID]) > watermark):
+                watermark = (last[TX_DATE], last[TX_ID])
+                writer.checkpoint = watermark_checkpoint(watermark, processed)
+            if any(transaction[TX_DATE] is None for transaction in transactions):
+                # Commit them before the next page is read, or it reads them again
+                # (and a page of nothing but NULL dates would be read forever)
+                await writer.flush()
+
+        await writer.flush()
+
+    print(f"Reconciled {processed} transactions ({writer.metrics()['rows_per_second']:,} rows/s written)")
+    return processed
+
+
+async def reconcile_shards(
+    connection,
+    submit_analysis: Callable[[str, tuple, Optional[tuple]], Awaitable[None]],
+    owner: str,
+    shard_count: int = SCAN_SHARDS,
+    stream_connection=None,
+    **kwargs
+) -> int:
+    """
+    Run reconcile_unscanned() over every shard `owner` can lease, one at a
+    time, skipping shards another scanner holds. Owners start at different
+    shards so concurrent workers rarely contend for the same lease. Returns
+    the number of transactions reconciled.
+    """
+    processed = 0
+    offset = zlib.crc32(owner.encode("utf-8")) % shard_count
+    for step in range(shard_count):
+        shard = ((offset + step) % shard_count, shard_count)
+        lease = ShardLease(shard, owner)
+        if not await lease.claim(connection):
+            continue
+        try:
+            processed += await reconcile_unscanned(
+                connection, submit_analysis, scanner=shard_scanner_name(shard),
+                stream_connection=stream_connection, shard=shard, lease=lease, **kwargs
+            )
+        except LeaseLost as e:
+            print(f"Stopped scanning shard {shard[0]}/{shard[1]}: {e}")
+        finally:
+            await lease.release(connection)
+    return processed
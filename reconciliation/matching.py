@@ -0,0 +1,224 @@
+"""
+How a transaction's amount is compared with its gateway's, and how payment
+logs that arrived without a transaction_id are paired with transactions.
+
+A Matcher compares amounts in the transaction's currency: the gateway
+amount is converted with the fx_rates effective at the log's time, then
+the difference has to stay within an absolute and/or relative tolerance,
+counted in the currency's minor unit (cents, satoshis for BTC; see
+MATCH_CURRENCY_DECIMALS). Without a tolerance, amounts in the same currency
+are compared exactly, as the engine always has; converted amounts are
+rounded to the minor unit first.
+
+Unlinked logs (transaction_id NULL) are paired, when MATCH_UNLINKED is on,
+first by reference (gateways that echo the merchant's payment_reference as
+gateway_transaction_id) and then by amount within tolerance and timestamp
+within MATCH_TIME_WINDOW_MINUTES, closest timestamp first. The amount
+search goes through a per-currency sorted index (bisect), so pairing costs
+O((n + m) log m) rather than comparing every transaction with every log.
+"""
+import os
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from caching import TTLCache
+
+# Absolute tolerance, in the transaction's currency
+MATCH_AMOUNT_TOLERANCE = Decimal(os.getenv("MATCH_AMOUNT_TOLERANCE", "0"))
+# Relative tolerance, as a fraction of the transaction amount (0.001 = 0.1%)
+MATCH_AMOUNT_TOLERANCE_RATIO = Decimal(os.getenv("MATCH_AMOUNT_TOLERANCE_RATIO", "0"))
+MATCH_UNLINKED = os.getenv("MATCH_UNLINKED", "false").lower() == "true"
+MATCH_TIME_WINDOW_MINUTES = int(os.getenv("MATCH_TIME_WINDOW_MINUTES", "60"))
+FX_RATES_CACHE_TTL_SECONDS = float(os.getenv("FX_RATES_CACHE_TTL_SECONDS", "300"))
+# Decimal places of each currency's minor unit, as CODE:PLACES pairs; other currencies have 2
+MATCH_CURRENCY_DECIMALS = os.getenv("MATCH_CURRENCY_DECIMALS", "BTC:8,ETH:8,JPY:0,KRW:0")
+
+DEFAULT_DECIMALS = 2
+CURRENCY_DECIMALS = {
+    code.strip(): int(places) for code, places in (
+        pair.split(":") for pair in MATCH_CURRENCY_DECIMALS.split(",") if pair.strip()
+    )
+}
+
+
+def minor_units(currency: Optional[str]) -> Decimal:
+    """Minor units per unit of `currency` (100 for cents)."""
+    return Decimal(10) ** CURRENCY_DECIMALS.get(currency, DEFAULT_DECIMALS)
+
+_fx_cache = TTLCache(maxsize=1, ttl=FX_RATES_CACHE_TTL_SECONDS)
+
+
+async def create_fx_rates_table(cursor):
+    # 1 base_currency = rate quote_currency, from effective_at until the pair's next row
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fx_rates (
+            base_currency VARCHAR(10) NOT NULL,
+            quote_currency VARCHAR(10) NOT NULL,
+            effective_at DATETIME NOT NULL,
+            rate DECIMAL(24, 10) NOT NULL,
+            PRIMARY KEY (base_currency, quote_currency, effective_at)
+        )
+    """)
+
+
+class FxTable:
+    """As-of currency rates: the rate in force at a time is found by bisecting the pair's effective dates."""
+
+    def __init__(self, rows: Sequence[Tuple[str, str, datetime, Decimal]] = ()):
+        self.pairs: Dict[Tuple[str, str], Tuple[List[datetime], List[Decimal]]] = {}
+        for base, quote, effective_at, rate in sorted(rows, key=lambda row: (row[0], row[1], row[2])):
+            dates, rates = self.pairs.setdefault((base, quote), ([], []))
+            dates.append(effective_at)
+            rates.append(Decimal(rate))
+
+    def __bool__(self):
+        return bool(self.pairs)
+
+    def _as_of(self, pair: Tuple[str, str], at: Optional[datetime]) -> Optional[Decimal]:
+        if pair not in self.pairs:
+            return None
+        dates, rates = self.pairs[pair]
+        if at is None:
+            return rates[-1]
+        position = bisect_right(dates, at) - 1
+        return rates[position] if position >= 0 else None
+
+    def rate(self, from_currency: Optional[str], to_currency: Optional[str], at: Optional[datetime]) -> Optional[Decimal]:
+        """Units of `to_currency` per unit of `from_currency` at `at`; None when unknown."""
+        if from_currency == to_currency:
+            return Decimal(1)
+        direct = self._as_of((from_currency, to_currency), at)
+        if direct is not None:
+            return direct
+        inverse = self._as_of((to_currency, from_currency), at)
+        return 1 / inverse if inverse else None
+
+
+async def load_fx_table(cursor) -> FxTable:
+    cached = _fx_cache.get("rates")
+    if cached is not None:
+        return cached
+    await cursor.execute("SELECT base_currency, quote_currency, effective_at, rate FROM fx_rates")
+    table = FxTable(await cursor.fetchall())
+    _fx_cache.set("rates", table)
+    return table
+
+
+class Probe(NamedTuple):
+    """The matching-relevant fields of a transaction or a payment log."""
+    amount: Optional[Decimal]
+    currency: Optional[str]
+    at: Optional[datetime]
+    reference: Optional[str]
+
+
+@dataclass
+class Matcher:
+    fx: FxTable
+    tolerance: Decimal = MATCH_AMOUNT_TOLERANCE
+    tolerance_ratio: Decimal = MATCH_AMOUNT_TOLERANCE_RATIO
+    link_unlinked: bool = MATCH_UNLINKED
+    window: timedelta = timedelta(minutes=MATCH_TIME_WINDOW_MINUTES)
+
+    def __post_init__(self):
+        # Without a tolerance, amounts compare as the engine always did
+        self.exact = not self.tolerance and not self.tolerance_ratio
+
+    def converted(self, amount, from_currency: Optional[str], to_currency: Optional[str], at: Optional[datetime]):
+        """`amount` in `to_currency`; unchanged when the currencies match or no rate is known."""
+        if amount is None or from_currency == to_currency or not self.fx:
+            return amount
+        rate = self.fx.rate(from_currency, to_currency, at)
+        return amount if rate is None else Decimal(str(amount)) * rate
+
+    def tolerance_units(self, amount, currency: Optional[str]) -> int:
+        """The tolerance for `amount`, in minor units of `currency`."""
+        relative = abs(Decimal(str(amount))) * self.tolerance_ratio if self.tolerance_ratio else 0
+        return int(max(self.tolerance, relative) * minor_units(currency))
+
+    def amounts_match(self, amount, gateway_amount, currency: Optional[str] = None, converted: bool = False) -> bool:
+        """
+        Whether two amounts in `currency` agree to within the tolerance, in
+        its minor units. `converted` says the gateway amount was converted
+        from another currency, so it is rounded to the minor unit even
+        without a tolerance.
+        """
+        if amount is None or gateway_amount is None:
+            return False
+        if self.exact and not converted:
+            return float(amount) == float(gateway_amount)
+        difference = round(abs(Decimal(str(amount)) - Decimal(str(gateway_amount))) * minor_units(currency))
+        return difference <= self.tolerance_units(amount, currency)
+
+    def pair_unlinked(self, transactions: Sequence[Probe], logs: Sequence[Probe]) -> Dict[int, int]:
+        """
+        Pair transactions (that have no linked log) with unlinked logs, each
+        log at most once; returns {transaction position: log position}.
+        """
+        pairs: Dict[int, int] = {}
+        used = set()
+
+        by_reference: Dict[str, List[int]] = {}
+        for position, log in enumerate(logs):
+            if log.reference:
+                by_reference.setdefault(log.reference, []).append(position)
+        for position, transaction in enumerate(transactions):
+            for candidate in by_reference.get(transaction.reference, ()) if transaction.reference else ():
+                if candidate not in used:
+                    pairs[position] = candidate
+                    used.add(candidate)
+                    break
+
+        # Per currency, log amounts in ascending order, for range searches
+        index: Dict[Optional[str], Tuple[List[float], List[int]]] = {}
+        for position in sorted(range(len(logs)), key=lambda position: float(logs[position].amount or 0)):
+            log = logs[position]
+            if log.amount is None or log.at is None:
+                continue
+            amounts, positions = index.setdefault(log.currency, ([], []))
+            amounts.append(float(log.amount))
+            positions.append(position)
+
+        for position, transaction in enumerate(transactions):
+            if position in pairs or transaction.amount is None or transaction.at is None:
+                continue
+            best: Optional[Tuple[timedelta, int]] = None
+            for currency, (amounts, positions) in index.items():
+                rate = self.fx.rate(transaction.currency, currency, transaction.at)
+                if rate is None:
+                    continue
+                # Search the log currency with a minor unit of slack; candidates are
+                # then checked the way classification compares them
+                target = float(Decimal(str(transaction.amount)) * rate)
+                slack = float(
+                    (self.tolerance_units(transaction.amount, transaction.currency) + 1)
+                    / minor_units(transaction.currency) * rate
+                )
+                start = bisect_left(amounts, target - slack)
+                end = bisect_right(amounts, target + slack)
+                for candidate in positions[start:end]:
+                    log = logs[candidate]
+                    gap = abs(log.at - transaction.at)
+                    if candidate in used or gap > self.window or (best is not None and gap >= best[0]):
+                        continue
+                    if self.amounts_match(
+                        transaction.amount, self.converted(log.amount, log.currency, transaction.currency, log.at),
+                        transaction.currency, log.currency != transaction.currency
+                    ):
+                        best = (gap, candidate)
+            if best is not None:
+                pairs[position] = best[1]
+                used.add(best[1])
+        return pairs
+
+
+async def load_matcher(cursor) -> Matcher:
+    """A Matcher with the current fx_rates (cached for FX_RATES_CACHE_TTL_SECONDS)."""
+    return Matcher(await load_fx_table(cursor))
+
+
+# Exact matching without currency conversion, for callers that don't load rates
+EXACT_MATCHER = Matcher(FxTable(), tolerance=Decimal(0), tolerance_ratio=Decimal(0), link_unlinked=False)
@@ -0,0 +1,156 @@
+import base64
+import binascii
+import json
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Rows per discrepancy category on each /reconcile_data page
+RECONCILE_DATA_PER_CATEGORY = int(os.getenv("RECONCILE_DATA_PER_CATEGORY", "2"))
+RECONCILE_DATA_MAX_PER_CATEGORY = int(os.getenv("RECONCILE_DATA_MAX_PER_CATEGORY", "500"))
+
+RECORD_COLUMNS = [
+    "reconciliation_id", "transaction_id", "discrepancy_category", "transaction_date",
+    "payment_reference", "amount", "status", "gateway_status", "discrepancy_amount",
+    "root_cause", "assigned_to", "resolution_status", "balance", "reconciled_balance",
+]
+
+# Columns every page needs to order rows and build the next cursor
+KEY_COLUMNS = ["reconciliation_id", "discrepancy_category", "transaction_date"]
+
+# Equality filters accepted by /reconcile_data
+FILTER_COLUMNS = [
+    "reconciliation_id", "transaction_id", "transaction_date", "payment_reference", "amount",
+    "status", "gateway_status", "discrepancy_amount", "root_cause", "assigned_to", "resolution_status",
+]
+
+# transaction_date is returned formatted by MySQL, ready to serialize as is
+# ('%' doubled for the driver's parameter substitution)
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+TRANSACTION_DATE_SQL = "DATE_FORMAT(r.transaction_date, '%%Y-%%m-%%d %%H:%%i:%%s') AS transaction_date"
+
+# Position of the last row returned for a category: (transaction_date, reconciliation_id)
+Position = Tuple[Optional[datetime], str]
+
+
+def select_columns(fields: Optional[Iterable[str]]) -> List[str]:
+    """Columns to select for a `fields` projection (None selects all); raises ValueError on unknown fields."""
+    if fields is None:
+        return list(RECORD_COLUMNS)
+    fields = [field.strip() for field in fields if field.strip()]
+    unknown = sorted(set(fields) - set(RECORD_COLUMNS))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return [column for column in RECORD_COLUMNS if column in KEY_COLUMNS or column in fields]
+
+
+def filter_conditions(filters: Dict[str, object]):
+    """One `column = %s` condition per filter actually supplied, so MySQL can use indexes on them."""
+    conditions, params = [], []
+    for column in FILTER_COLUMNS:
+        value = filters.get(column)
+        if value is not None:
+            conditions.append(f"{column} = %s")
+            params.append(value)
+    return conditions, params
+
+
+def after_condition(position: Position, date_column: str = "transaction_date", id_column: str = "reconciliation_id"):
+    """Rows after `position` in ORDER BY date_column DESC, id_column DESC (NULL dates last)."""
+    position_date, position_id = position
+    if position_date is None:
+        return f"({date_column} IS NULL AND {id_column} < %s)", [position_id]
+    return (
+        f"({date_column} < %s OR ({date_column} = %s AND {id_column} < %s) OR {date_column} IS NULL)",
+        [position_date, position_date, position_id],
+    )
+
+
+def sort_newest_first(rows: List[dict], date_key: str = "transaction_date", id_key: str = "reconciliation_id"):
+    """Sort rows in place into ORDER BY date_key DESC, id_key DESC (NULL dates last)."""
+    rows.sort(key=lambda row: (row[date_key] is not None, row[date_key] or "", row[id_key]), reverse=True)
+
+
+def encode_cursor(positions: Dict[str, Position]) -> str:
+    payload = {
+        category: [transaction_date.isoformat() if transaction_date else None, reconciliation_id]
+        for category, (transaction_date, reconciliation_id) in positions.items()
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, sort_keys=True).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Position]:
+    """Inverse of encode_cursor(); raises ValueError on a malformed cursor."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return {
+            category: (datetime.fromisoformat(transaction_date) if transaction_date else None, str(reconciliation_id))
+            for category, (transaction_date, reconciliation_id) in payload.items()
+        }
+    except (binascii.Error, UnicodeError, TypeError, AttributeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}") from e
+
+
+async def query_reconcile_data(
+    cursor,
+    categories: List[str],
+    filters: Dict[str, object],
+    per_category_limit: int,
+    after: Optional[Dict[str, Position]] = None,
+    fields: Optional[Iterable[str]] = None,
+):
+    """
+    Newest records of each category, at most `per_category_limit` per
+    category, as one UNION ALL of keyset-ordered branches. transaction_date
+    comes back as a 'YYYY-MM-DD HH:MM:SS' string.
+
+    `after` is a decoded cursor: categories missing from it are exhausted
+    and skipped, the others resume after their last position. Returns the
+    rows and the positions to resume from, which is empty once every
+    category is exhausted. Expects a DictCursor.
+    """
+    if after is not None:
+        categories = [category for category in categories if category in after]
+    if not categories:
+        return [], {}
+
+    columns = ", ".join(
+        TRANSACTION_DATE_SQL if column == "transaction_date" else f"r.{column}" for column in select_columns(fields)
+    )
+    conditions, filter_params = filter_conditions(filters)
+
+    branches, params = [], []
+    for category in categories:
+        branch_conditions = ["discrepancy_category = %s", *conditions]
+        branch_params = [category, *filter_params]
+        if after is not None:
+            condition, position_params = after_condition(after[category])
+            branch_conditions.append(condition)
+            branch_params.extend(position_params)
+        branches.append(f"""
+            (SELECT {columns} FROM reconciliation_records r
+            WHERE {" AND ".join(branch_conditions)}
+            ORDER BY r.transaction_date DESC, r.reconciliation_id DESC
+            LIMIT %s)
+        """)
+        params.extend([*branch_params, per_category_limit])
+
+    await cursor.execute(" UNION ALL ".join(branches), params)
+    rows = await cursor.fetchall()
+
+    by_category: Dict[str, List[dict]] = {}
+    for row in rows:
+        by_category.setdefault(row["discrepancy_category"], []).append(row)
+    # UNION ALL doesn't keep each branch's order, so restore it before taking the last row
+    for category_rows in by_category.values():
+        sort_newest_first(category_rows)
+    rows = [row for category in categories for row in by_category.get(category, [])]
+
+    # A category that filled its page may have more; one that didn't is exhausted
+    next_positions = {}
+    for category, category_rows in by_category.items():
+        if len(category_rows) == per_category_limit:
+            last = category_rows[-1]
+            last_date = datetime.strptime(last["transaction_date"], DATE_FORMAT) if last["transaction_date"] else None
+            next_positions[category] = (last_date, last["reconciliation_id"])
+    return rows, next_positions
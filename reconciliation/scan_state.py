@@ -0,0 +1,60 @@
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+SCANNER_NAME = "reconciliation"
+
+# Transactions inserted with a transaction_date slightly behind the watermark
+# (late writers, clock skew) are still picked up; the NOT EXISTS guard in the
+# scan keeps the overlap idempotent. Anything older (back-dated loads) is
+# left to the periodic full sweep (RECONCILE_FULL_SWEEP_SECONDS).
+SCAN_LOOKBACK_MINUTES = int(os.getenv("SCAN_LOOKBACK_MINUTES", "60"))
+
+Watermark = Tuple[datetime, str]
+
+
+async def create_scan_state_table(cursor):
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scan_state (
+            scanner VARCHAR(64) PRIMARY KEY,
+            last_transaction_date DATETIME,
+            last_transaction_id VARCHAR(36),
+            rows_scanned BIGINT DEFAULT 0,
+            updated_at DATETIME
+        )
+    """)
+
+
+async def load_watermark(cursor, scanner: str = SCANNER_NAME) -> Optional[Watermark]:
+    """Return the (transaction_date, transaction_id) the scanner last committed, if any."""
+    await cursor.execute("""
+        SELECT last_transaction_date, last_transaction_id FROM scan_state WHERE scanner = %s
+    """, (scanner,))
+    row = await cursor.fetchone()
+    if not row or row[0] is None:
+        return None
+    return row[0], row[1]
+
+
+def resume_point(watermark: Optional[Watermark], lookback_minutes: int = SCAN_LOOKBACK_MINUTES) -> Optional[Watermark]:
+    """Where a new run starts reading: the watermark, pulled back by the lookback window."""
+    if watermark is None or lookback_minutes <= 0:
+        return watermark
+    return watermark[0] - timedelta(minutes=lookback_minutes), ""
+
+
+async def save_watermark(cursor, watermark: Watermark, rows: int, scanner: str = SCANNER_NAME):
+    """
+    Store the scanner's watermark. Run it inside the transaction that writes
+    the batch's reconciliation_records so a crash never moves one without the
+    other. Callers only ever pass a watermark at or past the stored one.
+    """
+    await cursor.execute("""
+        INSERT INTO scan_state (scanner, last_transaction_date, last_transaction_id, rows_scanned, updated_at)
+        VALUES (%s, %s, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE
+            last_transaction_date = VALUES(last_transaction_date),
+            last_transaction_id = VALUES(last_transaction_id),
+            rows_scanned = rows_scanned + VALUES(rows_scanned),
+            updated_at = NOW()
+    """, (scanner, watermark[0], watermark[1], rows))
@@ -0,0 +1,119 @@
+import os
+import socket
+import uuid
+import zlib
+from typing import Optional, Tuple
+
+from reconciliation.scan_state import SCANNER_NAME
+
+# Transactions are split into SCAN_SHARDS slices by a hash of transaction_id.
+# Every scanner (the API's scheduler and backfill workers alike) must use the
+# same count, since leases and watermarks are kept per (index, count).
+SCAN_SHARDS = int(os.getenv("SCAN_SHARDS", "1"))
+SCAN_LEASE_SECONDS = int(os.getenv("SCAN_LEASE_SECONDS", "300"))
+
+Shard = Tuple[int, int]  # (index, count)
+
+
+class LeaseLost(Exception):
+    """Another scanner took over a shard this one was still scanning."""
+
+
+def shard_scanner_name(shard: Shard) -> str:
+    """scan_state key of a shard; a single shard keeps the original scanner's watermark."""
+    index, count = shard
+    return SCANNER_NAME if count == 1 else f"{SCANNER_NAME}:{index}/{count}"
+
+
+def shard_predicate(shard: Optional[Shard]):
+    """SQL condition (and its params) selecting the transactions of `shard`."""
+    if shard is None or shard[1] == 1:
+        return "", []
+    index, count = shard
+    return "AND MOD(CRC32(t.transaction_id), %s) = %s", [count, index]
+
+
+def shard_of(transaction_id: str, count: int = SCAN_SHARDS) -> Shard:
+    """The shard shard_predicate() puts `transaction_id` in (zlib.crc32 matches MySQL's CRC32)."""
+    return zlib.crc32(transaction_id.encode("utf-8")) % count, count
+
+
+def lease_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def create_scan_leases_table(cursor):
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scan_leases (
+            shard_count INT NOT NULL,
+            shard_index INT NOT NULL,
+            owner VARCHAR(128),
+            expires_at DATETIME,
+            PRIMARY KEY (shard_count, shard_index)
+        )
+    """)
+
+
+class ShardLease:
+    """
+    Time-limited claim on one shard, stored as a scan_leases row.
+
+    claim() takes the row when it is free, expired or already ours. renew()
+    runs inside the caller's transaction (the scanner's writer flush), so
+    records are only ever committed by the current owner; release() hands
+    the shard back early. Expiry uses the database clock, so instances with
+    skewed clocks agree on it.
+    """
+
+    def __init__(self, shard: Shard, owner: str, duration: int = SCAN_LEASE_SECONDS):
+        self.shard = shard
+        self.owner = owner
+        self.duration = duration
+
+    async def claim(self, connection) -> bool:
+        index, count = self.shard
+        async with connection.cursor() as cursor:
+            try:
+                await connection.begin()
+                await cursor.execute("""
+                    INSERT IGNORE INTO scan_leases (shard_count, shard_index, owner, expires_at)
+                    VALUES (%s, %s, NULL, NULL)
+                """, (count, index))
+                await cursor.execute("""
+                    SELECT owner = %s OR owner IS NULL OR expires_at <= NOW()
+                    FROM scan_leases WHERE shard_count = %s AND shard_index = %s
+                    FOR UPDATE
+                """, (self.owner, count, index))
+                claimable = bool((await cursor.fetchone())[0])
+                if claimable:
+                    await self._extend(cursor)
+                await connection.commit()
+            except Exception:
+                await connection.rollback()
+                raise
+        return claimable
+
+    async def renew(self, cursor):
+        index, count = self.shard
+        await cursor.execute("""
+            SELECT owner FROM scan_leases WHERE shard_count = %s AND shard_index = %s FOR UPDATE
+        """, (count, index))
+        row = await cursor.fetchone()
+        if not row or row[0] != self.owner:
+            raise LeaseLost(f"Lease on shard {index}/{count} is now held by {row[0] if row else 'nobody'}")
+        await self._extend(cursor)
+
+    async def release(self, connection):
+        index, count = self.shard
+        async with connection.cursor() as cursor:
+            await cursor.execute("""
+                UPDATE scan_leases SET owner = NULL, expires_at = NULL
+                WHERE shard_count = %s AND shard_index = %s AND owner = %s
+            """, (count, index, self.owner))
+
+    async def _extend(self, cursor):
+        index, count = self.shard
+        await cursor.execute("""
+            UPDATE scan_leases SET owner = %s, expires_at = NOW() + INTERVAL %s SECOND
+            WHERE shard_count = %s AND shard_index = %s
+        """, (self.owner, self.duration, count, index))
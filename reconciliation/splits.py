@@ -0,0 +1,293 @@
+"""
+Split payments and batch settlements, for gateways that don't settle one
+transaction with exactly one payment log.
+
+Split captures: a transaction settled by several successful partial
+captures is linked to all of them. When those captures add up to its
+amount (within the Matcher's tolerance) they are combined into one log,
+instead of the transaction being flagged as a Duplicate Payment.
+
+Batch settlements: one settlement line pays for several transactions and
+so carries no transaction_id. For transactions still without a log, an
+unlinked log within the matching time window is allocated to a subset of
+them whose amounts add up to it. Subsets are only drawn from one group
+(SPLIT_GROUP_BY: the account or the user), since a settlement pays one
+merchant account. The search is a depth-first subset sum over amounts
+sorted largest first, fewest parts first. The last part is looked up by
+bisection. A branch is pruned when its largest remaining amounts can no
+longer reach the target, and repeated equal amounts are pruned too. The
+search stops at SPLIT_MAX_PARTS parts or SPLIT_SEARCH_BUDGET nodes, so one
+unlucky group can't stall a chunk.
+
+The settlement log is claimed for the subset's first transaction (the
+anchor) like any other unlinked log. Each transaction's share is recorded
+in settlement_allocations in the same database transaction as the claim,
+and every later reconciliation of the transaction reads that share back
+as its payment log.
+"""
+import os
+from bisect import bisect_left
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from db_connection.queries import registry
+from reconciliation.engine import (
+    LOG_GATEWAY_AMOUNT, LOG_GATEWAY_CURRENCY, LOG_GATEWAY_STATUS, LOG_ID, LOG_TIMESTAMP, TX_ACCOUNT_ID, TX_AMOUNT,
+    TX_CURRENCY, TX_DATE, TX_ID, TX_USER_ID, claim_log, fetch_unlinked_logs, log_for
+)
+from reconciliation.matching import Matcher, minor_units
+
+SPLIT_MATCHING = os.getenv("SPLIT_MATCHING", "false").lower() == "true"
+SPLIT_GROUP_BY = os.getenv("SPLIT_GROUP_BY", "account_id")
+SPLIT_MAX_PARTS = int(os.getenv("SPLIT_MAX_PARTS", "8"))
+SPLIT_SEARCH_BUDGET = int(os.getenv("SPLIT_SEARCH_BUDGET", "5000"))
+
+GROUP_COLUMNS = {"account_id": TX_ACCOUNT_ID, "user_id": TX_USER_ID}
+if SPLIT_GROUP_BY not in GROUP_COLUMNS:
+    raise ValueError(f"SPLIT_GROUP_BY must be one of {', '.join(GROUP_COLUMNS)}, not {SPLIT_GROUP_BY}")
+
+# Decimal places of settlement_allocations.amount; shares are never finer
+ALLOCATION_DECIMALS = 8
+
+Key = TypeVar("Key")
+
+
+async def create_allocations_table(cursor):
+    # A transaction is paid by at most one settlement; a settlement pays many.
+    # Shares are in the settlement currency's minor unit, down to satoshis for BTC.
+    await cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS settlement_allocations (
+            transaction_id VARCHAR(36) PRIMARY KEY,
+            log_id VARCHAR(36) NOT NULL,
+            amount DECIMAL(20, {ALLOCATION_DECIMALS}) NOT NULL,
+            allocated_at DATETIME NOT NULL,
+            INDEX idx_settlement_allocations_log (log_id)
+        )
+    """)
+
+
+class SearchExhausted(Exception):
+    pass
+
+
+def find_subset(
+    target: int, items: Sequence[Tuple[int, Key]], tolerance: int = 0, min_parts: int = 2,
+    max_parts: int = SPLIT_MAX_PARTS, budget: int = SPLIT_SEARCH_BUDGET
+) -> Optional[List[Key]]:
+    """
+    Keys of the fewest items (between `min_parts` and `max_parts`) whose
+    amounts, in minor units, sum to `target` within `tolerance`; None when
+    there is no such subset or the search visited `budget` nodes without one.
+    """
+    ordered = sorted((item for item in items if 0 < item[0] <= target + tolerance), key=lambda item: -item[0])
+    values = [cents for cents, _ in ordered]
+    descending = [-cents for cents in values]
+    # prefix[i] is the sum of the i largest amounts
+    prefix = [0]
+    for cents in values:
+        prefix.append(prefix[-1] + cents)
+    if prefix[-1] < target - tolerance:
+        return None
+
+    visited = 0
+
+    def search(start: int, remaining: int, depth: int, parts: int) -> Optional[List[int]]:
+        nonlocal visited
+        parts_left = parts - depth
+        if depth + 1 >= min_parts:
+            # The last part is looked up rather than tried one by one
+            position = bisect_left(descending, -(remaining + tolerance), start)
+            if position < len(values) and values[position] >= remaining - tolerance:
+                return [position]
+            if parts_left == 1:
+                return None
+        previous = None
+        # Amounts are descending: skip the ones that would finish (looked up above) or overshoot
+        first = start if depth + 1 < min_parts else bisect_left(descending, -(remaining - tolerance - 1), start)
+        for position in range(max(first, bisect_left(descending, -(remaining + tolerance), start)), len(values)):
+            # Even the largest parts from here on can't reach the target
+            if prefix[min(position + parts_left, len(values))] - prefix[position] < remaining - tolerance:
+                break
+            cents = values[position]
+            if cents == previous:
+                continue
+            previous = cents
+            visited += 1
+            if visited > budget:
+                raise SearchExhausted
+            found = search(position + 1, remaining - cents, depth + 1, parts)
+            if found is not None:
+                return [position] + found
+        return None
+
+    # Fewest parts first: the smallest subset is the likeliest explanation,
+    # and small subsets are the cheapest to rule out
+    for parts in range(min_parts, max_parts + 1):
+        try:
+            positions = search(0, target, 0, parts)
+        except SearchExhausted:
+            return None
+        if positions is not None:
+            return [ordered[position][1] for position in positions]
+    return None
+
+
+def _newest_first(payment_logs: List[tuple]):
+    payment_logs.sort(key=lambda payment_log: payment_log[LOG_TIMESTAMP] or datetime.min, reverse=True)
+
+
+async def apply_allocations(cursor, logs_by_transaction: Dict[str, List[tuple]]):
+    """Replace settlement logs with each transaction's allocated share of them."""
+    transaction_ids = list(logs_by_transaction)
+    if not transaction_ids:
+        return
+    async with registry.timed("settlement_allocations"):
+        await cursor.execute(f"""
+            SELECT a.transaction_id, a.amount, p.* FROM settlement_allocations a
+            JOIN payment_logs p ON p.log_id = a.log_id
+            WHERE a.transaction_id IN ({", ".join(["%s"] * len(transaction_ids))})
+        """, tuple(transaction_ids))
+        allocations = await cursor.fetchall()
+    if not allocations:
+        return
+
+    # The anchor transaction is linked to the whole settlement; it only keeps its share
+    settlement_ids = {allocation[2 + LOG_ID] for allocation in allocations}
+    for transaction_id, amount, *payment_log in allocations:
+        payment_logs = [log for log in logs_by_transaction[transaction_id] if log[LOG_ID] not in settlement_ids]
+        payment_logs.append(log_for(tuple(payment_log), transaction_id, amount))
+        _newest_first(payment_logs)
+        logs_by_transaction[transaction_id] = payment_logs
+
+
+def combine_split_captures(
+    transactions: Sequence[tuple], logs_by_transaction: Dict[str, List[tuple]], matcher: Matcher
+) -> int:
+    """
+    Combine the successful captures of a transaction into one log when
+    together they pay its amount; failed attempts alongside them are
+    dropped. Returns the number of transactions combined.
+    """
+    combined = 0
+    for transaction in transactions:
+        payment_logs = logs_by_transaction[transaction[TX_ID]]
+        if len(payment_logs) < 2:
+            continue
+        captures = [payment_log for payment_log in payment_logs if payment_log[LOG_GATEWAY_STATUS] == "Success"]
+        if len(captures) < 2 or len({capture[LOG_GATEWAY_CURRENCY] for capture in captures}) > 1:
+            continue
+        if any(capture[LOG_GATEWAY_AMOUNT] is None for capture in captures):
+            continue
+        newest = captures[0]
+        total = sum(Decimal(str(capture[LOG_GATEWAY_AMOUNT])) for capture in captures)
+        paid = matcher.converted(total, newest[LOG_GATEWAY_CURRENCY], transaction[TX_CURRENCY], newest[LOG_TIMESTAMP])
+        converted = newest[LOG_GATEWAY_CURRENCY] != transaction[TX_CURRENCY]
+        if matcher.amounts_match(transaction[TX_AMOUNT], paid, transaction[TX_CURRENCY], converted):
+            logs_by_transaction[transaction[TX_ID]] = [log_for(newest, transaction[TX_ID], total)]
+            combined += 1
+    return combined
+
+
+def _share(transaction: tuple, settlement: tuple, matcher: Matcher) -> Optional[Decimal]:
+    """
+    The transaction's amount in the settlement's currency, at the settlement's
+    rate, rounded as settlement_allocations stores it; None without a rate.
+    """
+    if transaction[TX_AMOUNT] is None:
+        return None
+    if transaction[TX_CURRENCY] != settlement[LOG_GATEWAY_CURRENCY] and matcher.fx.rate(
+        transaction[TX_CURRENCY], settlement[LOG_GATEWAY_CURRENCY], settlement[LOG_TIMESTAMP]
+    ) is None:
+        return None
+    amount = matcher.converted(
+        transaction[TX_AMOUNT], transaction[TX_CURRENCY], settlement[LOG_GATEWAY_CURRENCY], settlement[LOG_TIMESTAMP]
+    )
+    quantum = max(1 / minor_units(settlement[LOG_GATEWAY_CURRENCY]), Decimal(10) ** -ALLOCATION_DECIMALS)
+    return Decimal(str(amount)).quantize(quantum)
+
+
+async def record_allocations(cursor, log_id: str, anchor: str, allocations: List[tuple]) -> bool:
+    """
+    Claim settlement `log_id` for `anchor` and record its allocations in one
+    transaction, so the anchor is never left holding the whole settlement;
+    False if another scanner claimed it first.
+    """
+    connection = cursor.connection
+    # The outbox tailer calls this inside its own transaction; the scan autocommits
+    owned = not connection.get_transaction_status()
+    try:
+        if owned:
+            await connection.begin()
+        if not await claim_log(cursor, log_id, anchor):
+            if owned:
+                await connection.rollback()
+            return False
+        await cursor.executemany("""
+            INSERT INTO settlement_allocations (transaction_id, log_id, amount, allocated_at)
+            VALUES (%s, %s, %s, NOW())
+        """, allocations)
+        if owned:
+            await connection.commit()
+    except Exception:
+        if owned:
+            await connection.rollback()
+        raise
+    return True
+
+
+async def allocate_batch_settlements(
+    cursor, transactions: Sequence[tuple], logs_by_transaction: Dict[str, List[tuple]], matcher: Matcher
+) -> int:
+    """
+    Allocate unlinked settlement logs to subsets of `transactions` (which
+    have no payment logs), largest settlement first; returns the number of
+    transactions allocated.
+    """
+    settlements = [
+        log for log in await fetch_unlinked_logs(cursor, transactions, matcher.window, by_reference=False)
+        if log[LOG_GATEWAY_AMOUNT] is not None and log[LOG_TIMESTAMP] is not None
+    ]
+    if not settlements:
+        return 0
+    settlements.sort(key=lambda log: (-log[LOG_GATEWAY_AMOUNT], log[LOG_ID]))
+
+    group_column = GROUP_COLUMNS[SPLIT_GROUP_BY]
+    groups: Dict[str, List[tuple]] = {}
+    for transaction in transactions:
+        if transaction[TX_DATE] is not None and transaction[group_column] is not None:
+            groups.setdefault(transaction[group_column], []).append(transaction)
+
+    allocated = set()
+    for settlement in settlements:
+        # Amounts are searched in the settlement currency's minor units
+        units = minor_units(settlement[LOG_GATEWAY_CURRENCY])
+        target = int(Decimal(str(settlement[LOG_GATEWAY_AMOUNT])) * units)
+        tolerance = matcher.tolerance_units(settlement[LOG_GATEWAY_AMOUNT], settlement[LOG_GATEWAY_CURRENCY])
+        for members in groups.values():
+            shares = {}
+            for transaction in members:
+                if transaction[TX_ID] in allocated or abs(transaction[TX_DATE] - settlement[LOG_TIMESTAMP]) > matcher.window:
+                    continue
+                share = _share(transaction, settlement, matcher)
+                if share is not None:
+                    shares[transaction[TX_ID]] = (transaction, share)
+            if len(shares) < 2 or sum(share for _, share in shares.values()) * units < target - tolerance:
+                continue
+
+            subset = find_subset(
+                target, [(int(share * units), transaction_id) for transaction_id, (_, share) in shares.items()], tolerance
+            )
+            if subset is None:
+                continue
+            allocations = [(transaction_id, settlement[LOG_ID], shares[transaction_id][1]) for transaction_id in subset]
+            if not await record_allocations(cursor, settlement[LOG_ID], min(subset), allocations):
+                break  # Another scanner took this settlement
+            for transaction_id in subset:
+                logs_by_transaction[transaction_id] = [log_for(settlement, transaction_id, shares[transaction_id][1])]
+                allocated.add(transaction_id)
+            break
+
+    if allocated:
+        print(f"Allocated settlement logs to {len(allocated)} transactions")
+    return len(allocated)
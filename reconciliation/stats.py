@@ -0,0 +1,102 @@
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+
+import aiomysql
+
+from caching import TTLCache
+from db_connection.pool import acquire
+
+STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", "30"))
+
+# Categories shown on the dashboard bar chart, in display order
+DASHBOARD_CATEGORIES = ["Missing Payments", "Amount Mismatch", "Status Mismatch", "Duplicates"]
+
+_cache = TTLCache(maxsize=4, ttl=STATS_CACHE_TTL_SECONDS)
+_lock = asyncio.Lock()
+
+
+def period_starts(now: datetime):
+    today = now.date()
+    this_week_start = (now - timedelta(days=now.weekday())).date()
+    this_month_start = date(now.year, now.month, 1)
+    return today, this_week_start, this_month_start
+
+
+async def compute_dashboard_stats(now: datetime) -> dict:
+    """
+    Every dashboard counter in one scan of reconciliation_records.
+
+    Scanned/resolved/unresolved used to join transactions; the foreign key
+    makes that join equivalent to requiring a non-NULL transaction_id.
+    """
+    today, this_week_start, this_month_start = period_starts(now)
+    category_columns = ",\n".join(
+        f"SUM(discrepancy_category = %s) AS category_{index}" for index in range(len(DASHBOARD_CATEGORIES))
+    )
+    query = f"""
+        SELECT
+            SUM(transaction_id IS NOT NULL) AS scanned,
+            SUM(transaction_id IS NOT NULL AND resolution_status = 'Unresolved') AS unresolved,
+            SUM(transaction_id IS NOT NULL AND resolution_status = 'Resolved') AS resolved,
+            {category_columns},
+            SUM(discrepancy_category IS NULL) AS no_discrepancy,
+            SUM(is_case AND transaction_date = %s) AS today,
+            SUM(is_case AND transaction_date >= %s) AS this_week,
+            SUM(is_case AND transaction_date >= %s) AS this_month
+        FROM (
+            SELECT
+                transaction_id, resolution_status, discrepancy_category, transaction_date,
+                (discrepancy_category IS NOT NULL AND discrepancy_category != 'No Discrepancy') AS is_case
+            FROM reconciliation_records
+        ) r
+    """
+    params = [*DASHBOARD_CATEGORIES, today, this_week_start, this_month_start]
+
+    async with acquire() as connection:
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(query, params)
+            row = await cursor.fetchone()
+
+    def count(value) -> int:
+        return int(value or 0)
+
+    categories = {category: count(row[f"category_{index}"]) for index, category in enumerate(DASHBOARD_CATEGORIES)}
+    categories["No Discrepancy"] = count(row["no_discrepancy"])
+
+    return {
+        "scanned": count(row["scanned"]),
+        "unresolved": count(row["unresolved"]),
+        "resolved": count(row["resolved"]),
+        "categories": categories,
+        "cases": {
+            "today": count(row["today"]),
+            "this_week": count(row["this_week"]),
+            "this_month": count(row["this_month"]),
+        },
+    }
+
+
+async def get_dashboard_stats() -> dict:
+    """Dashboard counters, served from a short-TTL cache shared by all dashboard endpoints."""
+    now = datetime.now()
+    key = now.date()  # Period boundaries move at midnight
+    stats = _cache.get(key)
+    if stats is not None:
+        return stats
+
+    async with _lock:
+        stats = _cache.get(key)
+        if stats is None:
+            stats = await compute_dashboard_stats(now)
+            _cache.set(key, stats)
+    return stats
+
+
+def invalidate_dashboard_stats():
+    """Called whenever reconciliation_records change so the next poll recomputes."""
+    _cache.invalidate()
+
+
+def stats_cache_metrics() -> dict:
+    return _cache.metrics()
@@ -0,0 +1,197 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+# reconciliation_records rows as built by engine.build_record_row
+ROW_CATEGORY = 2
+ROW_TRANSACTION_DATE = 3
+ROW_AMOUNT = 5
+ROW_DISCREPANCY_AMOUNT = 8
+ROW_RESOLUTION_STATUS = 11
+
+# Transactions without a transaction_date are counted in this bucket
+UNDATED_BUCKET = datetime(1970, 1, 1)
+
+CATEGORY_COLUMNS = {
+    "Missing Payments": "missing_payments",
+    "Amount Mismatch": "amount_mismatch",
+    "Status Mismatch": "status_mismatch",
+    "Duplicate Payment": "duplicate_payments",
+}
+
+COUNTER_COLUMNS = [
+    "total_transactions", "discrepancy_count", *CATEGORY_COLUMNS.values(),
+    "resolved_count", "no_discrepancy_count", "unresolved_count",
+    "total_amount", "discrepancy_amount",
+]
+
+GROUPINGS = {
+    "hour": "bucket_start",
+    "day": "DATE(bucket_start)",
+    "payment_method": "payment_method",
+}
+
+BucketKey = Tuple[datetime, str]
+
+
+async def create_summary_buckets_table(cursor):
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS reconciliation_summary_buckets (
+            bucket_start DATETIME NOT NULL,
+            payment_method VARCHAR(50) NOT NULL DEFAULT '',
+            total_transactions BIGINT NOT NULL DEFAULT 0,
+            discrepancy_count BIGINT NOT NULL DEFAULT 0,
+            missing_payments BIGINT NOT NULL DEFAULT 0,
+            amount_mismatch BIGINT NOT NULL DEFAULT 0,
+            status_mismatch BIGINT NOT NULL DEFAULT 0,
+            duplicate_payments BIGINT NOT NULL DEFAULT 0,
+            resolved_count BIGINT NOT NULL DEFAULT 0,
+            no_discrepancy_count BIGINT NOT NULL DEFAULT 0,
+            unresolved_count BIGINT NOT NULL DEFAULT 0,
+            total_amount DECIMAL(20, 2) NOT NULL DEFAULT 0,
+            discrepancy_amount DECIMAL(20, 2) NOT NULL DEFAULT 0,
+            updated_at DATETIME,
+            PRIMARY KEY (bucket_start, payment_method)
+        )
+    """)
+
+
+async def backfill_summary_buckets(cursor) -> int:
+    """
+    Build the buckets from reconciliation_records when the table is empty,
+    e.g. on the first start after the table was introduced. Returns the
+    number of buckets written.
+    """
+    await cursor.execute("SELECT 1 FROM reconciliation_summary_buckets LIMIT 1")
+    if await cursor.fetchone():
+        return 0
+
+    category_sums = ",\n".join(
+        f"SUM(r.discrepancy_category = '{category}')" for category in CATEGORY_COLUMNS
+    )
+    await cursor.execute(f"""
+        INSERT INTO reconciliation_summary_buckets (
+            bucket_start, payment_method, {", ".join(COUNTER_COLUMNS)}, updated_at
+        )
+        SELECT
+            COALESCE(DATE_FORMAT(r.transaction_date, '%%Y-%%m-%%d %%H:00:00'), %s) AS bucket,
+            COALESCE(t.payment_method, '') AS method,
+            COUNT(*),
+            SUM(r.discrepancy_category IS NOT NULL),
+            {category_sums},
+            SUM(r.resolution_status = 'Resolved'),
+            SUM(r.resolution_status = 'No Discrepancy'),
+            SUM(r.resolution_status = 'Unresolved'),
+            COALESCE(SUM(r.amount), 0),
+            COALESCE(SUM(GREATEST(r.discrepancy_amount, 0)), 0),
+            NOW()
+        FROM reconciliation_records r
+        JOIN transactions t ON r.transaction_id = t.transaction_id
+        GROUP BY bucket, method
+    """, (UNDATED_BUCKET,))
+    return cursor.rowcount
+
+
+def bucket_start(value: Optional[datetime]) -> datetime:
+    if value is None:
+        return UNDATED_BUCKET
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def decimal(value) -> Decimal:
+    return Decimal(str(value or 0))
+
+
+class SummaryBuckets:
+    """
+    Running per-hour, per-payment-method reconciliation counters.
+
+    The scanner add()s every record it buffers; flush() is run inside the
+    writer's transaction so the increments commit together with the records
+    they describe, then clear() drops them once committed. Since the scan
+    only picks up transactions without a reconciliation record, each
+    transaction is counted exactly once. Change capture, which reconciles
+    transactions again, moves a record by adding its previous row with
+    sign=-1.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[BucketKey, dict] = {}
+
+    def add(self, payment_method: Optional[str], row: tuple, sign: int = 1):
+        key = (bucket_start(row[ROW_TRANSACTION_DATE]), payment_method or "")
+        counters = self.buckets.get(key)
+        if counters is None:
+            counters = self.buckets[key] = dict.fromkeys(COUNTER_COLUMNS, 0)
+            counters["total_amount"] = counters["discrepancy_amount"] = Decimal(0)
+
+        category = row[ROW_CATEGORY]
+        counters["total_transactions"] += sign
+        if category is not None:
+            counters["discrepancy_count"] += sign
+            if category in CATEGORY_COLUMNS:
+                counters[CATEGORY_COLUMNS[category]] += sign
+
+        status = row[ROW_RESOLUTION_STATUS]
+        if status == "Resolved":
+            counters["resolved_count"] += sign
+        elif status == "No Discrepancy":
+            counters["no_discrepancy_count"] += sign
+        elif status == "Unresolved":
+            counters["unresolved_count"] += sign
+
+        counters["total_amount"] += sign * decimal(row[ROW_AMOUNT])
+        # -1 marks "no gateway amount", not an actual difference
+        counters["discrepancy_amount"] += sign * max(decimal(row[ROW_DISCREPANCY_AMOUNT]), Decimal(0))
+
+    async def flush(self, cursor):
+        if not self.buckets:
+            return
+        increments = ", ".join(f"{column} = {column} + VALUES({column})" for column in COUNTER_COLUMNS)
+        placeholders = ", ".join(["%s"] * (len(COUNTER_COLUMNS) + 2))
+        await cursor.executemany(f"""
+            INSERT INTO reconciliation_summary_buckets (
+                bucket_start, payment_method, {", ".join(COUNTER_COLUMNS)}, updated_at
+            ) VALUES ({placeholders}, NOW())
+            ON DUPLICATE KEY UPDATE {increments}, updated_at = NOW()
+        """, [
+            (start, method, *(counters[column] for column in COUNTER_COLUMNS))
+            for (start, method), counters in self.buckets.items()
+        ])
+
+    def clear(self):
+        self.buckets = {}
+
+
+async def query_summary_window(
+    cursor, start: datetime, end: datetime, payment_method: Optional[str] = None, group_by: Optional[str] = None
+) -> List[dict]:
+    """
+    Sum the buckets overlapping [start, end). Buckets are hourly, so `start`
+    is rounded down to its hour. `group_by` is "hour", "day",
+    "payment_method" or None for a single total. Expects a DictCursor.
+    """
+    conditions = ["bucket_start >= %s", "bucket_start < %s"]
+    params = [bucket_start(start), end]
+    if payment_method:
+        conditions.append("payment_method = %s")
+        params.append(payment_method)
+
+    group_column = GROUPINGS[group_by] if group_by else None
+    select_group = f"{group_column} AS `{group_by}`, " if group_column else ""
+    group_clause = f"GROUP BY {group_column} ORDER BY {group_column}" if group_column else ""
+    sums = ", ".join(f"COALESCE(SUM({column}), 0) AS {column}" for column in COUNTER_COLUMNS)
+
+    await cursor.execute(f"""
+        SELECT {select_group}{sums}
+        FROM reconciliation_summary_buckets
+        WHERE {" AND ".join(conditions)}
+        {group_clause}
+    """, params)
+    rows = await cursor.fetchall()
+
+    for row in rows:
+        total = int(row["total_transactions"])
+        settled = int(row["resolved_count"]) + int(row["no_discrepancy_count"])
+        row["resolution_rate"] = round(settled / total * 100, 2) if total else 0
+    return rows
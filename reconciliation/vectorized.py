@@ -0,0 +1,245 @@
+"""
+A columnar (pandas/NumPy) version of classify_chunk(), kept as a reference
+rather than used by the engine: end to end it is slower than the row path,
+because building the frames from DB tuples costs more than the per-row
+rules it replaces (1M rows: 1.94s to build plus 1.65s to classify, against
+3.68s for classify_transaction()). benchmarks/reconcile_core.py reproduces
+the timings and tests/test_vectorized_equivalence.py keeps both paths
+agreeing, so the comparison can be rerun when the rules change.
+"""
+from decimal import ROUND_FLOOR, Decimal
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from reconciliation.engine import (
+    LOG_GATEWAY_AMOUNT, LOG_GATEWAY_CURRENCY, LOG_GATEWAY_RESPONSE, LOG_GATEWAY_STATUS, LOG_TIMESTAMP,
+    LOG_TRANSACTION_ID, TX_AMOUNT, TX_CURRENCY, TX_ID, TX_STATUS, gateway_amount_of,
+)
+from reconciliation.matching import CURRENCY_DECIMALS, DEFAULT_DECIMALS, EXACT_MATCHER, Matcher, minor_units
+
+# Amounts are DECIMAL(15, 2): scaled by 100 they are exact integers well
+# inside float64's 2**53 range, so rint(amount * 100) recovers them exactly
+# and cent comparisons on them are exact.
+CENTS = 100
+NO_GATEWAY_AMOUNT = -1
+
+
+def to_cents(values: Sequence) -> np.ndarray:
+    """Decimal/float amounts as whole cents in a float64 array, NaN for NULL."""
+    amounts = np.fromiter((np.nan if value is None else float(value) for value in values), dtype=np.float64, count=len(values))
+    return np.rint(amounts * CENTS)
+
+
+def minor_units_of(currencies: np.ndarray) -> np.ndarray:
+    """matching.minor_units() for every currency, as floats."""
+    decimals = pd.Series(currencies, dtype=object).map(CURRENCY_DECIMALS).fillna(DEFAULT_DECIMALS)
+    return 10.0 ** decimals.to_numpy(dtype=np.float64)
+
+
+def cents_to_units(cents: np.ndarray, units: np.ndarray) -> np.ndarray:
+    """Cents in minor units, multiplying or dividing by a whole factor so exact values stay exact."""
+    return np.where(units >= CENTS, cents * (units / CENTS), cents / (CENTS / units))
+
+
+def column(rows: Sequence[tuple], index: int) -> np.ndarray:
+    values = np.empty(len(rows), dtype=object)
+    values[:] = [row[index] for row in rows]
+    return values
+
+
+def transactions_frame(transactions: Sequence[tuple]) -> pd.DataFrame:
+    return pd.DataFrame({
+        "transaction_id": column(transactions, TX_ID),
+        "status": column(transactions, TX_STATUS),
+        "currency": column(transactions, TX_CURRENCY),
+        "amount_cents": to_cents([transaction[TX_AMOUNT] for transaction in transactions]),
+    })
+
+
+def payment_logs_frame(payment_logs: Sequence[tuple]) -> pd.DataFrame:
+    return pd.DataFrame({
+        "transaction_id": column(payment_logs, LOG_TRANSACTION_ID),
+        "gateway_status": column(payment_logs, LOG_GATEWAY_STATUS),
+        "gateway_response": column(payment_logs, LOG_GATEWAY_RESPONSE),
+        "gateway_currency": column(payment_logs, LOG_GATEWAY_CURRENCY),
+        "gateway_amount_cents": to_cents([payment_log[LOG_GATEWAY_AMOUNT] for payment_log in payment_logs]),
+        "timestamp": pd.to_datetime(pd.Series(column(payment_logs, LOG_TIMESTAMP))),
+    })
+
+
+def newest_logs(transaction_ids: np.ndarray, payment_logs: pd.DataFrame):
+    """
+    Join transactions to their payment logs: for every transaction, the row of
+    its newest log in `payment_logs` (-1 if none) and its number of logs.
+    Timestamp ties and NULL timestamps resolve like ORDER BY timestamp DESC
+    over rows in input order.
+    """
+    log_codes, log_ids = pd.factorize(payment_logs["transaction_id"].to_numpy())
+    if not len(log_ids):
+        return np.full(len(transaction_ids), -1, dtype=np.int64), np.zeros(len(transaction_ids), dtype=np.int64)
+
+    timestamps = payment_logs["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    missing = payment_logs["timestamp"].isna().to_numpy()
+    # Descending timestamps with NULLs last (MySQL sorts NULL lowest)
+    sort_key = np.where(missing, np.iinfo(np.int64).max, -np.where(missing, 0, timestamps))
+    order = np.lexsort((sort_key, log_codes))  # Stable, so ties keep input order
+
+    sorted_codes = log_codes[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sorted_codes[1:] != sorted_codes[:-1]
+    newest_by_code = np.full(len(log_ids), -1, dtype=np.int64)
+    newest_by_code[sorted_codes[first]] = order[first]
+    counts_by_code = np.bincount(log_codes, minlength=len(log_ids))
+
+    # Transactions without logs get code -1, which picks the padding slot
+    codes = pd.Index(log_ids).get_indexer(transaction_ids)
+    return take(newest_by_code, codes, -1), take(counts_by_code, codes, 0)
+
+
+def take(values: np.ndarray, positions: np.ndarray, missing=None) -> np.ndarray:
+    """values[positions], with `missing` wherever the position is -1."""
+    padded = np.empty(len(values) + 1, dtype=values.dtype)
+    padded[:-1] = values
+    padded[-1] = missing
+    return padded[positions]
+
+
+def tolerance_units(amount_units: np.ndarray, units: np.ndarray, matcher: Matcher) -> np.ndarray:
+    """Matcher.tolerance_units() for every amount (the epsilon absorbs float error before truncating)."""
+    relative = np.abs(np.nan_to_num(amount_units)) * float(matcher.tolerance_ratio)
+    return np.floor(np.maximum(float(matcher.tolerance) * units, relative) * (1 + 1e-12) + 1e-9)
+
+
+def classify_frame(
+    transactions: pd.DataFrame, payment_logs: pd.DataFrame, matcher: Matcher = EXACT_MATCHER,
+    converted_gateway: Tuple[np.ndarray, np.ndarray] = None
+) -> pd.DataFrame:
+    """
+    classify_transaction() over whole frames. Each transaction is joined to
+    its newest payment log and log count, and every rule is evaluated as an
+    array operation on amounts in the transaction currency's minor unit.
+    `converted_gateway`, when given, is each transaction's newest gateway
+    amount converted into its currency (see converted_gateway_of());
+    otherwise gateway amounts are compared unconverted, as they are without
+    fx rates.
+
+    Returns one row per transaction, in input order, with discrepancy_category,
+    is_discrepancy, gateway_status, discrepancy_amount, resolution_status,
+    reconciled (whether reconciled_balance is the gateway amount) and
+    log_position (the newest log's row in `payment_logs`, -1 if none).
+    """
+    newest, log_count = newest_logs(transactions["transaction_id"].to_numpy(), payment_logs)
+    has_log = log_count > 0
+
+    status = transactions["status"].to_numpy()
+    currency = transactions["currency"].to_numpy()
+    units = minor_units_of(currency)
+    amount_units = cents_to_units(transactions["amount_cents"].to_numpy(), units)
+    gateway_status = take(payment_logs["gateway_status"].to_numpy(), newest)
+    gateway_response = take(payment_logs["gateway_response"].to_numpy(), newest)
+    gateway_currency = take(payment_logs["gateway_currency"].to_numpy(), newest)
+    if converted_gateway is None:
+        gateway_units = cents_to_units(take(payment_logs["gateway_amount_cents"].to_numpy(), newest, np.nan), units)
+        gateway_fraction = np.zeros(len(gateway_units))
+    else:
+        gateway_units, gateway_fraction = converted_gateway
+    has_gateway_amount = has_log & ~np.isnan(gateway_units)
+    converted = has_log & (gateway_currency != currency).astype(bool)
+
+    difference = np.abs(np.where(has_gateway_amount, (amount_units - gateway_units) - gateway_fraction, 0))
+    # Converted amounts aren't whole minor units; differences are compared once rounded, as Matcher does
+    difference_units = np.rint(difference)
+    if matcher.exact:
+        within = np.where(converted, difference_units == 0, difference == 0)
+    else:
+        within = difference_units <= tolerance_units(amount_units, units, matcher)
+    amount_mismatch = has_log & ~(has_gateway_amount & within)
+    # Object arrays compare element by element with Python's `!=`, as the row path does
+    status_mismatch = has_log & ~amount_mismatch & (status != gateway_response).astype(bool)
+
+    category = np.select(
+        [log_count > 1, ~has_log, amount_mismatch, status_mismatch],
+        ["Duplicate Payment", "Missing Payments", "Amount Mismatch", "Status Mismatch"],
+        default=None,
+    ).astype(object)
+
+    discrepancy_amount = np.where(
+        has_gateway_amount, np.where(converted, difference_units, difference) / units, NO_GATEWAY_AMOUNT
+    )
+
+    both_success = (gateway_status == "Success").astype(bool) & (status == "Success").astype(bool)
+    resolution_status = np.where(
+        both_success, np.where(discrepancy_amount == 0, "No Discrepancy", "Resolved"), "Unresolved"
+    ).astype(object)
+
+    return pd.DataFrame({
+        "transaction_id": transactions["transaction_id"].to_numpy(),
+        "discrepancy_category": category,
+        "is_discrepancy": pd.notna(category),
+        "gateway_status": gateway_status,
+        "discrepancy_amount": discrepancy_amount,
+        "resolution_status": resolution_status,
+        "reconciled": has_gateway_amount & (resolution_status == "Resolved"),
+        "log_position": newest,
+    })
+
+
+def converted_gateway_of(transactions: Sequence[tuple], logs_by_transaction: Dict[str, List[tuple]], matcher: Matcher):
+    """
+    Per transaction, its newest log's gateway amount converted into its
+    currency, in minor units: the whole units (NaN without an amount) and
+    the fraction below them. The conversion is done in Decimal, row by row,
+    and the fraction kept apart, because float rates and large unit counts
+    can't hold the residue exactly enough to round half-unit ties to even
+    the way amounts_match() does.
+    """
+    whole = np.full(len(transactions), np.nan)
+    fraction = np.zeros(len(transactions))
+    for position, transaction in enumerate(transactions):
+        payment_logs = logs_by_transaction[transaction[TX_ID]]
+        if payment_logs:
+            # Logs arrive newest first, like classify_transaction() reads them
+            gateway_amount = gateway_amount_of(transaction, payment_logs[0], matcher)
+            if gateway_amount is not None:
+                units = Decimal(str(gateway_amount)) * minor_units(transaction[TX_CURRENCY])
+                whole_units = units.to_integral_value(rounding=ROUND_FLOOR)
+                whole[position], fraction[position] = float(whole_units), float(units - whole_units)
+    return whole, fraction
+
+
+def classify_chunk(
+    transactions: Sequence[tuple], logs_by_transaction: Dict[str, List[tuple]], matcher: Matcher = EXACT_MATCHER
+) -> List[dict]:
+    """
+    Vectorized equivalent of calling classify_transaction() on every
+    transaction of a chunk; returns the same result dicts. discrepancy_amount
+    is the exact difference in minor units (the row-by-row float subtraction
+    can be off in the last bits, which the DECIMAL column rounds away).
+    """
+    payment_logs = [payment_log for transaction in transactions for payment_log in logs_by_transaction[transaction[TX_ID]]]
+    # Conversion goes row by row, so only when there are rates to apply
+    converted_gateway = converted_gateway_of(transactions, logs_by_transaction, matcher) if matcher.fx else None
+    classified = classify_frame(
+        transactions_frame(transactions), payment_logs_frame(payment_logs), matcher, converted_gateway
+    )
+
+    results = []
+    for transaction, category, is_discrepancy, gateway_status, discrepancy_amount, resolution_status, reconciled, position in zip(
+        transactions, classified["discrepancy_category"].tolist(), classified["is_discrepancy"].tolist(),
+        classified["gateway_status"].tolist(), classified["discrepancy_amount"].tolist(),
+        classified["resolution_status"].tolist(), classified["reconciled"].tolist(), classified["log_position"].tolist(),
+    ):
+        payment_log = payment_logs[position] if position >= 0 else None
+        results.append({
+            "transaction_id": transaction[TX_ID],
+            "is_discrepancy": is_discrepancy,
+            "discrepancy_category": category,
+            "payment_log": payment_log,
+            "gateway_status": gateway_status,
+            "discrepancy_amount": discrepancy_amount,
+            "resolution_status": resolution_status,
+            "reconciled_balance": gateway_amount_of(transaction, payment_log, matcher) if reconciled else None,
+        })
+    return results
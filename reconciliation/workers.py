@@ -0,0 +1,79 @@
+"""
+Sharded reconciliation workers for large backfills (e.g. month end).
+
+    python -m reconciliation.workers --processes 4
+
+Each process runs its own event loop, pool and analysis pipeline and scans
+whichever SCAN_SHARDS shards it can lease, so workers on any number of
+hosts (and the API's own scheduler) can run side by side without scanning
+the same transactions.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AsyncExitStack
+
+from dotenv import load_dotenv
+
+from analysis.cache import AnalysisCache
+from analysis.pipeline import AnalysisPipeline
+from db_connection.pool import acquire, close_pool, init_pool
+from migrations import run_migrations
+from reconciliation.engine import SCAN_MODE, reconcile_shards
+from reconciliation.shards import SCAN_SHARDS, lease_owner
+
+
+async def run_worker(shard_count: int = SCAN_SHARDS) -> int:
+    """Scan leasable shards until a full pass finds nothing left; returns transactions reconciled."""
+    await init_pool()
+    pipeline = AnalysisPipeline(cache=AnalysisCache())
+    owner = lease_owner()
+    processed = 0
+    try:
+        await run_migrations()
+        await pipeline.start()
+
+        while True:
+            async with AsyncExitStack() as stack:
+                connection = await stack.enter_async_context(acquire())
+                stream_connection = await stack.enter_async_context(acquire()) if SCAN_MODE == "stream" else None
+                reconciled = await reconcile_shards(
+                    connection, pipeline.submit, owner, shard_count, stream_connection=stream_connection
+                )
+            processed += reconciled
+            if not reconciled:
+                break
+
+        await pipeline.join()
+    finally:
+        await pipeline.stop()
+        await close_pool()
+    print(f"Worker {owner} reconciled {processed} transactions")
+    return processed
+
+
+def worker_process(shard_count: int) -> int:
+    load_dotenv()
+    return asyncio.run(run_worker(shard_count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--shards", type=int, default=SCAN_SHARDS,
+                        help="Must match SCAN_SHARDS of every other scanner on the database")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    # spawn: every worker gets a fresh interpreter, event loop and pool
+    with ProcessPoolExecutor(args.processes, mp_context=multiprocessing.get_context("spawn")) as executor:
+        totals = list(executor.map(worker_process, [args.shards] * args.processes))
+    elapsed = time.perf_counter() - started
+    print(f"Reconciled {sum(totals)} transactions with {args.processes} workers in {elapsed:.1f}s "
+          f"({sum(totals) / max(elapsed, 1e-9):,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, List, Optional
+
+from reconciliation.stats import invalidate_dashboard_stats
+
+WRITER_BATCH_SIZE = int(os.getenv("WRITER_BATCH_SIZE", "1000"))
+WRITER_FLUSH_SECONDS = float(os.getenv("WRITER_FLUSH_SECONDS", "5"))
+
+# reconciliation_id is derived from transaction_id, so writing the same
+# transaction twice (a retried batch, a re-reconciliation) updates one row
+RECONCILIATION_NAMESPACE = uuid.UUID("6f1c2f5e-3b0a-4e4c-9a59-0d6f6c1e2a77")
+
+# root_cause is assigned first so it still sees the stored category: an
+# existing analysis survives a rewrite unless the category changed.
+UPSERT_RECONCILIATION_RECORD = """
+    INSERT INTO reconciliation_records (
+        reconciliation_id, transaction_id, discrepancy_category, transaction_date,
+        payment_reference, amount, status, gateway_status, discrepancy_amount,
+        root_cause, assigned_to, resolution_status, balance, reconciled_balance
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        root_cause = IF(discrepancy_category <=> VALUES(discrepancy_category), root_cause, VALUES(root_cause)),
+        discrepancy_category = VALUES(discrepancy_category),
+        transaction_date = VALUES(transaction_date),
+        payment_reference = VALUES(payment_reference),
+        amount = VALUES(amount),
+        status = VALUES(status),
+        gateway_status = VALUES(gateway_status),
+        discrepancy_amount = VALUES(discrepancy_amount),
+        resolution_status = VALUES(resolution_status),
+        balance = VALUES(balance),
+        reconciled_balance = VALUES(reconciled_balance)
+"""
+
+
+def reconciliation_id_for(transaction_id: str) -> str:
+    return str(uuid.uuid5(RECONCILIATION_NAMESPACE, transaction_id))
+
+
+class ReconciliationWriter:
+    """
+    Buffers reconciliation_records rows and upserts them with one multi-row
+    INSERT per flush.
+
+    A flush happens when `batch_size` rows are buffered, when `flush_interval`
+    seconds have passed since the last one, or on an explicit flush(). Each
+    flush is one transaction that also runs every `in_transaction(cursor)`
+    hook (e.g. derived aggregates) and the pending `checkpoint(cursor)` (e.g.
+    advancing the scan watermark). Once committed, the cached dashboard
+    stats are invalidated and `on_flush(rows)` is awaited with the rows.
+    """
+
+    def __init__(
+        self,
+        connection,
+        batch_size: int = WRITER_BATCH_SIZE,
+        flush_interval: float = WRITER_FLUSH_SECONDS,
+        on_flush: Optional[Callable[[List[tuple]], Awaitable[None]]] = None
+    ):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.checkpoint: Optional[Callable[[object], Awaitable[None]]] = None
+        self.in_transaction: List[Callable[[object], Awaitable[None]]] = []
+        self.rows: List[tuple] = []
+        self.last_flush = time.monotonic()
+        self.stats = {"rows": 0, "flushes": 0, "seconds": 0.0}
+
+    async def add(self, row: tuple):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size or self.flush_due():
+            await self.flush()
+
+    def flush_due(self) -> bool:
+        return time.monotonic() - self.last_flush >= self.flush_interval
+
+    async def flush(self):
+        if not self.rows and self.checkpoint is None:
+            return
+
+        rows, checkpoint = self.rows, self.checkpoint
+        started = time.perf_counter()
+        async with self.connection.cursor() as cursor:
+            try:
+                await self.connection.begin()
+                if rows:
+                    await cursor.executemany(UPSERT_RECONCILIATION_RECORD, rows)
+                for hook in self.in_transaction:
+                    await hook(cursor)
+                if checkpoint:
+                    await checkpoint(cursor)
+                await self.connection.commit()
+            except Exception:
+                await self.connection.rollback()
+                raise
+
+        elapsed = time.perf_counter() - started
+        self.rows, self.checkpoint = [], None
+        if rows:
+            invalidate_dashboard_stats()
+        self.last_flush = time.monotonic()
+        self.stats["rows"] += len(rows)
+        self.stats["flushes"] += 1
+        self.stats["seconds"] += elapsed
+        if rows:
+            print(f"Wrote {len(rows)} reconciliation records in {elapsed:.3f}s ({len(rows) / max(elapsed, 1e-9):,.0f} rows/s)")
+
+        if self.on_flush and rows:
+            await self.on_flush(rows)
+
+    def metrics(self) -> dict:
+        seconds = self.stats["seconds"]
+        return {
+            **self.stats,
+            "rows_per_second": round(self.stats["rows"] / seconds, 1) if seconds else 0.0,
+        }
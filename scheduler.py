@@ -0,0 +1,217 @@
+"""
+Background jobs with single-flight runs across processes and a run history.
+
+Each run of a job holds a MySQL advisory lock (GET_LOCK) named after the
+job on a pooled connection, so however many API instances and workers
+share the database, at most one runs a given job at a time; the others
+record the run as skipped. The lock is tied to the connection's session
+and goes away with it if the process dies mid-run.
+
+Runs are recorded in job_runs (duration, rows processed, outcome). The
+next run is scheduled `interval` seconds after the previous one finished,
+so a run that overruns its interval delays the next one instead of piling
+up behind it. Adaptive jobs halve their interval (down to min_interval)
+after a run that found work and double it (up to max_interval) after one
+that found none.
+"""
+import asyncio
+import os
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import aiomysql
+
+from db_connection.pool import acquire
+from reconciliation.shards import lease_owner
+
+JOB_RUNS_RETENTION_DAYS = int(os.getenv("JOB_RUNS_RETENTION_DAYS", "30"))
+
+JOB_LOCK_PREFIX = "reconx_job:"
+
+
+async def create_job_runs_table(cursor):
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_runs (
+            run_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            job_name VARCHAR(64) NOT NULL,
+            owner VARCHAR(128) NOT NULL,
+            triggered_by VARCHAR(16) NOT NULL,
+            status VARCHAR(16) NOT NULL,
+            started_at DATETIME(6) NOT NULL,
+            finished_at DATETIME(6),
+            duration_ms INT,
+            rows_processed BIGINT,
+            error TEXT,
+            INDEX idx_job_runs_job_started (job_name, started_at)
+        )
+    """)
+
+
+@dataclass
+class Job:
+    """
+    A periodic job. `run()` does one run and returns the rows (items of
+    work) it processed; `backlog()`, when given, reports the work still
+    waiting after a run and drives the adaptive interval instead.
+    """
+    name: str
+    run: Callable[[], Awaitable[int]]
+    interval: float
+    min_interval: Optional[float] = None
+    max_interval: Optional[float] = None
+    backlog: Optional[Callable[[], Awaitable[int]]] = None
+    # Runtime state
+    current_interval: float = field(init=False)
+    next_run_at: Optional[float] = field(default=None, init=False)
+    running: bool = field(default=False, init=False)
+    wake: asyncio.Event = field(default_factory=asyncio.Event, init=False)
+    stats: dict = field(init=False)
+
+    def __post_init__(self):
+        self.min_interval = self.min_interval if self.min_interval is not None else self.interval
+        self.max_interval = self.max_interval if self.max_interval is not None else self.interval
+        self.current_interval = self.interval
+        self.stats = {
+            "runs": 0, "succeeded": 0, "failed": 0, "skipped": 0, "overran": 0,
+            "rows_processed": 0, "last_status": None, "last_duration_ms": None, "last_rows": None,
+        }
+
+    def adapt(self, backlog: int):
+        if backlog > 0:
+            self.current_interval = max(self.min_interval, self.current_interval / 2)
+        else:
+            self.current_interval = min(self.max_interval, self.current_interval * 2)
+
+
+class Scheduler:
+    """Runs registered Jobs on their schedules in the application's event loop."""
+
+    def __init__(self, owner: Optional[str] = None):
+        self.owner = owner or lease_owner()
+        self.jobs: Dict[str, Job] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def add(self, job: Job) -> Job:
+        if len(JOB_LOCK_PREFIX + job.name) > 64:
+            raise ValueError(f"Job name {job.name} is too long for a MySQL lock name")
+        self.jobs[job.name] = job
+        return job
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._loop(job)) for job in self.jobs.values()]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def trigger(self, name: str) -> bool:
+        """Run `name` now instead of at its next scheduled time; False if it is already running here."""
+        job = self.jobs[name]
+        if job.running:
+            return False
+        job.wake.set()
+        return True
+
+    async def _loop(self, job: Job):
+        triggered_by = "schedule"
+        while True:
+            job.wake.clear()
+            try:
+                await self.run_once(job, triggered_by)
+            except Exception as e:  # e.g. the database is unreachable; try again next time
+                print(f"Job {job.name} could not run: {e}")
+            job.next_run_at = time.time() + job.current_interval
+            try:
+                await asyncio.wait_for(job.wake.wait(), timeout=job.current_interval)
+                triggered_by = "manual"
+            except asyncio.TimeoutError:
+                triggered_by = "schedule"
+
+    async def run_once(self, job: Job, triggered_by: str = "manual") -> Optional[int]:
+        """One single-flight run of `job`; returns its rows, or None when skipped or failed."""
+        lock = JOB_LOCK_PREFIX + job.name
+        async with acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SELECT GET_LOCK(%s, 0)", (lock,))
+                if not (await cursor.fetchone())[0]:
+                    job.stats["skipped"] += 1
+                    job.stats["last_status"] = "skipped"
+                    print(f"Job {job.name}: skipped, another process is running it")
+                    return None
+
+                job.running = True
+                started = time.perf_counter()
+                try:
+                    await cursor.execute("""
+                        INSERT INTO job_runs (job_name, owner, triggered_by, status, started_at)
+                        VALUES (%s, %s, %s, 'running', NOW(6))
+                    """, (job.name, self.owner, triggered_by))
+                    run_id = cursor.lastrowid
+
+                    rows, status, error = None, "succeeded", None
+                    try:
+                        rows = await job.run()
+                    except Exception as e:
+                        status, error = "failed", f"{e}\n{traceback.format_exc()}"
+                        print(f"Job {job.name} failed: {e}")
+                    duration_ms = int((time.perf_counter() - started) * 1000)
+
+                    await cursor.execute("""
+                        UPDATE job_runs
+                        SET status = %s, finished_at = NOW(6), duration_ms = %s, rows_processed = %s, error = %s
+                        WHERE run_id = %s
+                    """, (status, duration_ms, rows, error, run_id))
+                    await cursor.execute("""
+                        DELETE FROM job_runs WHERE job_name = %s AND started_at < NOW() - INTERVAL %s DAY
+                    """, (job.name, JOB_RUNS_RETENTION_DAYS))
+                finally:
+                    job.running = False
+                    await cursor.execute("SELECT RELEASE_LOCK(%s)", (lock,))
+                    await cursor.fetchone()
+
+        self._record(job, status, duration_ms, rows)
+        if status == "succeeded" and job.min_interval < job.max_interval:
+            job.adapt(await job.backlog() if job.backlog else rows or 0)
+        return rows
+
+    def _record(self, job: Job, status: str, duration_ms: int, rows: Optional[int]):
+        job.stats["runs"] += 1
+        job.stats[status] += 1
+        job.stats["rows_processed"] += rows or 0
+        job.stats["last_status"] = status
+        job.stats["last_duration_ms"] = duration_ms
+        job.stats["last_rows"] = rows
+        if duration_ms > job.current_interval * 1000:
+            job.stats["overran"] += 1
+            print(f"Job {job.name} took {duration_ms / 1000:.1f}s, longer than its {job.current_interval:.0f}s interval")
+
+    def metrics(self) -> dict:
+        return {name: self.job_state(job) for name, job in self.jobs.items()}
+
+    @staticmethod
+    def job_state(job: Job) -> dict:
+        return {
+            "running": job.running,
+            "interval_seconds": job.current_interval,
+            "min_interval_seconds": job.min_interval,
+            "max_interval_seconds": job.max_interval,
+            "next_run_in_seconds": round(max(0.0, job.next_run_at - time.time()), 1) if job.next_run_at else None,
+            **job.stats,
+        }
+
+
+async def recent_runs(job_name: str, limit: int = 20) -> List[dict]:
+    """Newest job_runs rows of `job_name`."""
+    async with acquire() as connection:
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute("""
+                SELECT run_id, job_name, owner, triggered_by, status, started_at, finished_at,
+                       duration_ms, rows_processed, error
+                FROM job_runs WHERE job_name = %s
+                ORDER BY started_at DESC LIMIT %s
+            """, (job_name, limit))
+            return list(await cursor.fetchall())
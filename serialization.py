@@ -0,0 +1,35 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+# datetimes, dates, UUIDs, dataclasses and NumPy values are serialized
+# natively by orjson; only Decimal (DECIMAL columns) needs the fallback
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def default(obj: Any):
+    # Same output as FastAPI's jsonable_encoder: whole numbers as ints, the rest as floats
+    if isinstance(obj, Decimal):
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any, sort_keys: bool = False) -> bytes:
+    return orjson.dumps(obj, default=default, option=OPTIONS | orjson.OPT_SORT_KEYS if sort_keys else OPTIONS)
+
+
+def dumps_text(obj: Any, sort_keys: bool = False) -> str:
+    return dumps(obj, sort_keys).decode("utf-8")
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered by orjson. Return it directly from an endpoint
+    to skip FastAPI's jsonable_encoder pass over the content, which walks
+    every value in Python before json.dumps walks them again.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
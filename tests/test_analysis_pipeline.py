@@ -0,0 +1,227 @@
+"""
+AnalysisPipeline against a fake Together/Serper server.
+
+The Together SDK talks to its API over aiohttp, so instead of patching a
+transport the pipeline is pointed (TOGETHER_BASE_URL / SERPER_URL style)
+at an aiohttp server running in the test's event loop, which can stall
+or fail chosen requests.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from aiohttp import web
+
+from analysis import pipeline as pipeline_module
+from analysis.pipeline import AnalysisConfig, AnalysisPipeline
+
+TRANSACTION = (
+    "tx-1", "user-1", "account-1", "FPX", "Payment", Decimal("120.00"), "MYR", "Success",
+    datetime(2025, 1, 1), "ref-1", Decimal("0.00"), Decimal("120.00"), "",
+)
+PAYMENT_LOG = ("log-1", "tx-1", "Gateway", "gw-1", "Failed", Decimal("120.00"), "MYR", "Failed", datetime(2025, 1, 1))
+ANALYSIS = "The root cause of the discrepancy is likely a gateway decline.\n\nRetry the capture."
+
+
+@pytest.fixture(autouse=True)
+def offline_token_counts(monkeypatch):
+    # tiktoken downloads its encodings on first use; token accounting isn't under test here
+    monkeypatch.setattr(pipeline_module, "count_tokens", lambda text, model=None: len(text.split()))
+    monkeypatch.setattr(pipeline_module, "count_constant_tokens", lambda text, model=None: len(text.split()))
+    monkeypatch.setenv("TOGETHER_API_KEY", "test-key")
+
+
+class FakeServer:
+    """Serves /v1/chat/completions and /search; `stall` and `fail` apply to the next completions."""
+
+    def __init__(self):
+        self.completions = 0
+        self.searches = 0
+        self.stall = 0
+        self.fail = 0
+        self.delay = 0.0
+
+    async def chat_completions(self, request):
+        self.completions += 1
+        if self.stall:
+            self.stall -= 1
+            await asyncio.sleep(1.5)
+        if self.fail:
+            self.fail -= 1
+            return web.json_response({"error": {"message": "overloaded"}}, status=503)
+        await asyncio.sleep(self.delay)
+        body = await request.json()
+        return web.json_response({
+            "id": "cmpl-1", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": ANALYSIS}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+    async def search(self, request):
+        self.searches += 1
+        return web.json_response({"organic": [{"snippet": "Gateway declines spiked"}]})
+
+
+class MemoryCache:
+    def __init__(self):
+        self.entries = {}
+
+    async def get(self, fingerprint):
+        return self.entries.get(fingerprint)
+
+    async def set(self, fingerprint, result):
+        self.entries[fingerprint] = result
+
+    def metrics(self):
+        return {"entries": len(self.entries)}
+
+
+@asynccontextmanager
+async def running_pipeline(server: FakeServer, cache=None, **config):
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", server.chat_completions)
+    app.router.add_get("/search", server.search)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    pipeline = AnalysisPipeline(AnalysisConfig(
+        concurrency=1, timeout=config.pop("timeout", 2.0), backoff_base=0.01,
+        together_base_url=f"http://127.0.0.1:{port}/v1", serper_url=f"http://127.0.0.1:{port}/search", **config
+    ), cache=cache)
+    await pipeline.start()
+    try:
+        yield pipeline
+    finally:
+        await pipeline.stop()
+        await runner.cleanup()
+
+
+def test_analysis_parses_the_completion():
+    server = FakeServer()
+
+    async def scenario():
+        async with running_pipeline(server) as pipeline:
+            return await pipeline.analyze(TRANSACTION, PAYMENT_LOG)
+
+    result = asyncio.run(scenario())
+    assert result == {
+        "analysis": "The root cause of the discrepancy is likely a gateway decline.",
+        "recommendation": "Retry the capture.",
+    }
+    assert (server.searches, server.completions) == (1, 1)
+
+
+def test_a_stalled_call_times_out_and_is_retried():
+    server = FakeServer()
+    server.stall = 1
+
+    async def scenario():
+        async with running_pipeline(server, timeout=0.5) as pipeline:
+            result = await pipeline.analyze(TRANSACTION, PAYMENT_LOG)
+            return result, pipeline.stats["retries"]
+
+    result, retries = asyncio.run(scenario())
+    assert result["analysis"].startswith("The root cause")
+    assert server.completions == 2
+    assert retries == 1
+
+
+def test_server_errors_are_retried_up_to_max_retries():
+    server = FakeServer()
+    server.fail = 2
+
+    async def recovers():
+        async with running_pipeline(server, max_retries=2) as pipeline:
+            return await pipeline.analyze(TRANSACTION, PAYMENT_LOG)
+
+    assert asyncio.run(recovers())["analysis"].startswith("The root cause")
+    assert server.completions == 3
+
+    server = FakeServer()
+    server.fail = 3
+
+    async def gives_up():
+        async with running_pipeline(server, max_retries=2) as pipeline:
+            try:
+                await pipeline.analyze(TRANSACTION, PAYMENT_LOG)
+            except Exception:
+                return True
+            return False
+
+    assert asyncio.run(gives_up())
+    assert server.completions == 3
+
+
+def test_concurrent_identical_analyses_share_one_call():
+    server = FakeServer()
+    server.delay = 0.2
+    cache = MemoryCache()
+    # Same status, amount bucket, currency and gateway status: the same fingerprint
+    other = ("tx-2",) + TRANSACTION[1:5] + (Decimal("150.00"),) + TRANSACTION[6:]
+
+    async def scenario():
+        async with running_pipeline(server, cache=cache) as pipeline:
+            first = await asyncio.gather(*(
+                pipeline.analyze(transaction, PAYMENT_LOG) for transaction in (TRANSACTION, other, TRANSACTION)
+            ))
+            again = await pipeline.analyze(other, PAYMENT_LOG)
+            return first, again
+
+    first, again = asyncio.run(scenario())
+    assert first[0] == first[1] == first[2] == again
+    assert (server.searches, server.completions) == (1, 1)
+    assert len(cache.entries) == 1
+
+
+class PendingRecords:
+    """A fake pool connection serving `pending` reconciliation ids to requeue_pending()."""
+
+    def __init__(self, pending):
+        self.pending = sorted(pending)
+        self.pages = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    def cursor(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params):
+        if "FROM payment_logs" in query:
+            self.rows = []
+            return
+        _, after, limit = params
+        self.pages.append(after)
+        self.rows = [(reconciliation_id,) + TRANSACTION for reconciliation_id in self.pending if reconciliation_id > after][:limit]
+
+    async def fetchall(self):
+        return self.rows
+
+
+def test_requeue_pages_through_every_pending_record(monkeypatch):
+    records = PendingRecords([f"rec-{index:04d}" for index in range(2500)])
+    monkeypatch.setattr(pipeline_module, "acquire", records.acquire)
+
+    async def scenario():
+        pipeline = AnalysisPipeline(AnalysisConfig(queue_size=5000, requeue_batch_size=1000))
+        pipeline.queue = asyncio.Queue(maxsize=pipeline.config.queue_size)
+        await pipeline.submit("rec-0007", TRANSACTION, None)  # Already queued: not queued twice
+        requeued = await pipeline.requeue_pending()
+        return requeued, pipeline.queue.qsize()
+
+    requeued, queued = asyncio.run(scenario())
+    assert requeued == 2499
+    assert queued == 2500
+    assert records.pages == ["", "rec-0999", "rec-1999"]
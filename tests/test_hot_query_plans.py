@@ -0,0 +1,53 @@
+"""
+EXPLAIN every statement in migrations.HOT_QUERIES against the MySQL
+configured by DB_HOST/DB_USER/... (as in .env), after applying the
+migrations, and check each reads its table through the expected index
+rather than a full scan. Skipped when no MySQL is configured or reachable.
+
+Run it against a database holding realistic data (generate_data.py and the
+gateway generators): on near-empty tables the optimizer may rightly prefer
+a full scan.
+"""
+import asyncio
+import os
+
+import pymysql
+import pytest
+from dotenv import load_dotenv
+
+from db_connection.pool import close_pool, init_pool
+from migrations import HOT_QUERIES, explain_hot_queries, run_migrations
+
+NO_SUCH_TABLE = 1146
+
+
+async def migrate_and_explain():
+    await init_pool()
+    try:
+        await run_migrations()
+        return await explain_hot_queries()
+    finally:
+        await close_pool()
+
+
+@pytest.fixture(scope="module")
+def plans():
+    load_dotenv()
+    if not os.getenv("DB_HOST"):
+        pytest.skip("DB_HOST is not set; no MySQL to EXPLAIN against")
+    try:
+        report = asyncio.run(migrate_and_explain())
+    except pymysql.err.ProgrammingError as error:
+        if error.args[0] != NO_SUCH_TABLE:
+            raise
+        pytest.skip(f"Sample data isn't loaded: {error.args[1]}")
+    except (pymysql.err.OperationalError, OSError) as error:
+        pytest.skip(f"MySQL at {os.getenv('DB_HOST')} is unreachable: {error}")
+    return {row["query"]: row for row in report}
+
+
+@pytest.mark.parametrize("name", [name for name, *_ in HOT_QUERIES])
+def test_hot_query_uses_its_index(plans, name):
+    plan = plans[name]
+    assert plan["used"] == plan["expected"], f"{name}: {plan['table']} read via {plan['used']}, expected {plan['expected']}"
+    assert plan["type"] != "ALL", f"{name}: full scan of {plan['table']}"
@@ -0,0 +1,127 @@
+"""
+reconcile_unscanned() against an in-memory stand-in for the MySQL tables it
+reads and writes: transactions inserted after a scan with a
+transaction_date older than the watermark must still be reconciled.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from reconciliation.engine import TX_DATE, TX_ID, reconcile_unscanned
+from reconciliation.scan_state import SCANNER_NAME
+
+
+def transaction(transaction_id: str, date: datetime) -> tuple:
+    return (
+        transaction_id, "user-1", "account-1", "FPX", "Payment", Decimal("10.00"), "MYR", "Success",
+        date, f"ref-{transaction_id}", Decimal("0.00"), Decimal("10.00"), "",
+    )
+
+
+class Database:
+    def __init__(self, transactions):
+        self.transactions = list(transactions)
+        self.records = {}
+        self.scan_state = {}
+
+    def cursor(self):
+        return Cursor(self)
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class Cursor:
+    def __init__(self, database: Database):
+        self.database = database
+        self.rows = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=()):
+        query = " ".join(query.split())
+        if "FROM scan_state" in query:
+            self.rows = [self.database.scan_state[params[0]]] if params[0] in self.database.scan_state else []
+        elif query.startswith("INSERT INTO scan_state"):
+            self.database.scan_state[params[0]] = (params[1], params[2])
+        elif "FROM transactions" in query:
+            self.rows = self.unscanned(list(params))
+        else:  # fx_rates, payment_logs: none in these tests
+            self.rows = []
+
+    def unscanned(self, params):
+        limit = params.pop()
+        rows = sorted(
+            (row for row in self.database.transactions if row[TX_ID] not in self.database.records),
+            key=lambda row: (row[TX_DATE] is not None, row[TX_DATE] or datetime.min, row[TX_ID])
+        )
+        if params:
+            after_date, _, after_id = params
+            rows = [row for row in rows if row[TX_DATE] is None or (row[TX_DATE], row[TX_ID]) > (after_date, after_id)]
+        return rows[:limit]
+
+    async def executemany(self, query, rows):
+        if "INTO reconciliation_records" in query:
+            for row in rows:
+                self.database.records[row[1]] = row
+
+    async def fetchall(self):
+        return self.rows
+
+    async def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+async def ignore_analysis(reconciliation_id, transaction, payment_log):
+    pass
+
+
+def test_back_dated_transaction_is_reconciled_by_a_full_scan():
+    start = datetime(2025, 3, 1)
+    database = Database(transaction(f"tx-{index:03d}", start + timedelta(hours=index)) for index in range(50))
+
+    assert asyncio.run(reconcile_unscanned(database, ignore_analysis, batch_size=20)) == 50
+    assert database.scan_state[SCANNER_NAME] == (start + timedelta(hours=49), "tx-049")
+
+    # Loaded after the scan, dated days before its watermark (as generate_data.py does)
+    database.transactions.append(transaction("tx-late", start + timedelta(days=1)))
+
+    # A watermarked run only looks back SCAN_LOOKBACK_MINUTES
+    assert asyncio.run(reconcile_unscanned(database, ignore_analysis, batch_size=20)) == 0
+    assert "tx-late" not in database.records
+
+    assert asyncio.run(reconcile_unscanned(database, ignore_analysis, batch_size=20, full_scan=True)) == 1
+    assert "tx-late" in database.records
+    # The full scan never moves the watermark back
+    assert database.scan_state[SCANNER_NAME] == (start + timedelta(hours=49), "tx-049")
+
+
+def test_sweep_scans_the_whole_table_first_and_then_periodically(monkeypatch):
+    monkeypatch.setenv("TOGETHER_API_KEY", "test-key")
+    import main
+
+    scans = []
+
+    async def check_and_update_discrepancies(full_scan=False):
+        scans.append(full_scan)
+        return 0
+
+    monkeypatch.setattr(main, "check_and_update_discrepancies", check_and_update_discrepancies)
+    monkeypatch.setattr(main.change_tailer, "enabled", True)  # No outbox to discard
+    monkeypatch.setattr(main, "last_full_sweep", {"at": None})
+
+    asyncio.run(main.reconciliation_sweep())
+    asyncio.run(main.reconciliation_sweep())
+    main.last_full_sweep["at"] -= main.RECONCILE_FULL_SWEEP_SECONDS
+    asyncio.run(main.reconciliation_sweep())
+    assert scans == [True, False, True]
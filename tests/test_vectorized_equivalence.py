@@ -0,0 +1,62 @@
+"""
+vectorized.classify_chunk() against classify_transaction() on the
+benchmark's synthetic chunks: MYR and BTC transactions, some settled in
+USD, with and without fx rates and tolerances.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from benchmarks.reconcile_core import benchmark_matcher, check_equivalence, synthetic_chunk
+from reconciliation.engine import TX_ID, classify_transaction
+from reconciliation.vectorized import classify_chunk
+
+
+def classify_both(transactions, logs_by_transaction, matcher):
+    expected = [classify_transaction(transaction, logs_by_transaction[transaction[TX_ID]], matcher) for transaction in transactions]
+    return expected, classify_chunk(transactions, logs_by_transaction, matcher)
+
+
+@pytest.mark.parametrize("fx, tolerance, tolerance_ratio", [
+    (False, Decimal(0), Decimal(0)),
+    (True, Decimal(0), Decimal(0)),
+    (False, Decimal("0.05"), Decimal(0)),
+    (True, Decimal("0.03"), Decimal(0)),
+    (True, Decimal(0), Decimal("0.001")),
+])
+def test_vectorized_classifier_matches_the_row_path(fx, tolerance, tolerance_ratio):
+    transactions, logs_by_transaction = synthetic_chunk(20_000)
+    matcher = benchmark_matcher(fx, tolerance, tolerance_ratio)
+    expected, actual = classify_both(transactions, logs_by_transaction, matcher)
+    assert check_equivalence(transactions, expected, actual) == 0
+
+
+def transaction(transaction_id, amount, currency, status="Success"):
+    return (
+        transaction_id, "user", "account", "FPX", "Payment", Decimal(amount), currency, status,
+        datetime(2025, 1, 2), f"ref-{transaction_id}", Decimal("0.00"), Decimal(amount),
+    )
+
+
+def payment_log(transaction_id, amount, currency, status="Success"):
+    return (f"log-{transaction_id}", transaction_id, "Gateway", "gw", status, Decimal(amount), currency, status, datetime(2025, 1, 2))
+
+
+def test_half_unit_ties_round_like_amounts_match():
+    # 14730.00 USD at 4.4735 is 65894.655 MYR, so differences of 0.005 and
+    # 0.015 round (to even) to 0.00 and 0.02. 68409.98 BTC is 6.8e12 satoshi,
+    # past where a float keeps the converted residue's fraction exactly.
+    transactions = [
+        transaction("half-cent", "65894.66", "MYR"), transaction("cent-and-a-half", "65894.67", "MYR"),
+        transaction("large-btc", "68409.98", "BTC"),
+    ]
+    logs_by_transaction = {
+        transaction_id: [payment_log(transaction_id, amount, "USD")] for transaction_id, amount in [
+            ("half-cent", "14730.00"), ("cent-and-a-half", "14730.00"), ("large-btc", "4395349660.68"),
+        ]
+    }
+    expected, actual = classify_both(transactions, logs_by_transaction, benchmark_matcher(fx=True))
+    assert [result["resolution_status"] for result in expected] == ["No Discrepancy", "Resolved", "Resolved"]
+    assert [result["discrepancy_amount"] for result in expected] == [0.0, 0.02, 5e-08]
+    assert check_equivalence(transactions, expected, actual) == 0